@@ -0,0 +1,159 @@
+"""
+Ripete contro un ambiente di staging il traffico catturato dal proxy.
+
+Legge i file NDJSON scritti con PROXY_CAPTURE_DIR (anche quelli ruotati),
+rispetta gli intervalli originali fra le richieste divisi per --speed e stampa i
+percentili di latenza per rotta normalizzata, affiancati a quelli registrati
+in produzione.
+
+Uso:
+    python backend/replay.py 'captures/traffic-*.ndjson*' --target http://staging:8001 --speed 5
+
+Le credenziali dell'utente con cui ripetere le chiamate arrivano da
+REPLAY_EMAIL / REPLAY_PASSWORD (predefinito l'admin di sviluppo). Le
+richieste di login catturate, con password oscurata, vengono saltate.
+
+Di default ripete solo le letture: con --include-writes ripete anche
+POST/PUT/PATCH/DELETE (su id reali di produzione), mai pero' quelle il cui
+corpo contiene valori oscurati ("***"), che scriverebbero dati falsi.
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+from dataclasses import dataclass, field
+import glob
+import json
+import os
+import time
+
+import httpx
+
+SKIPPED_PATHS = ("/api/auth/login", "/api/auth/logout")
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# Valore scritto dal proxy al posto dei campi sensibili (redact in server.py)
+REDACTED_VALUE = "***"
+
+
+@dataclass
+class RouteStats:
+    latencies: list[float] = field(default_factory=list)
+    captured: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    @staticmethod
+    def percentile(values: list[float], q: float) -> float:
+        ordered = sorted(values)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def has_redacted(value) -> bool:
+    if isinstance(value, dict):
+        return any(has_redacted(item) for item in value.values())
+    if isinstance(value, list):
+        return any(has_redacted(item) for item in value)
+    return value == REDACTED_VALUE
+
+
+def load_entries(patterns: list[str], include_writes: bool) -> tuple[list[dict], int]:
+    entries = []
+    skipped = 0
+    paths = sorted({path for pattern in patterns for path in glob.glob(pattern)})
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                # Corpi non JSON (upload multipart) o troppo grandi non sono stati catturati.
+                unreplayable = (entry["bodyBytes"] and "body" not in entry) or has_redacted(entry.get("body"))
+                is_write = entry["method"] in WRITE_METHODS
+                if entry["path"] in SKIPPED_PATHS or unreplayable or (is_write and not include_writes):
+                    skipped += 1
+                    continue
+                entries.append(entry)
+    entries.sort(key=lambda entry: entry["t"])
+    return entries, skipped
+
+
+async def login(client: httpx.AsyncClient) -> None:
+    res = await client.post("/api/auth/login", json={
+        "email": os.getenv("REPLAY_EMAIL", "admin@villaparis.local"),
+        "password": os.getenv("REPLAY_PASSWORD", "Admin123!"),
+    })
+    res.raise_for_status()
+
+
+async def replay(entries: list[dict], target: str, speed: float, concurrency: int) -> dict[str, RouteStats]:
+    stats: dict[str, RouteStats] = defaultdict(RouteStats)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=target, limits=limits, timeout=60.0) as client:
+        await login(client)
+        semaphore = asyncio.Semaphore(concurrency)
+        first = entries[0]["t"]
+        started = time.monotonic()
+
+        async def issue(entry: dict) -> None:
+            route = stats[f"{entry['method']} {entry['route']}"]
+            route.captured.append(entry["latencyMs"])
+            url = entry["path"] + (f"?{entry['query']}" if entry["query"] else "")
+            async with semaphore:
+                sent = time.perf_counter()
+                try:
+                    res = await client.request(entry["method"], url, json=entry.get("body"))
+                    await res.aread()
+                    if res.status_code >= 500:
+                        route.errors += 1
+                except httpx.HTTPError:
+                    route.errors += 1
+                route.latencies.append((time.perf_counter() - sent) * 1000)
+
+        tasks = []
+        for entry in entries:
+            delay = (entry["t"] - first) / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(issue(entry)))
+        await asyncio.gather(*tasks)
+    return stats
+
+
+def print_report(stats: dict[str, RouteStats], elapsed: float) -> None:
+    total = sum(len(route.latencies) for route in stats.values())
+    print(f"{total} richieste in {elapsed:.1f}s ({total / elapsed:.1f} req/s)\n")
+    print(f"{'rotta':<55} {'n':>6} {'err':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'p95 prod':>9}")
+    for name, route in sorted(stats.items(), key=lambda item: -len(item[1].latencies)):
+        values = route.latencies
+        print(
+            f"{name[:55]:<55} {len(values):>6} {route.errors:>5} "
+            f"{RouteStats.percentile(values, 0.5):>8.1f} {RouteStats.percentile(values, 0.95):>8.1f} "
+            f"{RouteStats.percentile(values, 0.99):>8.1f} {max(values, default=0):>8.1f} "
+            f"{RouteStats.percentile(route.captured, 0.95):>9.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ripete il traffico catturato dal proxy contro uno staging")
+    parser.add_argument("files", nargs="+", help="File NDJSON (accetta glob, es. captures/traffic-*.ndjson*)")
+    parser.add_argument("--target", default="http://localhost:8001", help="URL del proxy o dell'app di staging")
+    parser.add_argument("--speed", type=float, default=1.0, help="Moltiplicatore di velocita' (1, 5, 20...)")
+    parser.add_argument("--concurrency", type=int, default=50, help="Richieste contemporanee massime")
+    parser.add_argument(
+        "--include-writes",
+        action="store_true",
+        help="Ripete anche POST/PUT/PATCH/DELETE: solo contro una copia sacrificabile dei dati",
+    )
+    args = parser.parse_args()
+
+    entries, skipped = load_entries(args.files, args.include_writes)
+    if not entries:
+        parser.error("Nessuna richiesta da ripetere")
+    print(f"Ripeto {len(entries)} richieste a {args.speed}x verso {args.target} ({skipped} saltate)")
+    started = time.monotonic()
+    stats = asyncio.run(replay(entries, args.target.rstrip("/"), args.speed, args.concurrency))
+    print_report(stats, time.monotonic() - started)
+
+
+if __name__ == "__main__":
+    main()
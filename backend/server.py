@@ -3,31 +3,1375 @@ Proxy HTTP opzionale verso le API Next.js.
 
 Mantiene compatibilita' con installazioni che espongono la porta 8001 e
 inoltra le richieste verso l'app Next.js sulla porta 3000.
+
+Di default corpo della richiesta e risposta vengono inoltrati in streaming,
+cosi' upload audio, export xlsx e snapshot dello storico non vengono mai
+tenuti interi in memoria. Con PROXY_STREAMING=false si torna al vecchio
+comportamento bufferizzato.
+
+Le GET verso le rotte quasi statiche (piatti, piantine, menu base, meteo,
+statistiche eventi) passano da una cache LRU con TTL per rotta, separata per
+ruolo dell'utente e invalidata dalle scritture sullo stesso prefisso.
+GET identiche in volo contemporaneamente (stessa chiave di cache) condividono
+una sola chiamata upstream: e' il caso di calendario e report all'apertura.
+
+NEXTJS_TARGET accetta piu' URL separati da virgola: ogni richiesta va al nodo
+con meno richieste in corso fra due scelti a caso (power of two choices) e i
+nodi che non rispondono ai controlli di salute vengono esclusi finche' non
+tornano disponibili.
+
+GET /__metrics espone in formato Prometheus conteggi, istogrammi di latenza,
+byte trasferiti e richieste in corso per rotta normalizzata (es.
+/api/eventi?id=*), oltre allo stato di cache e nodi upstream.
+
+Le risposte testuali sopra PROXY_COMPRESSION_MIN_BYTES vengono compresse dal
+proxy (brotli se il pacchetto e' installato, altrimenti gzip) secondo
+l'Accept-Encoding del client; i corpi in streaming sono compressi a blocchi.
+Next.js riceve sempre Accept-Encoding: identity e non spreca CPU a comprimere.
+
+Le GET servite dalla cache o accorpate portano un ETag forte (hash del corpo) e
+rispondono 304 a un If-None-Match corrispondente: i poll delle notifiche, che
+quasi sempre non cambiano, non ritrasmettono il corpo.
+
+Le rotte costose (export xlsx, storico, controllo Google Calendar, analisi delle
+registrazioni) hanno un limite di richieste contemporanee per classe: le
+eccedenti attendono in una coda FIFO limitata e oltre coda o timeout ricevono
+429/503 con Retry-After, cosi' non affamano l'event loop di Node.
+
+Planimetrie e upload vengono letti direttamente da public/ (PROXY_PUBLIC_DIR)
+con supporto a Range, Last-Modified/If-Modified-Since e Cache-Control lunga per i
+nomi con timestamp generati da POST /api/piantine.
+
+I corpi oltre PROXY_SPOOL_THRESHOLD_BYTES (registrazioni audio, upload menu)
+vengono scritti su un file temporaneo prima di occupare un posto in coda e una
+connessione verso Next.js, poi rispediti da disco; oltre PROXY_MAX_BODY_BYTES
+la richiesta riceve 413 senza leggere il resto del corpo.
+
+Le richieste idempotenti (GET/HEAD/OPTIONS) vengono ritentate con backoff e
+jitter su errori di connessione o 502/503 senza corpo JSON, per esempio mentre il
+container Next.js riparte; un 502/503 JSON e' la risposta di una rotta (es.
+/api/meteo) e arriva al client cosi' com'e'. Le rotte di PROXY_HEDGE_ROUTES
+inviano una seconda richiesta a un altro nodo se la prima tarda. Ogni nodo
+Next.js ha il proprio circuit breaker: dopo troppi errori consecutivi il nodo
+viene saltato finche' un tentativo di prova non torna a buon fine; con tutti i
+nodi aperti il proxy risponde subito 503, o con l'ultima copia in cache.
+
+Ogni richiesta riceve un X-Request-ID (quello del client se valido, altrimenti
+generato) inoltrato a Next.js e restituito al browser insieme a Server-Timing
+con i tempi di coda, connessione, attesa del primo byte e trasferimento; le
+stesse informazioni finiscono in un access log JSON lines (PROXY_ACCESS_LOG).
+
+Con PROXY_CAPTURE_DIR una frazione delle richieste (PROXY_CAPTURE_SAMPLE) viene
+registrata in file NDJSON a rotazione, con i corpi JSON di POST/PUT oscurati nei
+campi sensibili: backend/replay.py li ripete contro un ambiente di staging.
+
+`python server.py` avvia PROXY_WORKERS processi (predefinito 1, "auto" per uno
+per core) che ascoltano sulla stessa porta con SO_REUSEPORT (uvloop e httptools
+se installati), ognuno con il proprio pool di connessioni verso Next.js; su
+SIGTERM i worker smettono di accettare connessioni e completano le richieste in
+corso entro PROXY_DRAIN_TIMEOUT. Cache e sua invalidazione, single-flight, code
+di ammissione, circuit breaker e metriche restano per processo; ogni worker
+scrive il proprio file di cattura.
+
+Con JWT_SECRET il proxy verifica firma e scadenza del cookie vp_token (o del
+Bearer) come verifyToken in src/lib/auth.ts: richieste senza token o con token
+non valido ricevono 401 senza arrivare a Next.js, le altre portano i claim
+verificati nell'header X-Verified-Claims.
 """
+import asyncio
+import base64
+import gzip
+from collections import OrderedDict, defaultdict, deque
 from contextlib import asynccontextmanager
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from functools import cached_property
+import hashlib
+import hmac
+import json
 import logging
+import logging.handlers
+import multiprocessing
+import mimetypes
 import os
+from pathlib import Path
+import random
+import re
+import signal
+import socket
+import tempfile
+import time
+import uuid
+from urllib.parse import parse_qsl, urlencode
+import zlib
 
+import anyio
 import httpx
 from fastapi import FastAPI, Request
-from fastapi.responses import Response
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli e' opzionale
+    brotli = None
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("proxy")
 
-TARGET = os.getenv("NEXTJS_TARGET", "http://localhost:3000").rstrip("/")
+TARGETS = [
+    target.strip().rstrip("/")
+    for target in os.getenv("NEXTJS_TARGET", "http://localhost:3000").split(",")
+    if target.strip()
+]
+STREAMING = os.getenv("PROXY_STREAMING", "true").lower() not in ("0", "false", "no")
+MAX_CONNECTIONS = int(os.getenv("PROXY_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("PROXY_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("PROXY_KEEPALIVE_EXPIRY", "5"))
+
+HOST = os.getenv("PROXY_HOST", "0.0.0.0")
+PORT = int(os.getenv("PROXY_PORT", "8001"))
+# Un solo processo salvo scelta esplicita: cache, code e breaker sono per processo
+WORKERS = (os.cpu_count() or 1) if os.getenv("PROXY_WORKERS") == "auto" else max(1, int(os.getenv("PROXY_WORKERS", "1")))
+DRAIN_TIMEOUT = float(os.getenv("PROXY_DRAIN_TIMEOUT", "30"))
+HEALTH_PATH = os.getenv("PROXY_HEALTH_PATH", "/api/auth/me")
+HEALTH_INTERVAL = float(os.getenv("PROXY_HEALTH_INTERVAL", "5"))
+HEALTH_FAILURES = int(os.getenv("PROXY_HEALTH_FAILURES", "2"))
+
+COMPRESSION_MIN_BYTES = int(os.getenv("PROXY_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("PROXY_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("PROXY_BROTLI_QUALITY", "5"))
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml", "image/svg+xml")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+LATENCY_SAMPLES = 1024
+# Oltre questo numero di rotte distinte le nuove finiscono sotto "other",
+# cosi' query string inattese non fanno esplodere la cardinalita'.
+METRICS_MAX_ROUTES = int(os.getenv("PROXY_METRICS_MAX_ROUTES", "200"))
+
+BODYLESS_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+RETRIES = int(os.getenv("PROXY_RETRIES", "2"))
+RETRY_BACKOFF = float(os.getenv("PROXY_RETRY_BACKOFF", "0.1"))
+# Solo se il corpo non e' JSON: vedi is_upstream_failure
+RETRY_STATUSES = {502, 503}
+HEDGE_DELAY = float(os.getenv("PROXY_HEDGE_DELAY_MS", "250")) / 1000
+HEDGE_ROUTES = [
+    spec.strip()
+    for spec in os.getenv(
+        "PROXY_HEDGE_ROUTES",
+        "/api/auth/me,/api/eventi?summary=notifications,/api/appuntamenti?summary=notifications",
+    ).split(",")
+    if spec.strip()
+]
+BREAKER_FAILURES = int(os.getenv("PROXY_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("PROXY_BREAKER_COOLDOWN", "10"))
+# Quanto a lungo, oltre il TTL, una voce di cache puo' sostituire Next.js irraggiungibile.
+STALE_TTL = float(os.getenv("PROXY_STALE_TTL", "3600"))
+
+# "-" scrive l'access log JSON su stdout, un percorso lo scrive su file, "off" lo disattiva.
+ACCESS_LOG = os.getenv("PROXY_ACCESS_LOG", "-")
+CAPTURE_DIR = os.getenv("PROXY_CAPTURE_DIR", "")
+CAPTURE_SAMPLE = float(os.getenv("PROXY_CAPTURE_SAMPLE", "0.1"))
+CAPTURE_MAX_BYTES = int(os.getenv("PROXY_CAPTURE_MAX_BYTES", str(10 * 1024 * 1024)))
+CAPTURE_BACKUPS = int(os.getenv("PROXY_CAPTURE_BACKUPS", "5"))
+CAPTURE_BODY_MAX_BYTES = 64 * 1024
+CAPTURE_BODY_METHODS = {"POST", "PUT", "PATCH"}
+REDACTED_FIELDS = re.compile(r"pass|token|secret|email|telefono|cellulare|phone|codicefiscale|partitaiva|iban|indirizzo", re.I)
+REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+TRACE_KEY = "proxy.trace"
+
+# Classi di rotte costose: limite di concorrenza e rotte coperte. "POST /api/..."
+# limita un solo metodo. Limiti sovrascrivibili con
+# PROXY_CONCURRENCY_LIMITS="export=2,recording=1".
+DEFAULT_ROUTE_CLASSES = {
+    "export": (2, ["/api/report/azienda.xlsx", "/api/report/eventi.xlsx"]),
+    "storico": (1, ["/api/storico"]),
+    "calendar-check": (1, ["/api/google-calendar/check-changes"]),
+    "recording": (2, ["POST /api/appuntamenti/recording"]),
+}
+QUEUE_SIZE = int(os.getenv("PROXY_QUEUE_SIZE", "10"))
+QUEUE_TIMEOUT = float(os.getenv("PROXY_QUEUE_TIMEOUT", "30"))
+
+# MAX_AUDIO_BYTES di /api/appuntamenti/recording e' 20 MB: resta margine per il multipart.
+MAX_BODY_BYTES = int(os.getenv("PROXY_MAX_BODY_BYTES", str(25 * 1024 * 1024)))
+SPOOL_THRESHOLD_BYTES = int(os.getenv("PROXY_SPOOL_THRESHOLD_BYTES", str(1024 * 1024)))
+SPOOL_DIR = os.getenv("PROXY_SPOOL_DIR") or None
+SPOOL_CHUNK_BYTES = 256 * 1024
+
+# Cartelle di public/ servite direttamente dal proxy; True se richiedono login
+# (come fa il middleware Next.js, che lascia pubbliche solo le planimetrie).
+PUBLIC_DIR = Path(os.getenv("PROXY_PUBLIC_DIR", Path(__file__).resolve().parent.parent / "public"))
+STATIC_DIRS = {"planimetrie": False, "uploads": True}
+STATIC_CHUNK_BYTES = 256 * 1024
+# "<nome>-<Date.now()>.<ext>": il contenuto non cambia mai, si puo' cachare a lungo.
+TIMESTAMPED_FILE = re.compile(r"-\d{13}\.[A-Za-z0-9]+$")
+
+JWT_SECRET = os.getenv("JWT_SECRET", "")
+VERIFY_AUTH = os.getenv("PROXY_VERIFY_AUTH", "true").lower() not in ("0", "false", "no")
+# Come src/middleware.ts: solo login e callback OAuth sono raggiungibili senza token.
+PUBLIC_PATHS = ("/api/auth/login", "/api/oauth/google-calendar/callback")
+CLAIMS_HEADER = b"x-verified-claims"
+CLAIMS_KEY = "proxy.claims"
+CACHE_MAX_ENTRIES = int(os.getenv("PROXY_CACHE_MAX_ENTRIES", "256"))
+CACHE_MAX_BODY_BYTES = int(os.getenv("PROXY_CACHE_MAX_BODY_BYTES", str(2 * 1024 * 1024)))
+
+# TTL in secondi per prefisso di rotta, eventualmente ristretto a parametri di
+# query precisi. Sovrascrivibile con PROXY_CACHE_ROUTES="/api/piatti=300,/api/meteo=900".
+DEFAULT_CACHE_ROUTES = {
+    "/api/piatti": 300,
+    "/api/piantine": 300,
+    "/api/menu-base": 300,
+    "/api/meteo": 900,
+    "/api/report/eventi/stats": 120,
+    "/api/eventi?summary=notifications": 30,
+    "/api/appuntamenti?summary=notifications": 30,
+}
+
+# Scritture su un prefisso che rendono obsolete anche altre rotte in cache.
+CACHE_DEPENDENCIES = {
+    "/api/eventi": ["/api/report/eventi/stats"],
+}
+
+
+def parse_int_map(raw: str) -> dict[str, int]:
+    routes: dict[str, int] = {}
+    for item in raw.split(","):
+        prefix, _, ttl = item.strip().rpartition("=")
+        if prefix and ttl:
+            routes[prefix] = int(ttl)
+    return routes
+
+
+CACHE_ROUTES = parse_int_map(os.getenv("PROXY_CACHE_ROUTES", "")) or DEFAULT_CACHE_ROUTES
+CONCURRENCY_LIMITS = parse_int_map(os.getenv("PROXY_CONCURRENCY_LIMITS", ""))
+
+# Rotte pesanti non cacheabili ma lette da tutti nello stesso momento: le GET
+# identiche in volo vengono accorpate. Le rotte in cache sono sempre incluse.
+COALESCE_ROUTES = [
+    prefix.strip().rstrip("/")
+    for prefix in os.getenv("PROXY_COALESCE_ROUTES", "/api/calendario,/api/report/stats").split(",")
+    if prefix.strip()
+]
+
+# Server-sent events: sempre inoltrati in streaming, senza compressione ne' buffer.
+# Il keepalive di /api/live (25s) resta sotto il timeout di lettura di httpx (60s).
+SSE_ROUTES = [
+    prefix.strip().rstrip("/")
+    for prefix in os.getenv("PROXY_SSE_ROUTES", "/api/live").split(",")
+    if prefix.strip()
+]
+
+
+def path_matches(path: str, prefix: str) -> bool:
+    return path == prefix or path.startswith(f"{prefix}/")
+
+
+def route_matches(path: str, query: str, spec: str) -> bool:
+    """Una rotta "/api/eventi?summary=notifications" richiede anche quei parametri."""
+    spec_path, _, spec_query = spec.partition("?")
+    if not path_matches(path, spec_path):
+        return False
+    params = dict(parse_qsl(query, keep_blank_values=True))
+    return all(params.get(key) == value for key, value in parse_qsl(spec_query, keep_blank_values=True))
+
+
+def b64url_decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def b64url_encode(value: bytes) -> str:
+    return base64.urlsafe_b64encode(value).rstrip(b"=").decode("ascii")
+
+
+def token_from_request(request: Request) -> str | None:
+    token = request.cookies.get("vp_token")
+    if token:
+        return token
+    auth = request.headers.get("authorization", "")
+    if auth.startswith("Bearer "):
+        return auth[7:]
+    return None
+
+
+def verified_token_payload(token: str | None) -> dict | None:
+    """Payload del JWT firmato da signToken (src/lib/auth.ts), se valido e non scaduto."""
+    if not token or not JWT_SECRET:
+        return None
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    header, payload, signature = parts
+    expected = hmac.new(JWT_SECRET.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    # compare_digest su str accetta solo ASCII: la firma arriva dal client, si confrontano byte
+    if not hmac.compare_digest(b64url_encode(expected).encode(), signature.encode("utf-8", "surrogateescape")):
+        return None
+    try:
+        data = json.loads(b64url_decode(payload))
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or data.get("exp", 0) <= time.time():
+        return None
+    return data
+
+
+def request_claims(request: Request) -> dict | None:
+    """Claim gia' verificati da AuthMiddleware, altrimenti verifica il token ora."""
+    if CLAIMS_KEY in request.scope:
+        return request.scope[CLAIMS_KEY]
+    return verified_token_payload(token_from_request(request))
+
+
+def negotiate_encoding(request: Request) -> str | None:
+    """Sceglie br o gzip dall'Accept-Encoding del client, rispettando i q-value."""
+    if request.method == "HEAD":
+        return None
+    accepted: dict[str, float] = {}
+    for item in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    candidates = (["br"] if brotli else []) + ["gzip"]
+    best = max(candidates, key=lambda name: accepted.get(name, accepted.get("*", 0.0)))
+    return best if accepted.get(best, accepted.get("*", 0.0)) > 0 else None
+
+
+def strip_etag(tag: str) -> str:
+    tag = tag.strip().removeprefix("W/")
+    for suffix in ("-br", "-gzip"):
+        if tag.endswith(f'{suffix}"'):
+            return tag[: -len(suffix) - 1] + '"'
+    return tag
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(strip_etag(tag) == etag for tag in if_none_match.split(","))
+
+
+def should_compress(status_code: int, media_type: str | None, size: int | None) -> bool:
+    if status_code < 200 or status_code in (204, 206, 304):
+        return False
+    if size is not None and size < COMPRESSION_MIN_BYTES:
+        return False
+    return bool(media_type) and media_type.lower().startswith(COMPRESSIBLE_TYPES)
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+async def compress_stream(chunks, encoding: str):
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        async for chunk in chunks:
+            data = compressor.process(chunk)
+            # flush a ogni blocco: il client riceve dati man mano che arrivano
+            yield data + compressor.flush()
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def request_key(path: str, query: str, role: str) -> tuple[str, str, str]:
+    return (path, urlencode(sorted(parse_qsl(query, keep_blank_values=True))), role)
+
+
+@dataclass
+class CachedResponse:
+    status_code: int
+    headers: dict[str, str]
+    body: bytes
+    media_type: str | None
+    cacheable: bool
+    expires_at: float = 0.0
+    # Varianti compresse gia' calcolate: una voce in cache si comprime una volta sola.
+    encoded: dict[str, bytes] = field(default_factory=dict)
+
+    @classmethod
+    def from_upstream(cls, upstream: httpx.Response) -> "CachedResponse":
+        return cls(
+            status_code=upstream.status_code,
+            headers=response_headers(upstream.headers),
+            body=upstream.content,
+            media_type=upstream.headers.get("content-type"),
+            cacheable=upstream.status_code == 200 and "set-cookie" not in upstream.headers,
+        )
+
+    def body_for(self, encoding: str | None) -> bytes:
+        if not encoding or not should_compress(self.status_code, self.media_type, len(self.body)):
+            return self.body
+        if encoding not in self.encoded:
+            self.encoded[encoding] = compress_body(self.body, encoding)
+        return self.encoded[encoding]
+
+    @cached_property
+    def etag(self) -> str:
+        return self.headers.get("etag") or f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+
+    def to_response(self, request: Request, cache_status: str | None = None) -> Response:
+        encoding = negotiate_encoding(request)
+        body = self.body_for(encoding)
+        headers = dict(self.headers)
+        if cache_status:
+            headers["x-proxy-cache"] = cache_status
+        if body is not self.body:
+            headers["content-encoding"] = encoding
+            headers["vary"] = "Accept-Encoding"
+
+        if self.status_code == 200 and request.method == "GET":
+            # ETag distinto per codifica, ma If-None-Match confronta l'hash del
+            # contenuto: un 304 vale qualunque compressione abbia ricevuto il client.
+            headers["etag"] = self.etag if body is self.body else f'{self.etag[:-1]}-{encoding}"'
+            if etag_matches(request.headers.get("if-none-match"), self.etag):
+                kept = ("etag", "vary", "cache-control", "expires", "x-proxy-cache")
+                return Response(status_code=304, headers={k: v for k, v in headers.items() if k in kept})
+
+        return Response(content=body, status_code=self.status_code, headers=headers, media_type=self.media_type)
+
+
+class ResponseCache:
+    """Cache LRU con TTL per rotta e invalidazione per prefisso."""
+
+    def __init__(self, routes: dict[str, int], max_entries: int):
+        self.routes = routes
+        self.max_entries = max_entries
+        self.entries: OrderedDict[tuple[str, str, str], CachedResponse] = OrderedDict()
+        # Le scritture incrementano la generazione del prefisso: una GET partita
+        # prima della scrittura non puo' salvare una risposta ormai vecchia.
+        self.generations: dict[str, int] = {}
+        self.stats = {route: {"hits": 0, "misses": 0} for route in routes}
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and bool(JWT_SECRET)
+
+    def route_for(self, path: str, query: str = "") -> str | None:
+        matches = [spec for spec in self.routes if route_matches(path, query, spec)]
+        return max(matches, key=len) if matches else None
+
+    def generation(self, route: str) -> int:
+        return self.generations.get(route, 0)
+
+    def get(self, route: str, key: tuple[str, str, str]) -> CachedResponse | None:
+        # Le voci scadute restano finche' l'LRU non le espelle: servono come
+        # copia di riserva quando il circuit breaker e' aperto.
+        entry = self.entries.get(key)
+        if entry and entry.expires_at > time.monotonic():
+            self.entries.move_to_end(key)
+            self.stats[route]["hits"] += 1
+            return entry
+        self.stats[route]["misses"] += 1
+        return None
+
+    def get_stale(self, key: tuple[str, str, str]) -> CachedResponse | None:
+        entry = self.entries.get(key)
+        if entry and time.monotonic() - entry.expires_at < STALE_TTL:
+            return entry
+        return None
+
+    def store(self, route: str, key: tuple[str, str, str], generation: int, response: CachedResponse) -> None:
+        if generation != self.generation(route):
+            return
+        if not response.cacheable or len(response.body) > CACHE_MAX_BODY_BYTES:
+            return
+        self.entries[key] = replace(response, expires_at=time.monotonic() + self.routes[route])
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate_for_write(self, path: str) -> None:
+        targets = {spec for spec in self.routes if path_matches(path, spec.partition("?")[0])}
+        targets.update(dep for prefix, deps in CACHE_DEPENDENCIES.items() if path_matches(path, prefix) for dep in deps)
+        for target in targets:
+            self.generations[target] = self.generation(target) + 1
+            stale = [key for key in self.entries if route_matches(key[0], key[1], target)]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "maxEntries": self.max_entries,
+            "hits": sum(item["hits"] for item in self.stats.values()),
+            "misses": sum(item["misses"] for item in self.stats.values()),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "routes": {route: {"ttl": ttl, **self.stats[route]} for route, ttl in self.routes.items()},
+        }
+
+
+class SingleFlight:
+    """Accorpa chiamate identiche in volo: la prima esegue, le altre attendono."""
+
+    def __init__(self):
+        self.calls: dict[tuple[str, str, str], asyncio.Task] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key: tuple[str, str, str], fn) -> CachedResponse:
+        task = self.calls.get(key)
+        if task:
+            self.shared += 1
+        else:
+            self.leaders += 1
+            # Il task non appartiene a nessun client: se chi l'ha avviato si
+            # disconnette, gli altri in attesa ricevono comunque la risposta.
+            task = asyncio.ensure_future(fn())
+            self.calls[key] = task
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+        return await asyncio.shield(task)
+
+    def snapshot(self) -> dict:
+        return {"inFlight": len(self.calls), "leaders": self.leaders, "shared": self.shared}
+
+
+@dataclass
+class Upstream:
+    url: str
+    breaker: "CircuitBreaker"
+    outstanding: int = 0
+    healthy: bool = True
+    failures: int = 0
+
+
+class UpstreamPool:
+    """Nodi Next.js con selezione power-of-two-choices e controlli di salute."""
+
+    def __init__(self, urls: list[str]):
+        self.upstreams = [Upstream(url, CircuitBreaker(url)) for url in urls]
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.rejected = 0
+
+    def available(self) -> bool:
+        return any(node.breaker.available() for node in self.upstreams)
+
+    def retry_after(self) -> int:
+        return min(node.breaker.retry_after() for node in self.upstreams)
+
+    def acquire(self) -> Upstream:
+        """Nodo per la prossima richiesta fra quelli con il breaker chiuso (o in prova)."""
+        allowed = [node for node in self.upstreams if node.breaker.available()]
+        if not allowed:
+            self.rejected += 1
+            raise UpstreamUnavailable(503, "Servizio temporaneamente non disponibile", self.retry_after())
+        # Se nessun nodo risulta sano si prova comunque: meglio un tentativo
+        # che un 502 certo mentre Next.js sta ripartendo.
+        candidates = [node for node in allowed if node.healthy] or allowed
+        if len(candidates) == 1:
+            node = candidates[0]
+        else:
+            first, second = random.sample(candidates, 2)
+            node = first if first.outstanding <= second.outstanding else second
+        node.breaker.allow()
+        node.outstanding += 1
+        return node
+
+    def release(self, node: Upstream) -> None:
+        node.outstanding -= 1
+
+    def record(self, node: Upstream, ok: bool) -> None:
+        if ok:
+            if not node.healthy:
+                logger.info("Upstream %s di nuovo disponibile", node.url)
+            node.failures = 0
+            node.healthy = True
+            return
+        node.failures += 1
+        if node.healthy and node.failures >= HEALTH_FAILURES:
+            logger.warning("Upstream %s escluso dopo %s errori consecutivi", node.url, node.failures)
+            node.healthy = False
+
+    async def probe(self, client: httpx.AsyncClient, node: Upstream) -> None:
+        try:
+            res = await client.get(f"{node.url}{HEALTH_PATH}", timeout=min(HEALTH_INTERVAL, 5.0))
+            self.record(node, res.status_code < 500)
+        except httpx.HTTPError:
+            self.record(node, False)
+
+    async def run_health_checks(self, client: httpx.AsyncClient) -> None:
+        while True:
+            await asyncio.gather(*(self.probe(client, node) for node in self.upstreams))
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+    def snapshot(self) -> list[dict]:
+        return [
+            {
+                "url": node.url,
+                "healthy": node.healthy,
+                "outstanding": node.outstanding,
+                "failures": node.failures,
+                "breaker": node.breaker.state,
+            }
+            for node in self.upstreams
+        ]
+
+
+class UpstreamUnavailable(Exception):
+    def __init__(self, status_code: int, message: str, retry_after: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Per nodo: closed -> open dopo BREAKER_FAILURES errori consecutivi -> half_open dopo il cooldown."""
+
+    STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.transitions: dict[str, int] = defaultdict(int)
+
+    def transition(self, state: str) -> None:
+        if state != self.state:
+            logger.warning("Circuit breaker upstream %s: %s -> %s", self.name, self.state, state)
+            self.state = state
+            self.transitions[state] += 1
+
+    def available(self) -> bool:
+        """Come allow, senza occupare la sonda half_open."""
+        if self.state == "open":
+            return time.monotonic() - self.opened_at >= BREAKER_COOLDOWN
+        return self.state == "closed" or not self.probing
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= BREAKER_COOLDOWN:
+            self.transition("half_open")
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record(self, ok: bool) -> None:
+        self.probing = False
+        if ok:
+            self.failures = 0
+            self.transition("closed")
+            return
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= BREAKER_FAILURES:
+            self.opened_at = time.monotonic()
+            self.transition("open")
+
+    def abandon(self) -> None:
+        """Sonda interrotta senza esito (client disconnesso, errore inatteso): libera il posto."""
+        if self.state == "half_open":
+            self.probing = False
+
+    def retry_after(self) -> int:
+        if self.state != "open":
+            return 1
+        return max(1, int(BREAKER_COOLDOWN - (time.monotonic() - self.opened_at)))
+
+
+class QueueFull(Exception):
+    pass
+
+
+class AdmissionQueue:
+    """Semaforo FIFO con coda limitata e timeout di attesa."""
+
+    def __init__(self, name: str, limit: int, routes: list[str]):
+        self.name = name
+        self.limit = limit
+        self.routes = routes
+        self.active = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+
+    def matches(self, method: str, path: str) -> bool:
+        for spec in self.routes:
+            spec_method, _, spec_path = spec.rpartition(" ")
+            if (not spec_method or spec_method == method) and path_matches(path, spec_path):
+                return True
+        return False
+
+    async def acquire(self) -> None:
+        started = time.perf_counter()
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+        elif len(self.waiters) >= QUEUE_SIZE:
+            self.rejected += 1
+            raise QueueFull()
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                # Il posto viene passato direttamente da release(): active non cala.
+                await asyncio.wait_for(waiter, QUEUE_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+            except asyncio.CancelledError:
+                # Client disconnesso proprio mentre riceveva il posto: va restituito.
+                if waiter.done() and not waiter.cancelled():
+                    self.release()
+                raise
+            finally:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+        waited = time.perf_counter() - started
+        self.admitted += 1
+        self.wait_sum += waited
+        self.wait_max = max(self.wait_max, waited)
+
+    def release(self) -> None:
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def retry_after(self) -> int:
+        return max(1, int(QUEUE_TIMEOUT / 2))
+
+
+def build_admission_queues() -> list[AdmissionQueue]:
+    return [
+        AdmissionQueue(name, CONCURRENCY_LIMITS.get(name, limit), routes)
+        for name, (limit, routes) in DEFAULT_ROUTE_CLASSES.items()
+        if CONCURRENCY_LIMITS.get(name, limit) > 0
+    ]
+
+
+ID_SEGMENT = re.compile(r"^(\d+|[0-9a-f]{8}-[0-9a-f-]{27}|c[a-z0-9]{20,})$")
+
+
+def normalize_route(path: str, query: str) -> str:
+    """/api/eventi?id=12 -> /api/eventi?id=*: id nel path e valori in query diventano *."""
+    static_dir = path.lstrip("/").split("/", 1)[0]
+    if static_dir in STATIC_DIRS:
+        return f"/{static_dir}/*"
+    segments = ["*" if ID_SEGMENT.match(segment) else segment for segment in path.split("/")]
+    route = "/".join(segments)
+    keys = sorted({key for key, _ in parse_qsl(query, keep_blank_values=True)})
+    if keys:
+        route += "?" + "&".join(f"{key}=*" for key in keys)
+    return route
+
+
+def label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{label_value(str(value))}"' for key, value in labels.items()) + "}"
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.requests: dict[tuple[str, int], int] = defaultdict(int)
+        self.upstream_statuses: dict[int, int] = defaultdict(int)
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.duration_sum = 0.0
+        self.duration_count = 0
+        self.samples: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.in_flight = 0
+
+    def observe(self, duration: float) -> None:
+        self.duration_sum += duration
+        self.duration_count += 1
+        self.samples.append(duration)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                self.buckets[index] += 1
+
+    def quantile(self, q: float) -> float:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+@dataclass
+class RequestTrace:
+    """Tempi di una richiesta, in secondi, per Server-Timing e access log."""
+
+    request_id: str
+    started: float = field(default_factory=time.perf_counter)
+    queue: float | None = None
+    connect: float | None = None
+    ttfb: float | None = None
+    transfer: float | None = None
+    headers_at: float | None = None
+    upstream: str | None = None
+    attempts: int = 0
+
+    def upstream_response(self, node: "Upstream", connect: float, ttfb: float) -> None:
+        self.upstream = node.url
+        self.connect = connect
+        self.ttfb = ttfb
+        self.headers_at = time.perf_counter()
+
+    def server_timing(self, cache_status: str | None) -> str:
+        # Con le risposte in streaming il trasferimento non e' ancora avvenuto:
+        # compare solo nell'access log.
+        phases = [("queue", self.queue), ("connect", self.connect), ("ttfb", self.ttfb), ("transfer", self.transfer)]
+        parts = [f"{name};dur={value * 1000:.1f}" for name, value in phases if value is not None]
+        if cache_status:
+            parts.append(f'cache;desc="{cache_status}"')
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def request_trace(request: Request) -> RequestTrace | None:
+    return request.scope.get(TRACE_KEY)
+
+
+def build_access_logger() -> logging.Logger | None:
+    if ACCESS_LOG.lower() in ("", "off", "false", "0"):
+        return None
+    access = logging.getLogger("proxy.access")
+    access.propagate = False
+    handler = logging.StreamHandler() if ACCESS_LOG == "-" else logging.handlers.WatchedFileHandler(ACCESS_LOG)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    access.handlers = [handler]
+    access.setLevel(logging.INFO)
+    return access
+
+
+def build_capture_logger() -> logging.Logger | None:
+    if not CAPTURE_DIR or CAPTURE_SAMPLE <= 0:
+        return None
+    os.makedirs(CAPTURE_DIR, exist_ok=True)
+    capture = logging.getLogger("proxy.capture")
+    capture.propagate = False
+    # RotatingFileHandler non regge piu' processi sullo stesso file: uno per worker
+    # (indice da run_worker, pid con uvicorn --workers).
+    worker = os.getenv("PROXY_WORKER_INDEX") or f"pid{os.getpid()}"
+    handler = logging.handlers.RotatingFileHandler(
+        os.path.join(CAPTURE_DIR, f"traffic-{worker}.ndjson"), maxBytes=CAPTURE_MAX_BYTES, backupCount=CAPTURE_BACKUPS
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    capture.handlers = [handler]
+    capture.setLevel(logging.INFO)
+    return capture
+
+
+def redact(value):
+    """Sostituisce i valori dei campi sensibili mantenendo la struttura del JSON."""
+    if isinstance(value, dict):
+        return {
+            key: "***" if REDACTED_FIELDS.search(key) and not isinstance(item, (dict, list)) else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+class ProxyMetrics:
+    """Metriche per rotta normalizzata, esposte in formato testo Prometheus."""
+
+    def __init__(self):
+        self.routes: dict[str, RouteMetrics] = {}
+        self.auth_rejected: dict[str, int] = defaultdict(int)
+
+    def route(self, path: str, query: str) -> RouteMetrics:
+        name = normalize_route(path, query)
+        if name not in self.routes and len(self.routes) >= METRICS_MAX_ROUTES:
+            name = "other"
+        if name not in self.routes:
+            self.routes[name] = RouteMetrics()
+        return self.routes[name]
+
+    def render(self, state) -> str:
+        cache: ResponseCache = state.response_cache
+        single_flight: SingleFlight = state.single_flight
+        pool: UpstreamPool = state.upstreams
+        queues: list[AdmissionQueue] = state.admission_queues
+        lines = [
+            "# HELP proxy_requests_total Richieste servite dal proxy.",
+            "# TYPE proxy_requests_total counter",
+        ]
+        for name, route in self.routes.items():
+            for (method, status), count in route.requests.items():
+                lines.append(f"proxy_requests_total{format_labels(route=name, method=method, status=status)} {count}")
+
+        lines += [
+            "# HELP proxy_upstream_responses_total Risposte ricevute da Next.js per codice di stato.",
+            "# TYPE proxy_upstream_responses_total counter",
+        ]
+        for name, route in self.routes.items():
+            for status, count in route.upstream_statuses.items():
+                lines.append(f"proxy_upstream_responses_total{format_labels(route=name, status=status)} {count}")
+
+        lines += [
+            "# HELP proxy_request_duration_seconds Durata delle richieste fino all'ultimo byte inviato.",
+            "# TYPE proxy_request_duration_seconds histogram",
+        ]
+        for name, route in self.routes.items():
+            for bound, count in zip(LATENCY_BUCKETS, route.buckets):
+                lines.append(f"proxy_request_duration_seconds_bucket{format_labels(route=name, le=bound)} {count}")
+            lines.append(f"proxy_request_duration_seconds_bucket{format_labels(route=name, le='+Inf')} {route.duration_count}")
+            lines.append(f"proxy_request_duration_seconds_sum{format_labels(route=name)} {route.duration_sum:.6f}")
+            lines.append(f"proxy_request_duration_seconds_count{format_labels(route=name)} {route.duration_count}")
+
+        lines += [
+            f"# HELP proxy_request_latency_seconds Quantili sulle ultime {LATENCY_SAMPLES} richieste per rotta.",
+            "# TYPE proxy_request_latency_seconds summary",
+        ]
+        for name, route in self.routes.items():
+            for q in LATENCY_QUANTILES:
+                lines.append(f"proxy_request_latency_seconds{format_labels(route=name, quantile=q)} {route.quantile(q):.6f}")
+            lines.append(f"proxy_request_latency_seconds_sum{format_labels(route=name)} {route.duration_sum:.6f}")
+            lines.append(f"proxy_request_latency_seconds_count{format_labels(route=name)} {route.duration_count}")
+
+        for metric, attr, help_text in (
+            ("proxy_request_bytes_total", "bytes_in", "Byte ricevuti dai client."),
+            ("proxy_response_bytes_total", "bytes_out", "Byte inviati ai client."),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            for name, route in self.routes.items():
+                lines.append(f"{metric}{format_labels(route=name)} {getattr(route, attr)}")
+
+        lines += [
+            "# HELP proxy_requests_in_flight Richieste in corso.",
+            "# TYPE proxy_requests_in_flight gauge",
+        ]
+        for name, route in self.routes.items():
+            lines.append(f"proxy_requests_in_flight{format_labels(route=name)} {route.in_flight}")
+
+        cache_stats = cache.snapshot()
+        lines += [
+            "# HELP proxy_cache_requests_total Lookup nella cache delle risposte.",
+            "# TYPE proxy_cache_requests_total counter",
+        ]
+        for name, stats in cache_stats["routes"].items():
+            lines.append(f"proxy_cache_requests_total{format_labels(route=name, result='hit')} {stats['hits']}")
+            lines.append(f"proxy_cache_requests_total{format_labels(route=name, result='miss')} {stats['misses']}")
+        lines += [
+            "# TYPE proxy_cache_entries gauge",
+            f"proxy_cache_entries {cache_stats['entries']}",
+            "# TYPE proxy_cache_evictions_total counter",
+            f"proxy_cache_evictions_total {cache_stats['evictions']}",
+            "# TYPE proxy_single_flight_shared_total counter",
+            f"proxy_single_flight_shared_total {single_flight.shared}",
+            "# HELP proxy_upstream_healthy 1 se il nodo Next.js supera i controlli di salute.",
+            "# TYPE proxy_upstream_healthy gauge",
+        ]
+        for node in pool.upstreams:
+            lines.append(f"proxy_upstream_healthy{format_labels(upstream=node.url)} {int(node.healthy)}")
+        lines.append("# TYPE proxy_upstream_outstanding gauge")
+        for node in pool.upstreams:
+            lines.append(f"proxy_upstream_outstanding{format_labels(upstream=node.url)} {node.outstanding}")
+        lines += [
+            "# TYPE proxy_upstream_retries_total counter",
+            f"proxy_upstream_retries_total {pool.retries}",
+            "# TYPE proxy_upstream_hedged_requests_total counter",
+            f"proxy_upstream_hedged_requests_total {pool.hedges}",
+            "# TYPE proxy_upstream_hedge_wins_total counter",
+            f"proxy_upstream_hedge_wins_total {pool.hedge_wins}",
+            "# HELP proxy_circuit_breaker_state 0 closed, 1 half_open, 2 open, per nodo Next.js.",
+            "# TYPE proxy_circuit_breaker_state gauge",
+        ]
+        lines += [
+            f"proxy_circuit_breaker_state{format_labels(upstream=node.url)} {CircuitBreaker.STATES[node.breaker.state]}"
+            for node in pool.upstreams
+        ]
+        lines.append("# TYPE proxy_circuit_breaker_transitions_total counter")
+        lines += [
+            f"proxy_circuit_breaker_transitions_total{format_labels(upstream=node.url, state=name)} {node.breaker.transitions[name]}"
+            for node in pool.upstreams
+            for name in CircuitBreaker.STATES
+        ]
+        lines += [
+            "# HELP proxy_circuit_breaker_rejected_total Richieste respinte con 503 perche' tutti i nodi avevano il breaker aperto.",
+            "# TYPE proxy_circuit_breaker_rejected_total counter",
+            f"proxy_circuit_breaker_rejected_total {pool.rejected}",
+            "# HELP proxy_auth_rejected_total Richieste respinte dal proxy senza JWT valido.",
+            "# TYPE proxy_auth_rejected_total counter",
+        ]
+        lines += [
+            f"proxy_auth_rejected_total{format_labels(reason=reason)} {self.auth_rejected[reason]}"
+            for reason in ("missing", "invalid")
+        ]
+
+        lines += [
+            "# HELP proxy_admission_active Richieste in esecuzione per classe di rotta.",
+            "# TYPE proxy_admission_active gauge",
+        ]
+        lines += [f"proxy_admission_active{format_labels(route_class=queue.name)} {queue.active}" for queue in queues]
+        lines += [
+            "# HELP proxy_admission_queue_depth Richieste in coda per classe di rotta.",
+            "# TYPE proxy_admission_queue_depth gauge",
+        ]
+        lines += [f"proxy_admission_queue_depth{format_labels(route_class=queue.name)} {len(queue.waiters)}" for queue in queues]
+        lines += [
+            "# HELP proxy_admission_rejected_total Richieste respinte per coda piena o timeout.",
+            "# TYPE proxy_admission_rejected_total counter",
+        ]
+        for queue in queues:
+            lines.append(f"proxy_admission_rejected_total{format_labels(route_class=queue.name, reason='queue_full')} {queue.rejected}")
+            lines.append(f"proxy_admission_rejected_total{format_labels(route_class=queue.name, reason='timeout')} {queue.timeouts}")
+        lines += [
+            "# HELP proxy_admission_wait_seconds Attesa in coda delle richieste ammesse.",
+            "# TYPE proxy_admission_wait_seconds summary",
+        ]
+        for queue in queues:
+            lines.append(f"proxy_admission_wait_seconds_sum{format_labels(route_class=queue.name)} {queue.wait_sum:.6f}")
+            lines.append(f"proxy_admission_wait_seconds_count{format_labels(route_class=queue.name)} {queue.admitted}")
+        lines.append("# TYPE proxy_admission_wait_max_seconds gauge")
+        lines += [f"proxy_admission_wait_max_seconds{format_labels(route_class=queue.name)} {queue.wait_max:.6f}" for queue in queues]
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: misura anche le risposte in streaming fino all'ultimo chunk."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/__"):
+            await self.app(scope, receive, send)
+            return
+
+        metrics: ProxyMetrics = scope["app"].state.metrics
+        route = metrics.route(upstream_path(scope["path"].lstrip("/")), scope["query_string"].decode("latin-1"))
+        started = time.perf_counter()
+        status = 500
+        route.in_flight += 1
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                route.bytes_in += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                route.bytes_out += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            route.in_flight -= 1
+            route.requests[(scope["method"], status)] += 1
+            route.observe(time.perf_counter() - started)
+
+
+class TracingMiddleware:
+    """Middleware ASGI: X-Request-ID, Server-Timing, access log e cattura del traffico."""
+
+    def __init__(self, app):
+        self.app = app
+        self.access_log = build_access_logger()
+        self.capture = build_capture_logger()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        trace = RequestTrace(incoming if REQUEST_ID.match(incoming) else uuid.uuid4().hex)
+        headers = [(k, v) for k, v in scope["headers"] if k != b"x-request-id"]
+        headers.append((b"x-request-id", trace.request_id.encode()))
+        scope = {**scope, "headers": headers, TRACE_KEY: trace}
+        status = 500
+        cache_status = None
+        bytes_in = 0
+        bytes_out = 0
+        sampled = bool(self.capture) and not scope["path"].startswith("/__") and random.random() < CAPTURE_SAMPLE
+        content_type = dict(scope["headers"]).get(b"content-type", b"").decode("latin-1")
+        body = bytearray() if sampled and scope["method"] in CAPTURE_BODY_METHODS and "json" in content_type else None
+
+        async def counting_receive():
+            nonlocal bytes_in
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                bytes_in += len(chunk)
+                if body is not None and bytes_in <= CAPTURE_BODY_MAX_BYTES:
+                    body.extend(chunk)
+            return message
+
+        async def tracing_send(message):
+            nonlocal status, cache_status, bytes_out
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                raw = list(message.get("headers", []))
+                cache_status = next((v.decode("latin-1") for k, v in raw if k.lower() == b"x-proxy-cache"), None)
+                raw.append((b"x-request-id", trace.request_id.encode()))
+                raw.append((b"server-timing", trace.server_timing(cache_status).encode()))
+                message = {**message, "headers": raw}
+            elif message["type"] == "http.response.body":
+                bytes_out += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, tracing_send)
+        finally:
+            if self.access_log and not scope["path"].startswith("/__"):
+                self.log(scope, trace, status, cache_status, bytes_in, bytes_out)
+            if sampled:
+                self.record(scope, trace, status, bytes_in, body if bytes_in <= CAPTURE_BODY_MAX_BYTES else None)
+
+    def log(self, scope, trace: RequestTrace, status: int, cache_status: str | None, bytes_in: int, bytes_out: int):
+        finished = time.perf_counter()
+        transfer = trace.transfer
+        if transfer is None and trace.headers_at is not None:
+            transfer = finished - trace.headers_at
+        ms = lambda value: round(value * 1000, 1) if value is not None else None
+        self.access_log.info(json.dumps({
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "requestId": trace.request_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": normalize_route(upstream_path(scope["path"].lstrip("/")), scope["query_string"].decode("latin-1")),
+            "status": status,
+            "cache": cache_status,
+            "upstream": trace.upstream,
+            "attempts": trace.attempts,
+            "bytesIn": bytes_in,
+            "bytesOut": bytes_out,
+            "queueMs": ms(trace.queue),
+            "connectMs": ms(trace.connect),
+            "ttfbMs": ms(trace.ttfb),
+            "transferMs": ms(transfer),
+            "totalMs": ms(finished - trace.started),
+        }, separators=(",", ":")))
+
+    def record(self, scope, trace: RequestTrace, status: int, bytes_in: int, body: bytearray | None):
+        entry = {
+            "t": round(time.time(), 3),
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": normalize_route(upstream_path(scope["path"].lstrip("/")), scope["query_string"].decode("latin-1")),
+            "query": scope["query_string"].decode("latin-1"),
+            "bodyBytes": bytes_in,
+            "status": status,
+            "latencyMs": round((time.perf_counter() - trace.started) * 1000, 1),
+        }
+        if body:
+            try:
+                entry["body"] = redact(json.loads(body))
+            except ValueError:
+                pass
+        self.capture.info(json.dumps(entry, separators=(",", ":"), ensure_ascii=False))
+
+
+class AuthMiddleware:
+    """Middleware ASGI: respinge con 401 le richieste senza un JWT valido prima di Next.js."""
+
+    def __init__(self, app):
+        self.app = app
+        self.enabled = VERIFY_AUTH and bool(JWT_SECRET)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # L'header dei claim lo scrive solo il proxy: quello del client viene scartato.
+        headers = [(k, v) for k, v in scope["headers"] if k != CLAIMS_HEADER]
+        path = upstream_path(scope["path"].lstrip("/"))
+        public = (
+            scope["path"].startswith("/__")
+            or path.split("/")[1] in STATIC_DIRS
+            or any(path_matches(path, prefix) for prefix in PUBLIC_PATHS)
+        )
+        if not self.enabled or public:
+            await self.app({**scope, "headers": headers}, receive, send)
+            return
+
+        request = Request(scope)
+        token = token_from_request(request)
+        claims = verified_token_payload(token)
+        if not claims:
+            await self.reject(scope, receive, send, token, from_cookie="vp_token" in request.cookies)
+            return
+
+        verified = {key: claims.get(key) for key in ("sub", "role", "exp")}
+        headers.append((CLAIMS_HEADER, b64url_encode(json.dumps(verified, separators=(",", ":")).encode()).encode()))
+        await self.app({**scope, "headers": headers, CLAIMS_KEY: claims}, receive, send)
+
+    async def reject(self, scope, receive, send, token: str | None, from_cookie: bool):
+        metrics: ProxyMetrics = scope["app"].state.metrics
+        reason = "invalid" if token else "missing"
+        metrics.auth_rejected[reason] += 1
+        message = "Token non valido o scaduto" if token else "Non autenticato"
+        response = JSONResponse({"error": message}, status_code=401)
+        if token and from_cookie:
+            # Come src/middleware.ts: il cookie scaduto viene cancellato.
+            response.delete_cookie("vp_token", path="/")
+        await response(scope, receive, send)
+
+
+class SpoolMiddleware:
+    """Middleware ASGI: limita la dimensione dei corpi e bufferizza su disco quelli grandi."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in BODYLESS_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        raw_length = dict(scope["headers"]).get(b"content-length")
+        length = int(raw_length) if raw_length and raw_length.isdigit() else None
+        if length is not None and length > MAX_BODY_BYTES:
+            await self.reject(scope, receive, send)
+            return
+        if length is not None and length <= SPOOL_THRESHOLD_BYTES:
+            await self.app(scope, receive, send)
+            return
+
+        with tempfile.TemporaryFile(dir=SPOOL_DIR) as spool:
+            file = anyio.wrap_file(spool)
+            size = 0
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size > MAX_BODY_BYTES:
+                    await self.reject(scope, receive, send)
+                    return
+                await file.write(chunk)
+                if not message.get("more_body", False):
+                    break
+            await file.seek(0)
+
+            # Anche gli upload chunked arrivano a Next.js con una lunghezza nota.
+            headers = [(k, v) for k, v in scope["headers"] if k not in (b"content-length", b"transfer-encoding")]
+            headers.append((b"content-length", str(size).encode()))
+            remaining = size
+            finished = False
+
+            async def replay():
+                # Anche un corpo vuoto va consegnato con un messaggio finale.
+                nonlocal remaining, finished
+                if finished:
+                    return await receive()
+                body = await file.read(min(SPOOL_CHUNK_BYTES, remaining)) if remaining > 0 else b""
+                remaining = remaining - len(body) if body else 0
+                finished = remaining <= 0
+                return {"type": "http.request", "body": body, "more_body": not finished}
+
+            await self.app({**scope, "headers": headers}, replay, send)
+
+    async def reject(self, scope, receive, send):
+        logger.warning("Corpo oltre %s byte respinto per %s %s", MAX_BODY_BYTES, scope["method"], scope["path"])
+        response = JSONResponse({"error": "Richiesta troppo grande"}, status_code=413)
+        await response(scope, receive, send)
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI: il posto resta occupato fino all'ultimo byte della risposta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/__"):
+            await self.app(scope, receive, send)
+            return
+
+        path = upstream_path(scope["path"].lstrip("/"))
+        queues: list[AdmissionQueue] = scope["app"].state.admission_queues
+        queue = next((item for item in queues if item.matches(scope["method"], path)), None)
+        if not queue:
+            await self.app(scope, receive, send)
+            return
+
+        waited = time.perf_counter()
+        try:
+            await queue.acquire()
+        except QueueFull:
+            await self.reject(scope, receive, send, queue, 429, "Troppe richieste in coda, riprova tra poco")
+            return
+        except asyncio.TimeoutError:
+            await self.reject(scope, receive, send, queue, 503, "Servizio occupato, riprova tra poco")
+            return
+        if TRACE_KEY in scope:
+            scope[TRACE_KEY].queue = time.perf_counter() - waited
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            queue.release()
+
+    async def reject(self, scope, receive, send, queue: AdmissionQueue, status: int, message: str):
+        logger.warning("Richiesta %s %s respinta (%s): classe %s satura", scope["method"], scope["path"], status, queue.name)
+        response = JSONResponse({"error": message}, status_code=status, headers={"Retry-After": str(queue.retry_after())})
+        await response(scope, receive, send)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.http_client = httpx.AsyncClient(follow_redirects=False, timeout=60.0)
+    app.state.response_cache = ResponseCache(CACHE_ROUTES, CACHE_MAX_ENTRIES)
+    app.state.single_flight = SingleFlight()
+    app.state.metrics = ProxyMetrics()
+    app.state.admission_queues = build_admission_queues()
+    if CACHE_MAX_ENTRIES > 0 and not JWT_SECRET:
+        logger.info("JWT_SECRET non configurato: cache delle risposte disattivata")
+    limits = httpx.Limits(
+        max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE, keepalive_expiry=KEEPALIVE_EXPIRY
+    )
+    app.state.http_client = httpx.AsyncClient(follow_redirects=False, timeout=60.0, limits=limits)
+    app.state.upstreams = UpstreamPool(TARGETS)
+    health_task = None
+    if len(TARGETS) > 1:
+        health_task = asyncio.create_task(app.state.upstreams.run_health_checks(app.state.http_client))
     try:
         yield
     finally:
+        if health_task:
+            health_task.cancel()
         await app.state.http_client.aclose()
 
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(SpoolMiddleware)
+app.add_middleware(AuthMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
 
 
 def response_headers(headers: httpx.Headers) -> dict[str, str]:
@@ -35,31 +1379,478 @@ def response_headers(headers: httpx.Headers) -> dict[str, str]:
     return {k: v for k, v in headers.items() if k.lower() not in blocked}
 
 
-@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"])
-async def proxy(request: Request, path: str):
-    full_path = f"/api/{path}" if not path.startswith("api/") else f"/{path}"
-    qs = request.url.query
-    url = f"{TARGET}{full_path}"
-    if qs:
-        url += f"?{qs}"
+def request_headers(request: Request, streaming: bool) -> dict[str, str]:
+    # In streaming il content-length del client resta valido: il corpo viene
+    # inoltrato byte per byte e httpx evita cosi' il chunked encoding.
+    blocked = {"host", "transfer-encoding", "accept-encoding"}
+    if not streaming:
+        blocked.add("content-length")
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in blocked}
+    headers["accept-encoding"] = "identity"
+    return headers
+
+
+def has_body(request: Request) -> bool:
+    if request.method in BODYLESS_METHODS:
+        return "content-length" in request.headers or "transfer-encoding" in request.headers
+    return True
+
+
+def upstream_path(path: str) -> str:
+    if path.startswith("api/") or path.split("/", 1)[0] in STATIC_DIRS:
+        return f"/{path}"
+    return f"/api/{path}"
+
 
-    headers = {k: v for k, v in request.headers.items() if k.lower() not in ("host", "content-length")}
-    body = await request.body()
+def target_path(request: Request) -> str:
+    target = upstream_path(request.url.path.lstrip("/"))
+    if request.url.query:
+        target += f"?{request.url.query}"
+    return target
 
+
+async def send_once(request: Request, headers: dict[str, str], content=None) -> tuple[httpx.Response, Upstream]:
     client: httpx.AsyncClient = request.app.state.http_client
-    upstream = await client.request(
-        method=request.method,
-        url=url,
-        headers=headers,
-        content=body,
+    pool: UpstreamPool = request.app.state.upstreams
+    # UpstreamUnavailable (503) se tutti i nodi hanno il breaker aperto
+    node = pool.acquire()
+    probe = node.breaker.state == "half_open"
+    started = sent = time.perf_counter()
+
+    async def on_trace(event: str, info: dict) -> None:
+        # Fine di attesa nel pool e connessione: iniziano a partire gli header.
+        nonlocal sent
+        if event.endswith("send_request_headers.started"):
+            sent = time.perf_counter()
+
+    upstream_request = client.build_request(
+        method=request.method, url=f"{node.url}{target_path(request)}", headers=headers, content=content,
+        extensions={"trace": on_trace},
     )
+    try:
+        upstream = await client.send(upstream_request, stream=True)
+    except BaseException as exc:
+        # Anche la richiesta perdente di un hedge, cancellata, libera il nodo.
+        pool.release(node)
+        if isinstance(exc, httpx.TransportError):
+            pool.record(node, False)
+            node.breaker.record(False)
+        elif probe:
+            # Cancellazione (client disconnesso, hedge perdente): nessun esito, la sonda half_open torna libera
+            node.breaker.abandon()
+        raise
+    node.breaker.record(not is_upstream_failure(upstream))
+    trace = request_trace(request)
+    if trace:
+        trace.upstream_response(node, sent - started, time.perf_counter() - sent)
+    return upstream, node
+
+
+def is_upstream_failure(upstream: httpx.Response) -> bool:
+    """502/503 di Next.js o dell'infrastruttura davanti (pagina d'errore, corpo vuoto).
+
+    Un 502/503 con corpo JSON e' la risposta voluta di una rotta (es. /api/meteo
+    quando il servizio meteo esterno non risponde): non si ritenta e per il
+    circuit breaker il nodo ha risposto.
+    """
+    if upstream.status_code not in RETRY_STATUSES:
+        return False
+    return "application/json" not in upstream.headers.get("content-type", "").lower()
+
+
+async def send_hedged(request: Request, headers: dict[str, str]) -> tuple[httpx.Response, Upstream]:
+    """Se la prima risposta tarda oltre HEDGE_DELAY parte una copia: vince la prima."""
+    pool: UpstreamPool = request.app.state.upstreams
+    first = asyncio.ensure_future(send_once(request, headers))
+    done, _ = await asyncio.wait({first}, timeout=HEDGE_DELAY)
+    if done:
+        return first.result()
+
+    pool.hedges += 1
+    second = asyncio.ensure_future(send_once(request, headers))
+    pending = {first, second}
+    winner: asyncio.Future | None = None
+    try:
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((task for task in done if task.exception() is None), None)
+        if winner is None:
+            raise first.exception() or second.exception()
+        if winner is second:
+            pool.hedge_wins += 1
+        return winner.result()
+    finally:
+        for task in (first, second):
+            if task is not winner:
+                task.cancel()
+                task.add_done_callback(lambda loser: discard_response(request, loser))
+
+
+def discard_response(request: Request, task: asyncio.Future) -> None:
+    # La perdente puo' aver gia' ottenuto la risposta: va chiusa per rilasciare la connessione.
+    if not task.cancelled() and task.exception() is None:
+        asyncio.ensure_future(close_upstream(request, *task.result()))
+
+
+async def open_upstream(request: Request, headers: dict[str, str], content=None) -> tuple[httpx.Response, Upstream]:
+    """Apre la risposta upstream in streaming, con retry, hedging e circuit breaker per nodo."""
+    pool: UpstreamPool = request.app.state.upstreams
+    path = upstream_path(request.url.path.lstrip("/"))
+    idempotent = request.method in BODYLESS_METHODS and content is None
+    hedged = idempotent and len(pool.upstreams) > 1 and any(route_matches(path, request.url.query, spec) for spec in HEDGE_ROUTES)
+    attempts = 1 + (RETRIES if idempotent else 0)
+
+    trace = request_trace(request)
+    # Esiti e sonde dei breaker sono registrati da send_once, nodo per nodo
+    for attempt in range(attempts):
+        if trace:
+            trace.attempts += 1
+        if attempt:
+            pool.retries += 1
+            await asyncio.sleep(RETRY_BACKOFF * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+        try:
+            upstream, node = await (send_hedged(request, headers) if hedged else send_once(request, headers, content))
+        except httpx.TransportError as exc:
+            logger.warning("Upstream non raggiungibile per %s %s: %r", request.method, path, exc)
+            if attempt + 1 < attempts and pool.available():
+                continue
+            raise UpstreamUnavailable(502, "Upstream non raggiungibile") from exc
+
+        if is_upstream_failure(upstream) and attempt + 1 < attempts and pool.available():
+            await close_upstream(request, upstream, node)
+            continue
+        break
 
     if upstream.status_code >= 500:
-        logger.warning("Upstream response %s for %s %s", upstream.status_code, request.method, url)
+        logger.warning("Upstream response %s for %s %s%s", upstream.status_code, request.method, node.url, target_path(request))
+    metrics: ProxyMetrics = request.app.state.metrics
+    metrics.route(path, request.url.query).upstream_statuses[upstream.status_code] += 1
+    return upstream, node
 
-    return Response(
-        content=upstream.content,
+
+async def close_upstream(request: Request, upstream: httpx.Response, node: Upstream) -> None:
+    await upstream.aclose()
+    request.app.state.upstreams.release(node)
+
+
+async def read_upstream(request: Request, headers: dict[str, str], content=None) -> CachedResponse:
+    upstream, node = await open_upstream(request, headers, content)
+    started = time.perf_counter()
+    try:
+        await upstream.aread()
+    finally:
+        await close_upstream(request, upstream, node)
+    trace = request_trace(request)
+    if trace:
+        trace.transfer = time.perf_counter() - started
+    return CachedResponse.from_upstream(upstream)
+
+
+async def forward_buffered(request: Request) -> Response:
+    # I corpi gia' finiti su disco (SpoolMiddleware) non tornano in memoria.
+    if int(request.headers.get("content-length", "0")) > SPOOL_THRESHOLD_BYTES:
+        response = await read_upstream(request, request_headers(request, streaming=True), request.stream())
+    else:
+        response = await read_upstream(request, request_headers(request, streaming=False), await request.body())
+    return response.to_response(request)
+
+
+async def forward_streaming(request: Request) -> Response:
+    upstream, node = await open_upstream(
+        request,
+        request_headers(request, streaming=True),
+        request.stream() if has_body(request) else None,
+    )
+    headers = response_headers(upstream.headers)
+    media_type = upstream.headers.get("content-type")
+    body = upstream.aiter_bytes()
+    encoding = negotiate_encoding(request)
+    length = upstream.headers.get("content-length")
+    event_stream = (media_type or "").lower().startswith("text/event-stream")
+    if event_stream:
+        # Nginx e simili non devono accumulare gli eventi prima di inoltrarli.
+        headers["x-accel-buffering"] = "no"
+    elif encoding and should_compress(upstream.status_code, media_type, int(length) if length else None):
+        body = compress_stream(body, encoding)
+        headers["content-encoding"] = encoding
+        headers["vary"] = "Accept-Encoding"
+    return StreamingResponse(
+        body,
         status_code=upstream.status_code,
-        headers=response_headers(upstream.headers),
-        media_type=upstream.headers.get("content-type"),
+        headers=headers,
+        media_type=media_type,
+        background=BackgroundTask(close_upstream, request, upstream, node),
+    )
+
+
+async def fetch_shared(request: Request, key: tuple[str, str, str]) -> CachedResponse:
+    headers = request_headers(request, streaming=False)
+    single_flight: SingleFlight = request.app.state.single_flight
+    return await single_flight.do(key, lambda: read_upstream(request, headers))
+
+
+async def forward_cached(request: Request, role: str) -> Response:
+    cache: ResponseCache = request.app.state.response_cache
+    key = request_key(upstream_path(request.url.path.lstrip("/")), request.url.query, role)
+    route = cache.route_for(key[0], request.url.query) if cache.enabled else None
+    if not route:
+        return (await fetch_shared(request, key)).to_response(request, "BYPASS")
+
+    cached = cache.get(route, key)
+    if cached:
+        return cached.to_response(request, "HIT")
+
+    generation = cache.generation(route)
+    try:
+        response = await fetch_shared(request, key)
+    except UpstreamUnavailable:
+        stale = cache.get_stale(key)
+        if not stale:
+            raise
+        return stale.to_response(request, "STALE")
+    cache.store(route, key, generation, response)
+    return response.to_response(request, "MISS")
+
+
+def is_shared_route(cache: ResponseCache, path: str, query: str) -> bool:
+    return cache.route_for(path, query) is not None or any(route_matches(path, query, spec) for spec in COALESCE_ROUTES)
+
+
+class StaticFileResponse(Response):
+    """File da disco, intero o per intervallo di byte.
+
+    Usa l'estensione ASGI zero-copy (sendfile) quando il server la offre;
+    uvicorn non la espone e in quel caso il file viene letto a blocchi fuori
+    dall'event loop, senza mai caricarlo tutto in memoria.
+    """
+
+    def __init__(self, path: Path, start: int, length: int, status_code: int, headers: dict[str, str]):
+        super().__init__(status_code=status_code, headers={**headers, "content-length": str(length)})
+        self.path = path
+        self.start = start
+        self.length = length
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({"type": "http.response.zerocopysend", "file": file, "offset": self.start, "count": self.length})
+            return
+
+        async with await anyio.open_file(self.path, "rb") as file:
+            await file.seek(self.start)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await file.read(min(STATIC_CHUNK_BYTES, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b""})
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """Intervallo singolo "bytes=a-b", "bytes=a-" o "bytes=-n"; None se non soddisfacibile."""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        raise ValueError("range multiplo o non in byte")
+    first, _, last = spec.strip().partition("-")
+    if not first:
+        length = int(last)
+        if length <= 0:
+            return None
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return None
+    return start, end
+
+
+def not_modified_since(request: Request, mtime: float) -> bool:
+    header = request.headers.get("if-modified-since")
+    if not header or "if-none-match" in request.headers:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def serve_static(request: Request, directory: str, name: str) -> Response:
+    base = (PUBLIC_DIR / directory).resolve()
+    file_path = (base / name).resolve()
+    if name.startswith(".") or file_path.parent != base or not file_path.is_file():
+        return JSONResponse({"error": "File non trovato"}, status_code=404)
+
+    stat = file_path.stat()
+    # Forte (mtime in nanosecondi): vale anche come validatore di If-Range
+    etag = f'"{stat.st_mtime_ns}-{stat.st_size}"'
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    if TIMESTAMPED_FILE.search(name):
+        cache_control = "public, max-age=31536000, immutable"
+    elif STATIC_DIRS[directory]:
+        cache_control = "private, no-cache"
+    else:
+        cache_control = "public, max-age=300"
+    headers = {
+        "accept-ranges": "bytes",
+        "cache-control": cache_control,
+        "etag": etag,
+        "last-modified": last_modified,
+        "content-type": mimetypes.guess_type(name)[0] or "application/octet-stream",
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), etag) or not_modified_since(request, stat.st_mtime):
+        return Response(status_code=304, headers={k: v for k, v in headers.items() if k != "content-type"})
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # Solo con l'ETag forte: una data o un ETag debole danno il file intero (200)
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except ValueError:
+            byte_range = (0, stat.st_size - 1)
+        if byte_range is None:
+            return Response(status_code=416, headers={"content-range": f"bytes */{stat.st_size}"})
+        start, end = byte_range
+        if (start, end) != (0, stat.st_size - 1):
+            headers["content-range"] = f"bytes {start}-{end}/{stat.st_size}"
+            return StaticFileResponse(file_path, start, end - start + 1, 206, headers)
+
+    return StaticFileResponse(file_path, 0, stat.st_size, 200, headers)
+
+
+@app.api_route("/planimetrie/{name}", methods=["GET", "HEAD"])
+async def planimetrie(request: Request, name: str):
+    return serve_static(request, "planimetrie", name)
+
+
+@app.api_route("/uploads/{name}", methods=["GET", "HEAD"])
+async def uploads(request: Request, name: str):
+    if not JWT_SECRET:
+        # Senza segreto il proxy non puo' verificare il login: decide Next.js.
+        return await forward_streaming(request)
+    if not request_claims(request):
+        return JSONResponse({"error": "Non autenticato"}, status_code=401)
+    return serve_static(request, "uploads", name)
+
+
+@app.exception_handler(UpstreamUnavailable)
+async def upstream_unavailable(request: Request, exc: UpstreamUnavailable):
+    headers = {"Retry-After": str(exc.retry_after)} if exc.retry_after else None
+    return JSONResponse({"error": exc.message}, status_code=exc.status_code, headers=headers)
+
+
+@app.get("/__cache")
+async def cache_stats(request: Request):
+    return JSONResponse({
+        **request.app.state.response_cache.snapshot(),
+        "singleFlight": request.app.state.single_flight.snapshot(),
+    })
+
+
+@app.get("/__metrics")
+async def prometheus_metrics(request: Request):
+    state = request.app.state
+    return Response(
+        content=state.metrics.render(state),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+@app.get("/__upstreams")
+async def upstream_stats(request: Request):
+    return JSONResponse(request.app.state.upstreams.snapshot())
+
+
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"])
+async def proxy(request: Request, path: str):
+    cache: ResponseCache = request.app.state.response_cache
+
+    if request.method == "GET" and JWT_SECRET and is_shared_route(cache, upstream_path(path), request.url.query):
+        payload = request_claims(request)
+        if payload and payload.get("role"):
+            return await forward_cached(request, payload["role"])
+
+    if STREAMING or any(path_matches(upstream_path(path), prefix) for prefix in SSE_ROUTES):
+        response = await forward_streaming(request)
+    else:
+        response = await forward_buffered(request)
+
+    if request.method not in BODYLESS_METHODS and cache.enabled:
+        cache.invalidate_for_write(upstream_path(path))
+    return response
+
+
+def bind_socket() -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in HOST else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((HOST, PORT))
+    sock.listen(2048)
+    return sock
+
+
+def run_worker(index: int) -> None:
+    import uvicorn
+
+    os.environ["PROXY_WORKER_INDEX"] = str(index)
+
+    # "auto" sceglie uvloop e httptools quando sono installati.
+    config = uvicorn.Config(
+        app, loop="auto", http="auto", timeout_graceful_shutdown=DRAIN_TIMEOUT, access_log=False,
     )
+    server = uvicorn.Server(config)
+    logger.info("Worker %s (pid %s) in ascolto su %s:%s", index, os.getpid(), HOST, PORT)
+    server.run(sockets=[bind_socket()])
+
+
+def run_workers() -> None:
+    """Avvia i worker e li riavvia se terminano; SIGTERM/SIGINT avviano il drain."""
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise SystemExit("SO_REUSEPORT non disponibile: avviare con uvicorn server:app --workers N")
+    context = multiprocessing.get_context("spawn")
+    workers: dict[int, multiprocessing.Process] = {}
+    stopping = False
+
+    def start(index: int) -> None:
+        process = context.Process(target=run_worker, args=(index,), name=f"proxy-worker-{index}")
+        process.start()
+        workers[index] = process
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        logger.info("Segnale %s: drain dei worker (max %ss)", signum, DRAIN_TIMEOUT)
+        for process in workers.values():
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(WORKERS):
+        start(index)
+
+    while not stopping:
+        time.sleep(0.5)
+        for index, process in list(workers.items()):
+            if not process.is_alive() and not stopping:
+                logger.warning("Worker %s terminato (exit %s): riavvio", index, process.exitcode)
+                start(index)
+
+    deadline = time.monotonic() + DRAIN_TIMEOUT + 5
+    for process in workers.values():
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            process.kill()
+
+
+if __name__ == "__main__":
+    run_workers()
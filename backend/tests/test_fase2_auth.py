@@ -12,6 +12,9 @@ Tests for:
 import pytest
 import requests
 import os
+import json
+import time
+from datetime import datetime, timedelta
 
 BASE_URL = "http://localhost:3000"
 
@@ -278,6 +281,33 @@ class TestUserManagementAPI:
         )
         assert revert_res.status_code == 200
 
+    def test_deactivation_revokes_cached_user_immediately(self, admin_session, created_worker_session):
+        """Disattivare un utente blocca subito le sue richieste anche con la cache di requireAuth"""
+        users = admin_session.get(f"{BASE_URL}/api/users").json()
+        worker = next((u for u in users if u.get("email") == WORKER_EMAIL), None)
+        if not worker:
+            pytest.skip("Worker user not found")
+
+        # Popola la cache con una richiesta autenticata
+        assert created_worker_session.get(f"{BASE_URL}/api/auth/me").status_code == 200
+
+        admin_session.patch(f"{BASE_URL}/api/users", json={"id": worker["id"], "isActive": False})
+        try:
+            res = created_worker_session.get(f"{BASE_URL}/api/auth/me")
+            assert res.status_code == 403, "Utente disattivato ancora servito dalla cache"
+        finally:
+            admin_session.patch(f"{BASE_URL}/api/users", json={"id": worker["id"], "isActive": True})
+
+    def test_auth_cache_stats(self, admin_session):
+        """GET /api/users?stats=auth-cache espone i contatori della cache utenti"""
+        admin_session.get(f"{BASE_URL}/api/auth/me")
+        res = admin_session.get(f"{BASE_URL}/api/users?stats=auth-cache")
+        assert res.status_code == 200
+        data = res.json()
+        for key in ("hits", "misses", "hitRate", "invalidations", "size"):
+            assert key in data
+        assert data["hits"] > 0
+
 
 class TestAuditAPIAccess:
     """Test /api/audit - ADMIN/REPORT only"""
@@ -397,6 +427,285 @@ class TestNonRegressionFase1:
         assert res.status_code == 200
 
 
+class TestCalendarioSync:
+    """Modalita' finestra (from/to) e delta (since) di /api/calendario"""
+
+    def test_window_mode_returns_cursor(self, admin_session):
+        """GET /api/calendario?from&to restituisce righe e cursore"""
+        res = admin_session.get(f"{BASE_URL}/api/calendario?from=2026-01-01&to=2026-02-01")
+        assert res.status_code == 200, res.text
+        data = res.json()
+        for key in ("eventi", "appuntamenti", "primiContatti", "cursor"):
+            assert key in data, f"Manca {key}"
+        print(f"✅ Finestra: {len(data['eventi'])} eventi, cursore {data['cursor']}")
+
+    def test_window_mode_rejects_invalid_range(self, admin_session):
+        """Date non valide o finestre oltre 400 giorni -> 400"""
+        bad = admin_session.get(f"{BASE_URL}/api/calendario?from=2026-13-01&to=2026-14-01")
+        assert bad.status_code == 400
+        huge = admin_session.get(f"{BASE_URL}/api/calendario?from=2020-01-01&to=2026-01-01")
+        assert huge.status_code == 400
+        print("✅ Finestre non valide rifiutate")
+
+    def test_delta_mode_reports_changes_and_tombstones(self, admin_session):
+        """GET /api/calendario?since restituisce le righe modificate e i tombstone"""
+        cursor = admin_session.get(f"{BASE_URL}/api/calendario?from=2026-01-01&to=2026-02-01").json()["cursor"]
+        created = admin_session.post(f"{BASE_URL}/api/appuntamenti", json={
+            "dataAppuntamento": (datetime.now() + timedelta(days=3)).isoformat(),
+            "clienti": [{"nome": "TEST_DeltaCalendario", "cognome": "Sync", "telefono": "333 0000000"}]
+        })
+        assert created.status_code == 200, created.text
+        app_id = created.json()["id"]
+
+        delta = admin_session.get(f"{BASE_URL}/api/calendario", params={"since": cursor}).json()
+        assert app_id in [a["id"] for a in delta["appuntamenti"]]
+        assert set(delta["deleted"]) == {"eventi", "appuntamenti", "clienti"}
+
+        admin_session.delete(f"{BASE_URL}/api/appuntamenti?id={app_id}")
+        after = admin_session.get(f"{BASE_URL}/api/calendario", params={"since": delta["cursor"]}).json()
+        assert app_id in after["deleted"]["appuntamenti"]
+        print(f"✅ Delta: appuntamento {app_id} creato e poi segnalato come cancellato")
+
+    def test_search_mode_covers_unloaded_months(self, admin_session):
+        """GET /api/calendario?q trova i primi contatti fuori dai mesi caricati dalla pagina"""
+        assert admin_session.get(f"{BASE_URL}/api/calendario", params={"q": "a"}).status_code == 400
+        nome = f"TEST_RicercaCal{int(time.time())}"
+        created = admin_session.post(f"{BASE_URL}/api/clienti", json={
+            "nome": nome,
+            "dataPrimoContatto": (datetime.now() - timedelta(days=400)).isoformat()
+        })
+        assert created.status_code == 201, created.text
+        try:
+            data = admin_session.get(f"{BASE_URL}/api/calendario", params={"q": nome.lower()}).json()
+            assert created.json()["id"] in [c["id"] for c in data["primiContatti"]]
+            print(f"✅ Ricerca calendario: trovato {nome}")
+        finally:
+            admin_session.delete(f"{BASE_URL}/api/clienti", params={"id": created.json()["id"]})
+
+
+class TestLiveEvents:
+    """SSE /api/live: replay dal cursore e filtro per ruolo"""
+
+    def read_change_events(self, session, cursor, entity_id):
+        res = session.get(f"{BASE_URL}/api/live", params={"cursor": cursor}, stream=True, timeout=(5, 10))
+        assert res.status_code == 200, res.text
+        try:
+            for line in res.iter_lines(decode_unicode=True):
+                if line.startswith("data:"):
+                    event = json.loads(line[5:])
+                    if event.get("entityId") == str(entity_id):
+                        return event
+        finally:
+            res.close()
+
+    def test_replay_from_cursor_with_role_filter(self, admin_session, created_worker_session):
+        """Gli eventi persi vengono ripetuti; il WORKER non vede l'email dell'autore"""
+        cursor = f"{int(time.time() * 1000) - 1000}-"
+        created = admin_session.post(f"{BASE_URL}/api/appuntamenti", json={
+            "dataAppuntamento": (datetime.now() + timedelta(days=4)).isoformat(),
+            "clienti": [{"nome": "TEST_LiveReplay", "cognome": "Sse", "telefono": "333 0000002"}]
+        })
+        assert created.status_code == 200, created.text
+        app_id = created.json()["id"]
+        try:
+            admin_event = self.read_change_events(admin_session, cursor, app_id)
+            assert admin_event["entity"] == "appuntamenti" and admin_event["actorEmail"] == ADMIN_EMAIL
+            worker_event = self.read_change_events(created_worker_session, cursor, app_id)
+            assert worker_event["entity"] == "appuntamenti" and "actorEmail" not in worker_event
+        finally:
+            admin_session.delete(f"{BASE_URL}/api/appuntamenti?id={app_id}")
+        print(f"✅ Replay SSE dell'appuntamento {app_id} con filtro per ruolo")
+
+    def test_invalid_cursor_sends_reset(self, admin_session):
+        """Un cursore non valido produce l'evento reset"""
+        res = admin_session.get(f"{BASE_URL}/api/live", params={"cursor": "non-valido"}, stream=True, timeout=(5, 10))
+        try:
+            lines = res.iter_lines(decode_unicode=True)
+            assert any(line == "event: reset" for line, _ in zip(lines, range(6)))
+        finally:
+            res.close()
+        print("✅ Cursore non valido: reset")
+
+
+class TestClientiPagination:
+    """GET /api/clienti paginata: cursore, ordinamento, ricerca, filtro spam"""
+
+    @pytest.fixture(scope="class")
+    def clienti_test(self, admin_session):
+        created = []
+        for nome, spam in (("TEST_PaginaUno", False), ("TEST_PaginaDue", False), ("TEST_PaginaSpam", True)):
+            res = admin_session.post(f"{BASE_URL}/api/clienti", json={"nome": nome, "cognome": "Paginazione", "isSpam": spam})
+            assert res.status_code == 201, res.text
+            created.append(res.json()["id"])
+        yield created
+        for cliente_id in created:
+            admin_session.delete(f"{BASE_URL}/api/clienti?id={cliente_id}")
+
+    def test_cursor_walks_all_matches_once(self, admin_session, clienti_test):
+        """Pagine da 1 con cursore: ogni cliente una sola volta, total coerente"""
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 1, "q": "paginazione", "sort": "-createdAt"}
+            if cursor:
+                params["cursor"] = cursor
+            page = admin_session.get(f"{BASE_URL}/api/clienti", params=params).json()
+            assert page["total"] == 3 and len(page["items"]) <= 1
+            seen += [item["id"] for item in page["items"]]
+            cursor = page["nextCursor"]
+            if not cursor:
+                break
+        assert seen == sorted(clienti_test, reverse=True)
+        print(f"✅ Paginazione a cursore: {seen}")
+
+    def test_spam_filter_and_stats(self, admin_session, clienti_test):
+        """isSpam filtra e statsPreEvento e' presente su ogni riga"""
+        page = admin_session.get(f"{BASE_URL}/api/clienti", params={"limit": 10, "q": "Paginazione", "isSpam": "true"}).json()
+        assert [item["id"] for item in page["items"]] == [clienti_test[2]]
+        stats = page["items"][0]["statsPreEvento"]
+        # Il POST registra l'interazione di primo contatto (durata 0)
+        assert stats == {"totaleAppuntamenti": 0, "tempoTotaleDedicatoMin": 0, "totaleInterazioni": 1}
+        print("✅ Filtro isSpam e statsPreEvento aggregate")
+
+    def test_invalid_sort_and_cursor_rejected(self, admin_session):
+        """sort sconosciuto o cursore malformato -> 400"""
+        assert admin_session.get(f"{BASE_URL}/api/clienti", params={"sort": "password"}).status_code == 400
+        assert admin_session.get(f"{BASE_URL}/api/clienti", params={"limit": 5, "cursor": "xyz"}).status_code == 400
+        print("✅ Parametri non validi rifiutati")
+
+    def test_legacy_list_still_array(self, admin_session):
+        """Senza limit/cursor la risposta resta una lista"""
+        res = admin_session.get(f"{BASE_URL}/api/clienti")
+        assert res.status_code == 200 and isinstance(res.json(), list)
+
+
+class TestEventiListProjection:
+    """GET /api/eventi in modalita' lista: fields, filtri e cursore"""
+
+    def test_fields_projection_skips_heavy_json(self, admin_session):
+        """fields= restituisce solo le colonne chieste (piu' id e dataConfermata)"""
+        res = admin_session.get(f"{BASE_URL}/api/eventi", params={"fields": "titolo,stato,clienti"})
+        assert res.status_code == 200, res.text
+        for evento in res.json():
+            assert set(evento) == {"id", "dataConfermata", "titolo", "stato", "clienti"}
+        print(f"✅ Proiezione eventi: {len(res.json())} righe senza JSON pesanti")
+
+    def test_unknown_field_and_bad_date_rejected(self, admin_session):
+        """Campi sconosciuti o date malformate -> 400"""
+        assert admin_session.get(f"{BASE_URL}/api/eventi", params={"fields": "passwordHash"}).status_code == 400
+        assert admin_session.get(f"{BASE_URL}/api/eventi", params={"from": "ieri"}).status_code == 400
+
+    def test_cursor_pages_follow_data_confermata(self, admin_session):
+        """Le pagine coprono tutti gli eventi filtrati una volta sola, in ordine di data"""
+        params = {"fields": "titolo", "from": "2000-01-01", "to": "2100-01-01", "limit": 2}
+        seen, cursor, total = [], None, None
+        while True:
+            page = admin_session.get(f"{BASE_URL}/api/eventi", params={**params, **({"cursor": cursor} if cursor else {})}).json()
+            total = page["total"]
+            seen += page["items"]
+            cursor = page["nextCursor"]
+            if not cursor:
+                break
+        assert len(seen) == total and len({e["id"] for e in seen}) == total
+        date = [e["dataConfermata"] for e in seen]
+        assert date == sorted(date)
+        print(f"✅ Paginazione eventi: {total} eventi in ordine di dataConfermata")
+
+    def test_stato_filter(self, admin_session):
+        """stato=a,b filtra sugli stati indicati"""
+        res = admin_session.get(f"{BASE_URL}/api/eventi", params={"fields": "stato", "stato": "confermato,annullato"})
+        assert res.status_code == 200
+        assert all(e["stato"] in ("confermato", "annullato") for e in res.json())
+
+
+class TestEventiJsonPatch:
+    """PATCH /api/eventi: JSON Patch su piantina e menu con If-Match su updatedAt"""
+
+    @pytest.fixture(scope="class")
+    def evento_test(self, admin_session):
+        created = admin_session.post(f"{BASE_URL}/api/eventi", json={
+            "tipo": "matrimonio",
+            "titolo": "TEST_JsonPatch",
+            "dataConfermata": (datetime.now() + timedelta(days=120)).isoformat(),
+            "disposizioneSala": {"tavoli": [{"id": 1, "x": 10, "y": 20}], "stazioni": []},
+            "clienti": [{"nome": "TEST_JsonPatch", "cognome": "Piantina", "telefono": "333 0000001"}]
+        })
+        assert created.status_code == 200, created.text
+        yield created.json()
+        admin_session.delete(f"{BASE_URL}/api/eventi?id={created.json()['id']}")
+
+    def test_missing_if_match_returns_428(self, admin_session, evento_test):
+        """Senza If-Match la patch non viene applicata"""
+        res = admin_session.patch(f"{BASE_URL}/api/eventi?id={evento_test['id']}", json=[
+            {"op": "replace", "path": "/disposizioneSala/tavoli/0/x", "value": 99}
+        ])
+        assert res.status_code == 428, res.text
+
+    def test_path_outside_patchable_fields_rejected(self, admin_session, evento_test):
+        """Solo menu, disposizioneSala, disposizioneSalaPianoB e pianoAttivo sono modificabili"""
+        res = admin_session.patch(
+            f"{BASE_URL}/api/eventi?id={evento_test['id']}",
+            json=[{"op": "replace", "path": "/titolo", "value": "x"}],
+            headers={"If-Match": evento_test["updatedAt"]}
+        )
+        assert res.status_code == 400, res.text
+
+    def test_patch_moves_table_and_bumps_updated_at(self, admin_session, evento_test):
+        """Una patch valida aggiorna solo il tavolo e restituisce il nuovo updatedAt; il vecchio diventa 412"""
+        evento_id = evento_test["id"]
+        current = admin_session.get(f"{BASE_URL}/api/eventi?id={evento_id}").json()
+        res = admin_session.patch(
+            f"{BASE_URL}/api/eventi?id={evento_id}",
+            json=[
+                {"op": "test", "path": "/disposizioneSala/tavoli/0/id", "value": 1},
+                {"op": "replace", "path": "/disposizioneSala/tavoli/0/x", "value": 42},
+                {"op": "replace", "path": "/pianoAttivo", "value": "B"}
+            ],
+            headers={"If-Match": current["updatedAt"]}
+        )
+        assert res.status_code == 200, res.text
+        assert res.json()["updatedAt"] != current["updatedAt"]
+        assert res.headers.get("etag")
+
+        after = admin_session.get(f"{BASE_URL}/api/eventi?id={evento_id}").json()
+        sala = after["disposizioneSala"]
+        sala = json.loads(sala) if isinstance(sala, str) else sala
+        assert sala["tavoli"][0] == {"id": 1, "x": 42, "y": 20}
+        assert after["pianoAttivo"] == "B"
+        assert after["titolo"] == "TEST_JsonPatch"
+
+        stale = admin_session.patch(
+            f"{BASE_URL}/api/eventi?id={evento_id}",
+            json=[{"op": "replace", "path": "/disposizioneSala/tavoli/0/x", "value": 0}],
+            headers={"If-Match": current["updatedAt"]}
+        )
+        assert stale.status_code == 412, stale.text
+        assert stale.json()["updatedAt"] == after["updatedAt"]
+        print(f"✅ JSON Patch evento {evento_id}: tavolo spostato, If-Match vecchio -> 412")
+
+    def test_failing_test_op_returns_422(self, admin_session, evento_test):
+        """Un'operazione test fallita annulla tutta la patch"""
+        current = admin_session.get(f"{BASE_URL}/api/eventi?id={evento_test['id']}").json()
+        res = admin_session.patch(
+            f"{BASE_URL}/api/eventi?id={evento_test['id']}",
+            json=[
+                {"op": "replace", "path": "/disposizioneSala/tavoli/0/y", "value": 0},
+                {"op": "test", "path": "/disposizioneSala/tavoli/0/id", "value": 999}
+            ],
+            headers={"If-Match": current["updatedAt"]}
+        )
+        assert res.status_code == 422, res.text
+        assert admin_session.get(f"{BASE_URL}/api/eventi?id={evento_test['id']}").json()["updatedAt"] == current["updatedAt"]
+
+    def test_audit_stores_only_the_patch(self, admin_session, evento_test):
+        """La riga audit della patch contiene le operazioni, non i JSON interi"""
+        res = admin_session.get(f"{BASE_URL}/api/audit", params={"entityType": "EVENT", "entityId": evento_test["id"]})
+        assert res.status_code == 200
+        row = next(r for r in res.json() if r["action"] == "UPDATE")
+        assert row["changedFields"]["disposizioneSala"]["patch"][0]["op"] == "test"
+        assert row["metadata"]["jsonPatch"] is True
+        assert "disposizioneSala" not in json.dumps(row["newValue"])
+
+
 class TestCleanup:
     """Cleanup test users created during testing"""
 
@@ -10,6 +10,7 @@ Tests for:
 import pytest
 import requests
 import os
+import time
 
 BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'http://127.0.0.1:3000')
 
@@ -251,6 +252,174 @@ class TestSpamPolicyConsistency:
         assert data["summary"]["contactsPrimary"] == data["summary"]["contactsValid"]
 
 
+class TestReportAggregates:
+    """Aggregati calcolati dal database e pagina clienti"""
+
+    def test_breakdowns_add_up_to_summary(self, auth_session):
+        """Fonti, operatori ed esiti sono coerenti con i totali del riepilogo"""
+        data = auth_session.get(f"{BASE_URL}/api/report/stats", params={"period": "year"}).json()
+        summary = data["summary"]
+        assert sum(s["contactsTotal"] for s in data["sources"]) == summary["contactsTotal"]
+        assert sum(o["appointmentsScheduled"] for o in data["operators"]) == summary["appointmentsScheduled"]
+        assert sum(o["appointmentsCompleted"] for o in data["operators"]) == summary["appointmentsCompleted"]
+        assert sum(o["interactionsCount"] for o in data["operators"]) == summary["interactionsCount"]
+        assert sum(o["confirmedEvents"] for o in data["operators"]) == summary["confirmedEvents"]
+        assert sum(o["totalTimeMinutes"] for o in data["operators"]) == summary["totalTimeMinutes"]
+        assert sum(o["count"] for o in data["outcomes"]) <= summary["appointmentsScheduled"]
+        assert sum(p["appointments"] for p in data["trend"]) <= summary["appointmentsScheduled"]
+        assert sum(p["completedAppointments"] for p in data["trend"]) <= summary["appointmentsCompleted"]
+        print(f"✅ Aggregati annuali coerenti: {summary['appointmentsScheduled']} appuntamenti, {summary['clientsCount']} clienti")
+
+    def test_client_pages_cover_all_clients_once(self, auth_session):
+        """clientsOffset/clientsLimit scorrono tutti i clienti del periodo senza duplicati"""
+        params = {"period": "year", "clientsLimit": 2}
+        seen, offset = [], 0
+        while True:
+            data = auth_session.get(f"{BASE_URL}/api/report/stats", params={**params, "clientsOffset": offset}).json()
+            seen += [c["clientId"] for c in data["clients"]]
+            offset += len(data["clients"])
+            if not data["clients"] or offset >= data["clientsPage"]["total"]:
+                break
+        assert len(seen) == len(set(seen)) == data["summary"]["clientsCount"] == data["clientsPage"]["total"]
+
+    def test_clients_limit_zero_keeps_counts(self, auth_session):
+        """clientsLimit=0 (dashboard) non carica righe ma conserva i conteggi"""
+        full = auth_session.get(f"{BASE_URL}/api/report/stats", params={"period": "month"}).json()
+        light = auth_session.get(f"{BASE_URL}/api/report/stats", params={"period": "month", "clientsLimit": 0}).json()
+        assert light["clients"] == []
+        assert light["summary"] == full["summary"]
+        assert light["trend"] == full["trend"]
+
+
+class TestReportRollup:
+    """Trend letti dal rollup giornaliero (ReportGiornaliero)"""
+
+    def test_trend_follows_writes(self, auth_session):
+        """Un contatto nuovo compare nel trend e sparisce quando il cliente viene cancellato"""
+        source = f"TEST_rollup_{int(time.time() * 1000)}"
+        created = auth_session.post(f"{BASE_URL}/api/clienti", json={"nome": "TEST_Rollup", "canalePrimoContatto": source})
+        assert created.status_code == 201
+        client_id = created.json()["id"]
+        params = {"period": "month", "source": source, "clientsLimit": 0}
+        try:
+            data = auth_session.get(f"{BASE_URL}/api/report/stats", params=params).json()
+            assert sum(p["contacts"] for p in data["trend"]) == data["summary"]["contactsTotal"] == 1
+            assert sum(p["interactions"] for p in data["trend"]) == data["summary"]["interactionsCount"]
+        finally:
+            auth_session.delete(f"{BASE_URL}/api/clienti", params={"id": client_id})
+        data = auth_session.get(f"{BASE_URL}/api/report/stats", params=params).json()
+        assert sum(p["contacts"] for p in data["trend"]) == 0
+        print(f"✅ Rollup aggiornato dopo creazione e cancellazione del cliente {client_id}")
+
+    def test_trend_matches_summary_for_linked_clients(self, auth_session):
+        """Un appuntamento conta per la fonte di ogni cliente collegato, nel trend come nei totali"""
+        stamp = int(time.time() * 1000)
+        sources = [f"TEST_rollup_a_{stamp}", f"TEST_rollup_b_{stamp}"]
+        client_ids = []
+        appointment_id = None
+        try:
+            for index, source in enumerate(sources):
+                created = auth_session.post(f"{BASE_URL}/api/clienti", json={"nome": f"TEST_RollupLink{index}", "canalePrimoContatto": source})
+                assert created.status_code == 201
+                client_ids.append(created.json()["id"])
+            created = auth_session.post(f"{BASE_URL}/api/appuntamenti", json={
+                "dataAppuntamento": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+                "clientePrincipaleId": client_ids[0],
+                "clienti": [{"id": client_id} for client_id in client_ids]
+            })
+            assert created.status_code == 200
+            appointment_id = created.json()["id"]
+            for source in sources:
+                # week include gli spam, month li esclude
+                for period in ("week", "month"):
+                    data = auth_session.get(f"{BASE_URL}/api/report/stats", params={
+                        "period": period, "source": source, "clientsLimit": 0
+                    }).json()
+                    assert data["summary"]["appointmentsScheduled"] == 1
+                    assert sum(p["appointments"] for p in data["trend"]) == data["summary"]["appointmentsScheduled"]
+            print(f"✅ Trend e totali allineati per l'appuntamento {appointment_id} con due fonti")
+        finally:
+            if appointment_id:
+                auth_session.delete(f"{BASE_URL}/api/appuntamenti", params={"id": appointment_id})
+            for client_id in client_ids:
+                auth_session.delete(f"{BASE_URL}/api/clienti", params={"id": client_id})
+
+    def test_source_filter_matches_stored_spaces(self, auth_session):
+        """Una fonte salvata con spazi compare nel menu senza spazi e il filtro la trova"""
+        source = f"TEST_fonte_{int(time.time() * 1000)}"
+        created = auth_session.post(f"{BASE_URL}/api/clienti", json={"nome": "TEST_FonteSpazi", "canalePrimoContatto": f"{source}  "})
+        assert created.status_code == 201
+        client_id = created.json()["id"]
+        try:
+            data = auth_session.get(f"{BASE_URL}/api/report/stats", params={"period": "week", "clientsLimit": 0}).json()
+            assert source in [option["value"] for option in data["availableFilters"]["sources"]]
+            data = auth_session.get(f"{BASE_URL}/api/report/stats", params={"period": "week", "source": source}).json()
+            assert data["summary"]["contactsTotal"] == 1
+            assert sum(p["contacts"] for p in data["trend"]) == 1
+            assert [client["clientId"] for client in data["clients"]] == [client_id]
+            print(f"✅ Filtro fonte '{source}' trova il cliente salvato con spazi")
+        finally:
+            auth_session.delete(f"{BASE_URL}/api/clienti", params={"id": client_id})
+
+    def test_backfill_keeps_trend(self, auth_session):
+        """Il backfill ricalcola il periodo senza cambiare il trend"""
+        params = {"period": "year", "referenceDate": "2026-03-20", "clientsLimit": 0}
+        before = auth_session.get(f"{BASE_URL}/api/report/stats", params=params).json()
+        response = auth_session.post(f"{BASE_URL}/api/report/rollup", params={"from": "2025-12-31", "to": "2027-01-01"})
+        assert response.status_code == 200
+        assert response.json()["days"] == 367
+        after = auth_session.get(f"{BASE_URL}/api/report/stats", params=params).json()
+        assert after["trend"] == before["trend"]
+
+    def test_backfill_rejects_invalid_dates(self, auth_session):
+        response = auth_session.post(f"{BASE_URL}/api/report/rollup", params={"from": "31/12/2025"})
+        assert response.status_code == 400
+
+
+class TestReportCache:
+    """Cache dei report condivisa da stats ed export"""
+
+    def test_same_period_is_served_from_cache(self, auth_session):
+        """Date diverse nello stesso mese usano la stessa voce; l'export la riusa"""
+        params = {"period": "month", "referenceDate": "2026-03-02", "clientsLimit": 0}
+        auth_session.get(f"{BASE_URL}/api/report/stats", params=params)
+        response = auth_session.get(f"{BASE_URL}/api/report/stats", params={**params, "referenceDate": "2026-03-28"})
+        assert response.status_code == 200
+        assert response.headers["X-Report-Cache"] == "HIT"
+        assert "report;" in response.headers["Server-Timing"]
+        assert response.json()["appliedFilters"]["referenceDate"] == "2026-03-28"
+        export = auth_session.get(f"{BASE_URL}/api/report/azienda.xlsx", params={"period": "month", "referenceDate": "2026-03-15"})
+        assert export.status_code == 200
+        assert export.headers["X-Report-Cache"] == "HIT"
+        print("✅ Report mensile servito dalla cache a stats ed export")
+
+    def test_write_invalidates_cache(self, auth_session):
+        """Una scrittura su un cliente svuota la cache"""
+        params = {"period": "month", "clientsLimit": 0}
+        auth_session.get(f"{BASE_URL}/api/report/stats", params=params)
+        created = auth_session.post(f"{BASE_URL}/api/clienti", json={"nome": "TEST_ReportCache"})
+        assert created.status_code == 201
+        try:
+            response = auth_session.get(f"{BASE_URL}/api/report/stats", params=params)
+            assert response.headers["X-Report-Cache"] == "MISS"
+        finally:
+            auth_session.delete(f"{BASE_URL}/api/clienti", params={"id": created.json()["id"]})
+
+    def test_cache_stats(self, auth_session):
+        stats = auth_session.get(f"{BASE_URL}/api/report/stats", params={"stats": "cache"}).json()
+        assert stats["hits"] >= 1 and stats["misses"] >= 1
+        assert {"size", "ttlMs", "hitRate", "invalidations", "averageComputeMs"} <= set(stats)
+
+
+class TestReportParity:
+    """Il calcolo di riferimento sta in scripts/report-parity, non nell'app"""
+
+    def test_parity_route_not_exposed(self, auth_session):
+        response = auth_session.get(f"{BASE_URL}/api/report/parity", params={"period": "week"})
+        assert response.status_code == 404
+        print("✅ /api/report/parity non esposta: parita' con npm run report:parity")
+
+
 class TestUnauthorizedAccess:
     """Test that report APIs require authentication"""
     
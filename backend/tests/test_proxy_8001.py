@@ -0,0 +1,382 @@
+"""
+Proxy FastAPI sulla porta 8001 (backend/server.py)
+Tests:
+1. Streaming pass-through: export xlsx e snapshot storico arrivano integri
+2. Le risposte del proxy coincidono con quelle servite direttamente da Next.js
+3. Cache LRU/TTL delle GET quasi statiche con invalidazione sulle scritture
+4. Single-flight: GET concorrenti identiche su /api/calendario condividono la risposta
+5. /__metrics in formato Prometheus con rotte normalizzate
+6. Compressione gzip/brotli negoziata da Accept-Encoding
+7. ETag e 304 sui poll delle notifiche
+8. Planimetrie servite da disco con Range e If-Modified-Since
+9. Limite alla dimensione dei corpi (413) e spooling degli upload grandi
+10. Stato del circuit breaker, retry e hedging in /__metrics
+11. X-Request-ID propagato e Server-Timing sulle risposte
+12. JWT verificato dal proxy: 401 senza token o con token falsificato
+13. Server-sent events di /api/live inoltrati subito, senza buffer ne' compressione
+"""
+
+import pytest
+import requests
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:3000').rstrip('/')
+PROXY_URL = os.environ.get('PROXY_URL', 'http://localhost:8001').rstrip('/')
+
+ADMIN_EMAIL = "admin@villaparis.local"
+ADMIN_PASSWORD = "Admin123!"
+
+
+@pytest.fixture(scope="module")
+def proxy_session():
+    """Login tramite proxy e restituisce la sessione con cookie"""
+    session = requests.Session()
+    res = session.post(f"{PROXY_URL}/api/auth/login", json={
+        "email": ADMIN_EMAIL,
+        "password": ADMIN_PASSWORD
+    })
+    assert res.status_code == 200, f"Admin login via proxy failed: {res.text}"
+    return session
+
+
+class TestProxyStreaming:
+    """Streaming di richieste e risposte grandi"""
+
+    def test_xlsx_export_streams_intact(self, proxy_session):
+        """GET /api/report/azienda.xlsx via proxy restituisce un file xlsx valido"""
+        res = proxy_session.get(f"{PROXY_URL}/api/report/azienda.xlsx", stream=True)
+        assert res.status_code == 200
+        content = b"".join(res.iter_content(chunk_size=64 * 1024))
+        # Gli xlsx sono archivi zip
+        assert content[:2] == b"PK", "Export xlsx non valido"
+        print(f"✅ Export xlsx via proxy: {len(content)} bytes")
+
+    def test_storico_download_matches_upstream(self, proxy_session):
+        """GET /api/storico?download=1 via proxy coincide con la risposta di Next.js"""
+        direct = requests.get(f"{BASE_URL}/api/storico?download=1", cookies=proxy_session.cookies)
+        proxied = proxy_session.get(f"{PROXY_URL}/api/storico?download=1")
+        assert proxied.status_code == direct.status_code
+        if direct.status_code == 200:
+            assert len(proxied.content) == len(direct.content)
+        print(f"✅ Storico via proxy: status {proxied.status_code}")
+
+    def test_json_post_passes_through(self, proxy_session):
+        """POST con body JSON viene inoltrato senza alterazioni"""
+        res = proxy_session.post(f"{PROXY_URL}/api/auth/login", json={
+            "email": ADMIN_EMAIL,
+            "password": "password-sbagliata"
+        })
+        assert res.status_code == 401
+        print("✅ Body POST inoltrato in streaming")
+
+    def test_live_events_are_not_buffered(self, proxy_session):
+        """GET /api/live via proxy riceve la modifica appena salvata"""
+        stream = proxy_session.get(
+            f"{PROXY_URL}/api/live", stream=True, timeout=(5, 15), headers={"Accept-Encoding": "gzip"}
+        )
+        assert stream.status_code == 200
+        assert stream.headers["content-type"].startswith("text/event-stream")
+        assert "content-encoding" not in stream.headers
+        lines = stream.iter_lines(decode_unicode=True)
+        # La prima riga (retry) arriva solo dopo l'iscrizione agli eventi
+        assert next(lines).startswith("retry:")
+
+        created = proxy_session.post(f"{PROXY_URL}/api/appuntamenti", json={
+            "dataAppuntamento": (datetime.now() + timedelta(days=5)).isoformat(),
+            "clienti": [{"nome": "TEST_LiveProxy", "cognome": "Sse", "telefono": "333 0000001"}]
+        })
+        assert created.status_code == 200, created.text
+        app_id = created.json()["id"]
+        try:
+            event = None
+            for line in lines:
+                if line.startswith("data:"):
+                    payload = json.loads(line[5:])
+                    if payload["entity"] == "appuntamenti" and payload["entityId"] == str(app_id):
+                        event = payload
+                        break
+            assert event and event["action"] == "CREATE"
+        finally:
+            stream.close()
+            proxy_session.delete(f"{PROXY_URL}/api/appuntamenti?id={app_id}")
+        print(f"✅ Evento SSE per l'appuntamento {app_id} ricevuto via proxy")
+
+
+class TestProxyCache:
+    """Cache delle rotte quasi statiche (richiede JWT_SECRET anche sul proxy)"""
+
+    def test_second_get_is_served_from_cache(self, proxy_session):
+        """GET /api/menu-base ripetuta viene servita dalla cache"""
+        first = proxy_session.get(f"{PROXY_URL}/api/menu-base")
+        second = proxy_session.get(f"{PROXY_URL}/api/menu-base")
+        assert first.status_code == 200 and second.status_code == 200
+        assert second.headers.get("x-proxy-cache") == "HIT"
+        assert first.json() == second.json()
+        print("✅ /api/menu-base servita dalla cache del proxy")
+
+    def test_write_invalidates_route_prefix(self, proxy_session):
+        """Una POST su /api/menu-base invalida la cache del prefisso"""
+        proxy_session.get(f"{PROXY_URL}/api/menu-base")
+        created = proxy_session.post(f"{PROXY_URL}/api/menu-base", json={
+            "nome": "TEST_Proxy_Cache",
+            "struttura": {}
+        })
+        assert created.status_code in (200, 201)
+        after = proxy_session.get(f"{PROXY_URL}/api/menu-base")
+        assert after.headers.get("x-proxy-cache") == "MISS"
+        assert any(menu.get("nome") == "TEST_Proxy_Cache" for menu in after.json())
+        menu_id = created.json().get("id")
+        if menu_id:
+            proxy_session.delete(f"{PROXY_URL}/api/menu-base?id={menu_id}")
+        print("✅ Scrittura su /api/menu-base invalida la cache")
+
+    def test_cache_stats_exposed(self):
+        """GET /__cache espone contatori hit/miss"""
+        res = requests.get(f"{PROXY_URL}/__cache")
+        assert res.status_code == 200
+        data = res.json()
+        assert "hits" in data and "misses" in data
+        assert "/api/menu-base" in data["routes"]
+        print(f"✅ Cache stats: {data['hits']} hit / {data['misses']} miss")
+
+
+class TestProxySingleFlight:
+    """Accorpamento delle GET identiche in volo"""
+
+    def test_concurrent_calendario_requests_are_coalesced(self, proxy_session):
+        """10 GET /api/calendario parallele restituiscono lo stesso payload"""
+        before = requests.get(f"{PROXY_URL}/__cache").json()["singleFlight"]
+
+        def load(_):
+            return proxy_session.get(f"{PROXY_URL}/api/calendario")
+
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            responses = list(pool.map(load, range(10)))
+
+        assert all(res.status_code == 200 for res in responses)
+        assert len({res.content for res in responses}) == 1
+        after = requests.get(f"{PROXY_URL}/__cache").json()["singleFlight"]
+        assert after["leaders"] - before["leaders"] < 10, "Nessuna richiesta accorpata"
+        print(f"✅ Calendario: {after['shared'] - before['shared']} richieste accorpate")
+
+
+class TestProxyMetrics:
+    """Endpoint /__metrics"""
+
+    def test_metrics_normalize_query_values(self, proxy_session):
+        """Le GET /api/eventi?id=N finiscono tutte sotto la rotta /api/eventi?id=*"""
+        proxy_session.get(f"{PROXY_URL}/api/eventi?id=1")
+        proxy_session.get(f"{PROXY_URL}/api/eventi?id=2")
+        res = requests.get(f"{PROXY_URL}/__metrics")
+        assert res.status_code == 200
+        assert res.headers["content-type"].startswith("text/plain")
+        body = res.text
+        assert 'route="/api/eventi?id=*"' in body
+        assert 'route="/api/eventi?id=1"' not in body
+        for metric in ("proxy_requests_total", "proxy_request_duration_seconds_bucket",
+                       "proxy_response_bytes_total", "proxy_requests_in_flight"):
+            assert metric in body, f"{metric} mancante"
+        print("✅ /__metrics espone metriche per rotta normalizzata")
+
+
+    def test_metrics_expose_resilience_counters(self, proxy_session):
+        """Circuit breaker chiuso su ogni nodo e contatori di retry/hedging presenti"""
+        proxy_session.get(f"{PROXY_URL}/api/auth/me")
+        body = requests.get(f"{PROXY_URL}/__metrics").text
+        states = [line for line in body.splitlines() if line.startswith("proxy_circuit_breaker_state{upstream=")]
+        assert states and all(line.endswith(" 0") for line in states)
+        for metric in ("proxy_upstream_retries_total", "proxy_upstream_hedged_requests_total",
+                       "proxy_circuit_breaker_transitions_total"):
+            assert metric in body, f"{metric} mancante"
+        print("✅ Circuit breaker chiuso, contatori di resilienza esposti")
+
+
+class TestProxyTracing:
+    """X-Request-ID e Server-Timing"""
+
+    def test_request_id_is_echoed(self, proxy_session):
+        """Un X-Request-ID valido inviato dal client torna nella risposta"""
+        res = proxy_session.get(f"{PROXY_URL}/api/report/stats", headers={"X-Request-ID": "test-report-42"})
+        assert res.status_code == 200
+        assert res.headers.get("x-request-id") == "test-report-42"
+        timing = res.headers.get("server-timing", "")
+        for phase in ("connect;dur=", "ttfb;dur=", "total;dur="):
+            assert phase in timing, f"{phase} mancante in Server-Timing"
+        print(f"✅ Server-Timing: {timing}")
+
+    def test_request_id_generated_when_missing(self, proxy_session):
+        """Senza X-Request-ID (o con uno non valido) il proxy ne genera uno"""
+        res = proxy_session.get(f"{PROXY_URL}/api/auth/me", headers={"X-Request-ID": "id non valido!"})
+        request_id = res.headers.get("x-request-id")
+        assert request_id and request_id != "id non valido!"
+        print(f"✅ X-Request-ID generato: {request_id}")
+
+
+class TestProxyAuth:
+    """Verifica del JWT nel proxy (richiede JWT_SECRET anche sul proxy)"""
+
+    def test_missing_token_rejected(self):
+        """GET /api/eventi senza cookie riceve 401"""
+        res = requests.get(f"{PROXY_URL}/api/eventi")
+        assert res.status_code == 401
+        assert res.json()["error"] == "Non autenticato"
+        print("✅ Richiesta senza token respinta con 401")
+
+    def test_forged_token_rejected(self):
+        """Un token con firma non valida riceve 401 e il cookie viene cancellato"""
+        forged = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJzdWIiOiJ4Iiwicm9sZSI6IkFETUlOIiwiZXhwIjo0MTAyNDQ0ODAwfQ.firma"
+        res = requests.get(f"{PROXY_URL}/api/eventi", cookies={"vp_token": forged})
+        assert res.status_code == 401
+        assert "vp_token=" in res.headers.get("set-cookie", "")
+        print("✅ Token falsificato respinto con 401")
+
+    def test_non_ascii_signature_rejected(self):
+        """Una firma con caratteri non ASCII riceve 401, non 500"""
+        forged = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJzdWIiOiJ4In0.firm\u00e0"
+        res = requests.get(f"{PROXY_URL}/api/eventi", headers={"Authorization": f"Bearer {forged}"})
+        assert res.status_code == 401
+        print("✅ Firma non ASCII respinta con 401")
+
+    def test_login_stays_public(self):
+        """POST /api/auth/login resta raggiungibile senza token"""
+        res = requests.post(f"{PROXY_URL}/api/auth/login", json={
+            "email": ADMIN_EMAIL,
+            "password": ADMIN_PASSWORD
+        })
+        assert res.status_code == 200
+        print("✅ Login pubblico attraverso il proxy")
+
+
+class TestProxyCompression:
+    """Compressione delle risposte JSON grandi"""
+
+    def test_calendario_is_gzip_compressed(self, proxy_session):
+        """GET /api/calendario con Accept-Encoding: gzip torna compressa"""
+        res = proxy_session.get(f"{PROXY_URL}/api/calendario", headers={"Accept-Encoding": "gzip"})
+        assert res.status_code == 200
+        assert res.headers.get("content-encoding") == "gzip"
+        assert "eventi" in res.json()
+        print("✅ /api/calendario compressa con gzip")
+
+    def test_identity_is_not_compressed(self, proxy_session):
+        """Senza Accept-Encoding la risposta resta in chiaro"""
+        res = proxy_session.get(f"{PROXY_URL}/api/calendario", headers={"Accept-Encoding": "identity"})
+        assert res.status_code == 200
+        assert "content-encoding" not in res.headers
+        print("✅ Accept-Encoding: identity rispettato")
+
+
+class TestProxyConditionalGet:
+    """ETag forte e If-None-Match"""
+
+    def test_notifications_poll_returns_304(self, proxy_session):
+        """Un poll con l'ETag precedente su /api/eventi?summary=notifications riceve 304"""
+        first = proxy_session.get(f"{PROXY_URL}/api/eventi?summary=notifications")
+        assert first.status_code == 200
+        etag = first.headers.get("etag")
+        assert etag, "ETag mancante"
+
+        second = proxy_session.get(
+            f"{PROXY_URL}/api/eventi?summary=notifications",
+            headers={"If-None-Match": etag}
+        )
+        assert second.status_code == 304
+        assert second.content == b""
+        print(f"✅ Notifiche eventi: 304 con ETag {etag}")
+
+    def test_stale_etag_returns_full_body(self, proxy_session):
+        """Un ETag non corrispondente restituisce il corpo completo"""
+        res = proxy_session.get(
+            f"{PROXY_URL}/api/appuntamenti?summary=notifications",
+            headers={"If-None-Match": '"etag-non-valido"'}
+        )
+        assert res.status_code == 200
+        assert isinstance(res.json(), list)
+        print("✅ ETag non valido: corpo completo")
+
+
+class TestProxyStaticFiles:
+    """File statici di public/planimetrie serviti dal proxy"""
+
+    @pytest.fixture(scope="class")
+    def planimetria_url(self, proxy_session):
+        res = proxy_session.get(f"{PROXY_URL}/api/piantine")
+        assert res.status_code == 200
+        items = res.json()
+        if not items:
+            pytest.skip("Nessuna planimetria disponibile")
+        return items[0]["url"]
+
+    def test_planimetria_full_download(self, planimetria_url):
+        """GET /planimetrie/<file> restituisce l'immagine con Last-Modified"""
+        res = requests.get(f"{PROXY_URL}{planimetria_url}")
+        assert res.status_code == 200
+        assert res.headers["content-type"].startswith("image/")
+        assert "last-modified" in res.headers
+        assert res.headers.get("accept-ranges") == "bytes"
+        print(f"✅ {planimetria_url}: {len(res.content)} bytes")
+
+    def test_planimetria_range_request(self, planimetria_url):
+        """Range: bytes=0-99 restituisce 206 con i primi 100 byte"""
+        full = requests.get(f"{PROXY_URL}{planimetria_url}").content
+        res = requests.get(f"{PROXY_URL}{planimetria_url}", headers={"Range": "bytes=0-99"})
+        assert res.status_code == 206
+        assert res.content == full[:100]
+        assert res.headers["content-range"] == f"bytes 0-99/{len(full)}"
+        print("✅ Range request servita con 206")
+
+    def test_planimetria_if_range(self, planimetria_url):
+        """If-Range con l'ETag attuale da' 206, con una data o un ETag diverso il file intero"""
+        first = requests.get(f"{PROXY_URL}{planimetria_url}")
+        etag = first.headers.get("etag")
+        assert etag and not etag.startswith("W/"), "ETag forte mancante"
+        res = requests.get(f"{PROXY_URL}{planimetria_url}", headers={"Range": "bytes=0-99", "If-Range": etag})
+        assert res.status_code == 206
+        for validator in (first.headers["last-modified"], f"W/{etag}", '"0-0"'):
+            res = requests.get(f"{PROXY_URL}{planimetria_url}", headers={"Range": "bytes=0-99", "If-Range": validator})
+            assert res.status_code == 200, validator
+            assert res.content == first.content
+        print("✅ If-Range rispettato solo con l'ETag forte")
+
+    def test_planimetria_not_modified(self, planimetria_url):
+        """If-Modified-Since uguale a Last-Modified restituisce 304"""
+        first = requests.get(f"{PROXY_URL}{planimetria_url}")
+        res = requests.get(
+            f"{PROXY_URL}{planimetria_url}",
+            headers={"If-Modified-Since": first.headers["last-modified"]}
+        )
+        assert res.status_code == 304
+        print("✅ If-Modified-Since rispettato")
+
+    def test_uploads_require_login(self):
+        """/uploads/* senza cookie viene respinto"""
+        res = requests.get(f"{PROXY_URL}/uploads/piatti.json")
+        assert res.status_code == 401
+        print("✅ /uploads richiede autenticazione")
+
+
+class TestProxyUploadLimits:
+    """Spooling su disco e limite PROXY_MAX_BODY_BYTES"""
+
+    def test_oversized_body_rejected_with_413(self, proxy_session):
+        """Un upload oltre il limite (26 MB) riceve 413 dal proxy"""
+        payload = b"0" * (26 * 1024 * 1024)
+        res = proxy_session.post(
+            f"{PROXY_URL}/api/appuntamenti/recording",
+            data=payload,
+            headers={"Content-Type": "application/octet-stream"}
+        )
+        assert res.status_code == 413
+        print("✅ Corpo oltre il limite respinto con 413")
+
+    def test_large_upload_reaches_next(self, proxy_session):
+        """Un upload da 2 MB (sopra la soglia di spooling) arriva integro a Next.js"""
+        files = {"file": ("planimetria-test.png", b"\x89PNG" + b"0" * (2 * 1024 * 1024), "image/png")}
+        res = proxy_session.post(f"{PROXY_URL}/api/piantine", files=files, data={"nome": "TEST proxy spool"})
+        assert res.status_code == 200, res.text
+        url = res.json()["url"]
+        proxy_session.delete(f"{PROXY_URL}/api/piantine?url={url}")
+        print(f"✅ Upload spoolato inoltrato: {url}")
@@ -0,0 +1,20 @@
+CREATE TABLE "ReportGiornaliero" (
+    "id" SERIAL NOT NULL,
+    "giorno" TIMESTAMP(3) NOT NULL,
+    "operatoreId" TEXT NOT NULL DEFAULT '',
+    "fonte" TEXT NOT NULL DEFAULT '',
+    "spam" BOOLEAN NOT NULL DEFAULT false,
+    "esito" TEXT NOT NULL DEFAULT '',
+    "stato" TEXT NOT NULL DEFAULT '',
+    "contatti" INTEGER NOT NULL DEFAULT 0,
+    "contattiSpam" INTEGER NOT NULL DEFAULT 0,
+    "appuntamenti" INTEGER NOT NULL DEFAULT 0,
+    "appuntamentiSvolti" INTEGER NOT NULL DEFAULT 0,
+    "interazioni" INTEGER NOT NULL DEFAULT 0,
+    "minuti" INTEGER NOT NULL DEFAULT 0,
+    "eventiConfermati" INTEGER NOT NULL DEFAULT 0,
+
+    CONSTRAINT "ReportGiornaliero_pkey" PRIMARY KEY ("id")
+);
+
+CREATE UNIQUE INDEX "ReportGiornaliero_giorno_operatoreId_fonte_spam_esito_stato_key" ON "ReportGiornaliero"("giorno", "operatoreId", "fonte", "spam", "esito", "stato");
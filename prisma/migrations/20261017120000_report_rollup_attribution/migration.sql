@@ -0,0 +1,11 @@
+-- Attivita' con piu' clienti: una riga per coppia fonte/spam, i flag dicono per quali filtri conta
+ALTER TABLE "ReportGiornaliero" ADD COLUMN "contaTotale" BOOLEAN NOT NULL DEFAULT false,
+ADD COLUMN "contaFonte" BOOLEAN NOT NULL DEFAULT false,
+ADD COLUMN "contaNonSpam" BOOLEAN NOT NULL DEFAULT false;
+
+DROP INDEX "ReportGiornaliero_giorno_operatoreId_fonte_spam_esito_stato_key";
+
+CREATE UNIQUE INDEX "ReportGiornaliero_dimensioni_key" ON "ReportGiornaliero"("giorno", "operatoreId", "fonte", "spam", "esito", "stato", "contaTotale", "contaFonte", "contaNonSpam");
+
+-- Le righe esistenti non hanno i flag: i giorni si ricalcolano alla prima lettura
+DELETE FROM "ReportGiornaliero";
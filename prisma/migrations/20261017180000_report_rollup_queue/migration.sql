@@ -0,0 +1,9 @@
+-- Giorni del rollup da ricalcolare: scritti con i dati, non solo nella memoria del processo
+CREATE TABLE "ReportGiornoDaRicalcolare" (
+    "id" SERIAL NOT NULL,
+    "giorno" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "ReportGiornoDaRicalcolare_pkey" PRIMARY KEY ("id")
+);
+
+CREATE INDEX "ReportGiornoDaRicalcolare_giorno_idx" ON "ReportGiornoDaRicalcolare"("giorno");
@@ -0,0 +1,4 @@
+-- Il rollup passa da giorni UTC a giorni locali del server: le righe e la coda
+-- esistenti hanno l'altra chiave, i giorni si ricalcolano alla prima lettura
+DELETE FROM "ReportGiornaliero";
+DELETE FROM "ReportGiornoDaRicalcolare";
@@ -0,0 +1,50 @@
+/*
+  Backfill del rollup giornaliero dei trend del report (tabella ReportGiornaliero).
+  Chiama POST /api/report/rollup dell'app in esecuzione con un utente ADMIN,
+  cosi' il calcolo resta quello di src/lib/report/rollup.ts.
+
+  Uso:
+  REPORT_ADMIN_EMAIL=... REPORT_ADMIN_PASSWORD=... node scripts/backfill_report_rollup.js [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+*/
+
+const baseUrl = (process.env.REPORT_BASE_URL || 'http://127.0.0.1:3000').replace(/\/+$/, '')
+const email = process.env.REPORT_ADMIN_EMAIL
+const password = process.env.REPORT_ADMIN_PASSWORD
+
+function argument(name) {
+  const index = process.argv.indexOf(`--${name}`)
+  return index >= 0 ? process.argv[index + 1] : undefined
+}
+
+async function main() {
+  if (!email || !password) {
+    throw new Error('REPORT_ADMIN_EMAIL e REPORT_ADMIN_PASSWORD obbligatorie')
+  }
+
+  const login = await fetch(`${baseUrl}/api/auth/login`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ email, password })
+  })
+  if (!login.ok) throw new Error(`login fallito: HTTP ${login.status}`)
+  const token = (login.headers.get('set-cookie') || '').match(/vp_token=([^;]+)/)?.[1]
+  if (!token) throw new Error('login senza cookie vp_token')
+
+  const params = new URLSearchParams()
+  if (argument('from')) params.set('from', argument('from'))
+  if (argument('to')) params.set('to', argument('to'))
+
+  const response = await fetch(`${baseUrl}/api/report/rollup?${params}`, {
+    method: 'POST',
+    headers: { Cookie: `vp_token=${token}` },
+    signal: AbortSignal.timeout(600000)
+  })
+  const result = await response.json()
+  if (!response.ok) throw new Error(result.error || `HTTP ${response.status}`)
+  console.log(`[Report Rollup] ricalcolati ${result.days} giorni (${result.from} → ${result.to}) in ${result.durationMs}ms`)
+}
+
+main().catch((error) => {
+  console.error('[Report Rollup] errore:', error.message || error)
+  process.exit(1)
+})
@@ -0,0 +1,76 @@
+/*
+  Benchmark del lag dell'event loop durante login contemporanei
+  node scripts/bench_password_hashing.js [login_contemporanei]
+
+  Confronta scryptSync (vecchio hashPassword/verifyPassword) con scrypt
+  asincrono nel threadpool di libuv, con gli stessi parametri usati da
+  src/lib/auth.ts (AUTH_SCRYPT_N / AUTH_SCRYPT_R / AUTH_SCRYPT_P).
+  Mentre gira il carico, un timer da 10ms simula le altre richieste API:
+  il ritardo con cui scatta e' il lag percepito dagli altri utenti.
+*/
+
+const { randomBytes, scrypt, scryptSync } = require('crypto')
+const { monitorEventLoopDelay, performance } = require('perf_hooks')
+
+const CONCURRENT_LOGINS = Number(process.argv[2] || 12)
+const N = Number(process.env.AUTH_SCRYPT_N || 16384)
+const r = Number(process.env.AUTH_SCRYPT_R || 8)
+const p = Number(process.env.AUTH_SCRYPT_P || 1)
+const options = { N, r, p, maxmem: 256 * N * r }
+
+function scryptAsync(password, salt) {
+  return new Promise((resolve, reject) => {
+    scrypt(password, salt, 64, options, (error, key) => (error ? reject(error) : resolve(key)))
+  })
+}
+
+async function measure(label, run) {
+  const histogram = monitorEventLoopDelay({ resolution: 1 })
+  let ticks = 0
+  let worstTick = 0
+  let last = performance.now()
+  const timer = setInterval(() => {
+    const now = performance.now()
+    worstTick = Math.max(worstTick, now - last - 10)
+    last = now
+    ticks++
+  }, 10)
+
+  histogram.enable()
+  const started = performance.now()
+  await run()
+  const elapsed = performance.now() - started
+  // Lascia scattare i timer rimasti bloccati, cosi' il loro ritardo viene misurato
+  await new Promise((resolve) => setTimeout(resolve, 30))
+  histogram.disable()
+  clearInterval(timer)
+
+  const ms = (ns) => (ns / 1e6).toFixed(1)
+  console.log(
+    `${label.padEnd(14)} totale ${elapsed.toFixed(0).padStart(5)}ms | lag p50 ${ms(histogram.percentile(50)).padStart(6)}ms` +
+      ` p99 ${ms(histogram.percentile(99)).padStart(6)}ms max ${ms(histogram.max).padStart(6)}ms` +
+      ` | timer 10ms: ${ticks} tick, ritardo massimo ${worstTick.toFixed(1)}ms`
+  )
+}
+
+async function main() {
+  const passwords = Array.from({ length: CONCURRENT_LOGINS }, (_, i) => `Password${i}!`)
+  const salts = passwords.map(() => randomBytes(16).toString('hex'))
+  console.log(`${CONCURRENT_LOGINS} login contemporanei, scrypt N=${N} r=${r} p=${p}, UV_THREADPOOL_SIZE=${process.env.UV_THREADPOOL_SIZE || 4}\n`)
+
+  await measure('scryptSync', async () => {
+    await Promise.all(passwords.map(async (password, i) => {
+      await new Promise((resolve) => setImmediate(resolve))
+      scryptSync(password, salts[i], 64, options)
+    }))
+  })
+
+  await measure('scrypt async', async () => {
+    await Promise.all(passwords.map((password, i) => scryptAsync(password, salts[i])))
+  })
+}
+
+main().catch((e) => {
+  console.error(e)
+  process.exit(1)
+})
@@ -0,0 +1,112 @@
+/*
+  Confronto campo per campo tra il report di riferimento (reference.js) e quello
+  dell'app (GET /api/report/stats), per scripts/report_parity.js.
+*/
+const MAX_DIFFERENCES = 50
+const RECENT_ACTIVITIES_LIMIT = 120
+
+// Campi di ordinamento del calcolo di riferimento. A parita' l'ordine dipende da
+// quello delle righe restituite dal database (findMany senza orderBy): dentro un
+// gruppo di pari si confronta un ordine canonico e la differenza va a parte.
+const SORT_KEYS = {
+  sources: (row) => [row.contactsTotal],
+  operators: (row) => [row.totalTimeMinutes, row.appointmentsScheduled],
+  outcomes: (row) => [row.count],
+  funnels: (row) => [row.count],
+  clients: (row) => [row.latestActivityAt, row.fullName],
+  spamClients: (row) => [row.latestActivityAt, row.fullName],
+  activities: (row) => [row.date]
+}
+
+function canonicalTies(rows, sortKey) {
+  const result = []
+  let run = []
+  const flush = () => {
+    result.push(...run.sort((a, b) => JSON.stringify(a).localeCompare(JSON.stringify(b))))
+    run = []
+  }
+  rows.forEach((row) => {
+    if (run.length && JSON.stringify(sortKey(run[0])) !== JSON.stringify(sortKey(row))) flush()
+    run.push(row)
+  })
+  flush()
+  return result
+}
+
+// Le attivita' recenti sono tagliate a 120: l'ultimo gruppo di pari puo' contenere
+// righe diverse in entrambi i calcoli e resta fuori dal confronto
+function trimLastTies(reference, candidate) {
+  if (reference.length < RECENT_ACTIVITIES_LIMIT) return [reference, candidate]
+  const lastDate = reference[reference.length - 1]?.date
+  return [reference, candidate].map((rows) => rows.filter((row) => row.date !== lastDate))
+}
+
+function collectDifferences(path, reference, candidate, out) {
+  if (out.length >= MAX_DIFFERENCES) return
+  if (Array.isArray(reference) && Array.isArray(candidate)) {
+    if (reference.length !== candidate.length) {
+      out.push({ path: `${path}.length`, reference: reference.length, candidate: candidate.length })
+    }
+    for (let index = 0; index < Math.min(reference.length, candidate.length); index += 1) {
+      collectDifferences(`${path}[${index}]`, reference[index], candidate[index], out)
+    }
+    return
+  }
+  if (reference && candidate && typeof reference === 'object' && typeof candidate === 'object') {
+    new Set([...Object.keys(reference), ...Object.keys(candidate)]).forEach((key) => {
+      collectDifferences(path ? `${path}.${key}` : key, reference[key], candidate[key], out)
+    })
+    return
+  }
+  if (reference !== candidate) out.push({ path, reference, candidate })
+}
+
+// Senza i campi che per costruzione non coincidono: ora di generazione, paginazione
+// clienti e le opzioni costanti dei filtri (esiti e modalita' spam)
+function comparable(report) {
+  const copy = {
+    ...report,
+    meta: { ...report.meta, generatedAt: undefined },
+    availableFilters: { operators: report.availableFilters.operators, sources: report.availableFilters.sources }
+  }
+  delete copy.clientsPage
+  return copy
+}
+
+/**
+ * differences sono valori diversi; orderDifferences le liste con gli stessi
+ * valori in un altro ordine a parita' di chiave.
+ */
+function compareReports(referenceReport, candidateReport) {
+  const reference = comparable(referenceReport)
+  const candidate = comparable(candidateReport)
+
+  const orderDifferences = []
+  Object.entries(SORT_KEYS).forEach(([field, sortKey]) => {
+    let [referenceRows, candidateRows] = [reference[field] || [], candidate[field] || []]
+    if (field === 'activities') [referenceRows, candidateRows] = trimLastTies(referenceRows, candidateRows)
+    reference[field] = canonicalTies(referenceRows, sortKey)
+    candidate[field] = canonicalTies(candidateRows, sortKey)
+    if (
+      JSON.stringify(reference[field]) === JSON.stringify(candidate[field])
+      && JSON.stringify(referenceRows) !== JSON.stringify(candidateRows)
+    ) orderDifferences.push(field)
+  })
+
+  // Il menu fonti non ha ordinamento nel riferimento: stesso insieme in altro ordine e' una differenza d'ordine
+  const referenceSources = reference.availableFilters.sources
+  const candidateSources = candidate.availableFilters.sources
+  const sameSet = JSON.stringify([...referenceSources].sort((a, b) => a.value.localeCompare(b.value)))
+    === JSON.stringify([...candidateSources].sort((a, b) => a.value.localeCompare(b.value)))
+  if (sameSet && JSON.stringify(referenceSources) !== JSON.stringify(candidateSources)) {
+    orderDifferences.push('availableFilters.sources')
+    candidate.availableFilters.sources = referenceSources
+  }
+
+  const differences = []
+  collectDifferences('', reference, candidate, differences)
+
+  return { differences, orderDifferences }
+}
+
+module.exports = { compareReports }
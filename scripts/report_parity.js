@@ -0,0 +1,135 @@
+/*
+  Verifica di parita' del report operativo: per ogni combinazione di filtri calcola
+  il report di riferimento in memoria (scripts/report-parity/reference.js, sullo
+  stesso DATABASE_URL dell'app) e lo confronta con GET /api/report/stats dell'app
+  in esecuzione (utente ADMIN, tutte le pagine clienti). Esce con 1 se un report ha
+  valori diversi; con --strict-order anche per un ordine diverso a parita' di
+  chiave di ordinamento.
+
+  Preparazione: node scripts/seed_report_parity.js --reset, npm run report:backfill
+  e l'app avviata dopo il seed (la cache report e' per processo).
+
+  Uso:
+  REPORT_ADMIN_EMAIL=... REPORT_ADMIN_PASSWORD=... node scripts/report_parity.js [--date YYYY-MM-DD] [--strict-order]
+*/
+
+const { PrismaClient } = require('@prisma/client')
+const { compareReports } = require('./report-parity/compare')
+const { getReferenceOperationalReport } = require('./report-parity/reference')
+
+const prisma = new PrismaClient()
+const CLIENTS_PAGE = 500
+
+const baseUrl = (process.env.REPORT_BASE_URL || 'http://127.0.0.1:3000').replace(/\/+$/, '')
+const email = process.env.REPORT_ADMIN_EMAIL
+const password = process.env.REPORT_ADMIN_PASSWORD
+
+function argument(name) {
+  const index = process.argv.indexOf(`--${name}`)
+  return index >= 0 ? process.argv[index + 1] : undefined
+}
+
+async function login() {
+  const response = await fetch(`${baseUrl}/api/auth/login`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ email, password })
+  })
+  if (!response.ok) throw new Error(`login fallito: HTTP ${response.status}`)
+  const token = (response.headers.get('set-cookie') || '').match(/vp_token=([^;]+)/)?.[1]
+  if (!token) throw new Error('login senza cookie vp_token')
+  return token
+}
+
+async function getJson(token, path) {
+  const response = await fetch(`${baseUrl}${path}`, {
+    headers: { Cookie: `vp_token=${token}` },
+    signal: AbortSignal.timeout(600000)
+  })
+  const result = await response.json()
+  if (!response.ok) throw new Error(`${path}: ${result.error || `HTTP ${response.status}`}`)
+  return result
+}
+
+// Report dell'app con tutti i clienti, pagina per pagina dalla stessa voce di cache
+async function candidateReport(token, filters) {
+  const query = (offset) => new URLSearchParams({ ...filters, clientsOffset: String(offset), clientsLimit: String(CLIENTS_PAGE) })
+  const report = await getJson(token, `/api/report/stats?${query(0)}`)
+  while (report.clients.length < report.clientsPage.total) {
+    const page = await getJson(token, `/api/report/stats?${query(report.clients.length)}`)
+    if (!page.clients.length) break
+    report.clients.push(...page.clients)
+  }
+  return report
+}
+
+// Stessi valori predefiniti di parseReportFilters
+function appliedFilters(filters) {
+  return { operatorId: '', source: '', status: '', spamMode: 'policy', ...filters }
+}
+
+// Ogni periodo con e senza spam, poi i filtri uno alla volta e combinati sul mese
+function filterMatrix(referenceDate, options) {
+  const matrix = []
+  for (const period of ['week', 'month', 'year']) {
+    for (const spamMode of ['policy', 'exclude']) matrix.push({ period, referenceDate, spamMode })
+  }
+  const month = { period: 'month', referenceDate, spamMode: 'policy' }
+  options.sources.forEach((source) => matrix.push({ ...month, source }))
+  options.operators.slice(0, 2).forEach((operatorId) => matrix.push({ ...month, operatorId }))
+  options.statuses.forEach((status) => matrix.push({ ...month, status }))
+  if (options.sources.length && options.operators.length && options.statuses.length) {
+    matrix.push({ ...month, spamMode: 'exclude', source: options.sources[0], operatorId: options.operators[0], status: options.statuses[0] })
+    matrix.push({ period: 'year', referenceDate, spamMode: 'exclude', source: options.sources[0], status: options.statuses[0] })
+  }
+  return matrix
+}
+
+async function main() {
+  if (!email || !password) {
+    throw new Error('REPORT_ADMIN_EMAIL e REPORT_ADMIN_PASSWORD obbligatorie')
+  }
+  const strictOrder = process.argv.includes('--strict-order')
+  const referenceDate = argument('date') || new Date().toISOString().slice(0, 10)
+  const token = await login()
+
+  const { availableFilters } = await getJson(token, `/api/report/stats?${new URLSearchParams({ period: 'year', referenceDate, clientsLimit: '0' })}`)
+  const matrix = filterMatrix(referenceDate, {
+    sources: availableFilters.sources.map((option) => option.value),
+    operators: availableFilters.operators.map((option) => option.value),
+    statuses: availableFilters.statuses.map((option) => option.value).filter(Boolean)
+  })
+
+  let failed = 0
+  for (const filters of matrix) {
+    const referenceStartedAt = Date.now()
+    const reference = await getReferenceOperationalReport(prisma, appliedFilters(filters))
+    const referenceMs = Date.now() - referenceStartedAt
+    const candidateStartedAt = Date.now()
+    const candidate = await candidateReport(token, filters)
+    const candidateMs = Date.now() - candidateStartedAt
+
+    const result = compareReports(reference, candidate)
+    const ok = result.differences.length === 0 && (!strictOrder || result.orderDifferences.length === 0)
+    if (!ok) failed += 1
+    console.log(
+      `${ok ? 'OK  ' : 'DIFF'} ${JSON.stringify(filters)} riferimento ${referenceMs}ms, app ${candidateMs}ms`
+      + (result.orderDifferences.length ? `, ordine diverso: ${result.orderDifferences.join(', ')}` : '')
+    )
+    result.differences.slice(0, 10).forEach((difference) => {
+      console.log(`     ${difference.path}: ${JSON.stringify(difference.reference)} != ${JSON.stringify(difference.candidate)}`)
+    })
+  }
+
+  console.log(`[Report Parity] ${matrix.length - failed}/${matrix.length} combinazioni uguali`)
+  if (failed) process.exitCode = 1
+}
+
+main()
+  .catch((error) => {
+    console.error('[Report Parity] errore:', error.message || error)
+    process.exitCode = 1
+  })
+  .finally(async () => {
+    await prisma.$disconnect()
+  })
@@ -0,0 +1,166 @@
+/*
+  Dati di prova per la verifica di parita' del report operativo (scripts/report_parity.js).
+  Generatore deterministico: stesso --seed, stessi dati. Fonti, esiti e stati hanno
+  varianti con spazi, vuote e nulle; le date hanno millisecondi casuali, cosi' i
+  pari negli ordinamenti sono rari. Scrive con un PrismaClient senza estensioni: dopo il seed
+  serve il backfill del rollup (npm run report:backfill).
+
+  Uso:
+  node scripts/seed_report_parity.js [--clients 100000] [--year 2026] [--seed 42] [--reset]
+  --reset cancella prima i dati di un seed precedente (solo quelli marcati dal seed).
+*/
+
+const { PrismaClient } = require('@prisma/client')
+const { randomBytes, scryptSync } = require('crypto')
+
+const prisma = new PrismaClient()
+
+const SEED_TAG = 'seed-report-parity'
+const EMAIL_DOMAIN = 'parity.seed.local'
+const BATCH = 1000
+
+const SOURCES = ['Instagram', 'Instagram ', ' Instagram', 'Facebook', 'Passaparola', 'Passaparola  ', 'Fiera', 'Web', '', '   ', null]
+const OUTCOMES = [null, '', 'svolto', 'svolto ', 'positivo', ' positivo', 'negativo', 'Svolto', 'rinviato', 'da_fare']
+const FUNNELS = [null, 'in_trattativa', 'opzionato', 'confermato', 'perso']
+const INTERACTION_TYPES = ['telefonata', 'email', 'whatsapp', 'appuntamento']
+const EVENT_TYPES = ['Matrimonio', 'Compleanno', 'Aziendale', 'Appuntamento']
+const EVENT_STATES = ['confermato', 'confermato ', 'opzionato', 'annullato']
+
+function argument(name, fallback) {
+  const index = process.argv.indexOf(`--${name}`)
+  return index >= 0 ? process.argv[index + 1] : fallback
+}
+
+// mulberry32: sequenza pseudo-casuale riproducibile
+function createRandom(seed) {
+  let state = seed >>> 0
+  return () => {
+    state = (state + 0x6d2b79f5) >>> 0
+    let t = state
+    t = Math.imul(t ^ (t >>> 15), t | 1)
+    t ^= t + Math.imul(t ^ (t >>> 7), t | 61)
+    return ((t ^ (t >>> 14)) >>> 0) / 4294967296
+  }
+}
+
+function hashPassword(password) {
+  const salt = randomBytes(16).toString('hex')
+  const hash = scryptSync(password, salt, 64)
+  return `${salt}:${hash.toString('hex')}`
+}
+
+async function reset() {
+  const events = await prisma.evento.deleteMany({ where: { note: SEED_TAG } })
+  // Appuntamenti, collegamenti e interazioni seguono i clienti (onDelete: Cascade)
+  const clients = await prisma.cliente.deleteMany({ where: { notaAnagrafica: SEED_TAG } })
+  const users = await prisma.user.deleteMany({ where: { email: { endsWith: `@${EMAIL_DOMAIN}` } } })
+  console.log(`[Parity Seed] rimossi ${clients.count} clienti, ${events.count} eventi, ${users.count} operatori`)
+}
+
+async function insertInBatches(model, rows, select) {
+  const created = []
+  for (let index = 0; index < rows.length; index += BATCH) {
+    const batch = rows.slice(index, index + BATCH)
+    if (select) created.push(...await prisma[model].createManyAndReturn({ data: batch, select }))
+    else await prisma[model].createMany({ data: batch })
+  }
+  return created
+}
+
+async function main() {
+  const clientsCount = Number(argument('clients', '100000'))
+  const year = Number(argument('year', String(new Date().getFullYear())))
+  const random = createRandom(Number(argument('seed', '42')))
+  if (!Number.isInteger(clientsCount) || clientsCount <= 0 || !Number.isInteger(year)) {
+    throw new Error('--clients e --year devono essere interi positivi')
+  }
+
+  if (process.argv.includes('--reset')) await reset()
+
+  const pick = (items) => items[Math.floor(random() * items.length)]
+  // Dal 15 dicembre dell'anno prima al 15 gennaio del successivo: anche attivita' fuori periodo
+  const from = Date.UTC(year - 1, 11, 15)
+  const span = Date.UTC(year + 1, 0, 15) - from
+  const randomDate = () => new Date(from + Math.floor(random() * span))
+
+  const passwordHash = hashPassword(randomBytes(12).toString('hex'))
+  const operators = await insertInBatches('user', Array.from({ length: 6 }, (_, index) => ({
+    email: `operatore${index + 1}@${EMAIL_DOMAIN}`,
+    passwordHash,
+    role: index === 5 ? 'REPORT' : 'WORKER',
+    isActive: index !== 4
+  })), { id: true })
+  const operatorIds = [...operators.map((operator) => operator.id), null]
+
+  const clients = await insertInBatches('cliente', Array.from({ length: clientsCount }, (_, index) => ({
+    nome: `Parity${index}`,
+    cognome: random() < 0.9 ? pick(['Rossi', 'Bianchi', 'Verdi', 'Russo', 'Ferrari']) : null,
+    email: `cliente${index}@${EMAIL_DOMAIN}`,
+    canalePrimoContatto: pick(SOURCES),
+    dataPrimoContatto: random() < 0.85 ? randomDate() : null,
+    isSpam: random() < 0.08,
+    spamReason: random() < 0.5 ? 'duplicato' : null,
+    notaAnagrafica: SEED_TAG
+  })), { id: true })
+  const clientIds = clients.map((client) => client.id)
+
+  const appointments = await insertInBatches('appuntamento', clientIds.filter(() => random() < 0.35).map((clientId) => ({
+    clientePrincipaleId: clientId,
+    dataAppuntamento: randomDate(),
+    durataMinuti: Math.floor(random() * 120),
+    esito: pick(OUTCOMES),
+    statoFunnel: pick(FUNNELS),
+    riassuntoColloquio: random() < 0.5 ? `Colloquio ${Math.floor(random() * 1000)}` : null,
+    operatoreId: pick(operatorIds)
+  })), { id: true, clientePrincipaleId: true, dataAppuntamento: true, operatoreId: true })
+
+  // Un appuntamento su dieci ha un secondo cliente, spesso con un'altra fonte
+  await insertInBatches('appuntamentoCliente', appointments.filter(() => random() < 0.1).map((appointment) => ({
+    appuntamentoId: appointment.id,
+    clienteId: pick(clientIds),
+    ruolo: 'partner'
+  })).filter((link, index, links) => links.findIndex((other) => other.appuntamentoId === link.appuntamentoId) === index))
+
+  await insertInBatches('interazioneCliente', clientIds.filter(() => random() < 0.3).map((clientId) => {
+    const appointment = random() < 0.3 ? pick(appointments) : null
+    return {
+      clienteId: clientId,
+      appuntamentoId: appointment?.id ?? null,
+      tipo: pick(INTERACTION_TYPES),
+      durataMinuti: Math.floor(random() * 30),
+      sintesi: random() < 0.6 ? `Sintesi ${Math.floor(random() * 1000)}` : null,
+      operatoreId: pick(operatorIds),
+      dataInterazione: randomDate()
+    }
+  }))
+
+  // Eventi con clienti collegati oppure solo con l'appuntamento d'origine
+  const eventRows = appointments.filter(() => random() < 0.25).map((appointment) => ({
+    titolo: `Evento ${appointment.id}`,
+    tipo: pick(EVENT_TYPES),
+    fascia: pick(['pranzo', 'cena']),
+    stato: pick(EVENT_STATES),
+    dataConfermata: random() < 0.9 ? randomDate() : null,
+    appuntamentoOrigineId: random() < 0.8 ? appointment.id : null,
+    note: SEED_TAG,
+    linkedClients: random() < 0.5 ? [appointment.clientePrincipaleId, ...(random() < 0.3 ? [pick(clientIds)] : [])] : []
+  }))
+  const linkedByTitle = new Map(eventRows.map((row) => [row.titolo, row.linkedClients]))
+  const events = await insertInBatches('evento', eventRows.map(({ linkedClients, ...row }) => row), { id: true, titolo: true })
+  await insertInBatches('eventoCliente', events.flatMap((event) => (
+    Array.from(new Set(linkedByTitle.get(event.titolo))).map((clientId) => ({ eventoId: event.id, clienteId: clientId }))
+  )))
+
+  console.log(
+    `[Parity Seed] ${clientIds.length} clienti, ${appointments.length} appuntamenti, ${events.length} eventi, ${operators.length} operatori (anno ${year})`
+  )
+}
+
+main()
+  .catch((error) => {
+    console.error('[Parity Seed] errore:', error.message || error)
+    process.exit(1)
+  })
+  .finally(async () => {
+    await prisma.$disconnect()
+  })
@@ -12,6 +12,7 @@ import {
   Calendar, Plus, Edit, Trash2, UserPlus,
   X, Phone, Mail, Clock, Users, ChevronLeft, ChevronRight
 } from "lucide-react"
+import { isLiveConnected, useLiveEvents } from "@/lib/use-live-events"
 
 // ──────────────────────────────────────────────────
 // SCHEMA COLORI
@@ -109,6 +110,66 @@ function EventTooltip({ info, onClose }: { info: TooltipInfo; onClose: () => voi
   )
 }
 
+type RigheCalendario = {
+  eventi: Record<number, any>
+  appuntamenti: Record<number, any>
+  clienti: Record<number, any>
+}
+
+const CALENDARIO_POLL_MS = 60_000
+// Con SSE collegato il poll resta, piu' lento: copre gli eventi persi da /api/live
+const CALENDARIO_POLL_LIVE_MS = 5 * 60_000
+const CALENDARIO_LIVE_DEBOUNCE_MS = 300
+const CALENDARIO_RICERCA_DEBOUNCE_MS = 250
+
+const chiaveMese = (d: Date) => `${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, '0')}`
+
+// Mesi 'YYYY-MM' toccati dall'intervallo [inizio, fine)
+function mesiTra(inizio: Date, fine: Date) {
+  const mesi: string[] = []
+  const cursore = new Date(inizio.getFullYear(), inizio.getMonth(), 1)
+  while (cursore < fine) {
+    mesi.push(chiaveMese(cursore))
+    cursore.setMonth(cursore.getMonth() + 1)
+  }
+  return mesi
+}
+
+function normalizzaEvento(ev: any) {
+  return {
+    ...ev,
+    dataConfermata: ev.dataConfermata?.split('T')[0] || null,
+    dataPrimoContatto: ev.dataPrimoContatto?.split('T')[0] || null,
+    dateProposte: Array.isArray(ev.dateProposte)
+      ? ev.dateProposte
+      : (typeof ev.dateProposte === 'string' ? JSON.parse(ev.dateProposte || '[]') : [])
+  }
+}
+
+// Primi contatti dei clienti, tolti quelli gia' mostrati come registrazione di un evento
+function primiContattiDa(clienti: any[], eventi: any[]) {
+  const registrazioniEvento = new Set(
+    eventi.flatMap((ev: any) => (
+      ev.dataPrimoContatto
+        ? (Array.isArray(ev.clienti) ? ev.clienti.map((entry: any) => `${entry.cliente?.id || entry.clienteId}-${ev.dataPrimoContatto}`) : [])
+        : []
+    ))
+  )
+
+  return clienti
+    .map((cliente: any) => ({
+      ...cliente,
+      tipo: 'Primo contatto',
+      titolo: [cliente.nome, cliente.cognome].filter(Boolean).join(' ').trim() || 'Primo contatto',
+      dataPrimoContatto: cliente.dataPrimoContatto?.split('T')[0] || null,
+      clientePrincipale: cliente,
+      _isFirstContact: true,
+      stato: cliente.isSpam ? 'spam' : 'registrato'
+    }))
+    .filter((cliente: any) => cliente.dataPrimoContatto)
+    .filter((cliente: any) => !registrazioniEvento.has(`${cliente.id}-${cliente.dataPrimoContatto}`))
+}
+
 // ──────────────────────────────────────────────────
 // PAGINA PRINCIPALE
 // ──────────────────────────────────────────────────
@@ -119,11 +180,12 @@ export default function CalendarioPage() {
   const [role, setRole] = useState<'ADMIN' | 'REPORT' | 'WORKER' | null>(null)
   const [dataSelezionata, setDataSelezionata] = useState(todayIso)
   const [ricercaEvento, setRicercaEvento] = useState('')
+  const [trovati, setTrovati] = useState<{ eventi: any[]; primiContatti: any[] }>({ eventi: [], primiContatti: [] })
   const [filtroVista, setFiltroVista] = useState('tutti')
   const [currentYear, setCurrentYear] = useState(new Date().getFullYear())
-  const [eventi, setEventi] = useState<any[]>([])
-  const [appuntamenti, setAppuntamenti] = useState<any[]>([])
-  const [primiContatti, setPrimiContatti] = useState<any[]>([])
+  const [righe, setRighe] = useState<RigheCalendario>({ eventi: {}, appuntamenti: {}, clienti: {} })
+  const cursoreRef = useRef<string | null>(null)
+  const mesiCaricatiRef = useRef<Set<string>>(new Set())
   const [eventiDelGiorno, setEventiDelGiorno] = useState<any[]>([])
   const [calendarKey, setCalendarKey] = useState(0)
 
@@ -139,6 +201,12 @@ export default function CalendarioPage() {
   const [isSaving, setIsSaving] = useState(false)
   const [status, setStatus] = useState('')
 
+  const eventi = useMemo(() => Object.values(righe.eventi).map(normalizzaEvento), [righe.eventi])
+
+  const appuntamenti = useMemo(() => Object.values(righe.appuntamenti), [righe.appuntamenti])
+
+  const primiContatti = useMemo(() => primiContattiDa(Object.values(righe.clienti), eventi), [eventi, righe.clienti])
+
   const appuntamentiMese = appuntamenti.filter((a: any) => {
     const d = a.dataAppuntamento?.split('T')[0]
     if (!d) return false
@@ -180,52 +248,137 @@ export default function CalendarioPage() {
     return [...daEventi, ...daPrimiContatti, ...daAppuntamenti]
   }, [eventi, primiContatti, appuntamenti])
 
-  const fetchEventi = useCallback(() => {
-    fetch('/api/calendario')
-      .then(async (response) => {
+  const applicaRighe = useCallback((data: any) => {
+    setRighe((prev) => {
+      const next = {
+        eventi: { ...prev.eventi },
+        appuntamenti: { ...prev.appuntamenti },
+        clienti: { ...prev.clienti }
+      }
+      ;(Array.isArray(data.eventi) ? data.eventi : []).forEach((ev: any) => { next.eventi[ev.id] = ev })
+      ;(Array.isArray(data.appuntamenti) ? data.appuntamenti : []).forEach((a: any) => { next.appuntamenti[a.id] = a })
+      ;(Array.isArray(data.primiContatti) ? data.primiContatti : []).forEach((c: any) => { next.clienti[c.id] = c })
+      // Tombstone della modalita' delta: righe cancellate dopo il cursore
+      ;(data.deleted?.eventi || []).forEach((id: number) => { delete next.eventi[id] })
+      ;(data.deleted?.appuntamenti || []).forEach((id: number) => { delete next.appuntamenti[id] })
+      ;(data.deleted?.clienti || []).forEach((id: number) => { delete next.clienti[id] })
+      return next
+    })
+  }, [])
+
+  const caricaCalendario = useCallback(async (query: string) => {
+    const response = await fetch(`/api/calendario?${query}`)
+    const data = await response.json()
+    if (!response.ok) throw new Error(data.error || 'Errore caricamento calendario')
+    applicaRighe(data)
+    return data
+  }, [applicaRighe])
+
+  // Carica solo i mesi della finestra non ancora scaricati
+  const caricaMesi = useCallback(async (inizio: Date, fine: Date) => {
+    const mancanti = mesiTra(inizio, fine).filter((mese) => !mesiCaricatiRef.current.has(mese))
+    if (mancanti.length === 0) return
+    mancanti.forEach((mese) => mesiCaricatiRef.current.add(mese))
+    const [anno, mese] = mancanti[mancanti.length - 1].split('-').map(Number)
+    const from = `${mancanti[0]}-01`
+    const to = `${chiaveMese(new Date(anno, mese, 1))}-01`
+    try {
+      const data = await caricaCalendario(`from=${from}&to=${to}`)
+      if (!cursoreRef.current) cursoreRef.current = data.cursor
+    } catch {
+      mancanti.forEach((mese) => mesiCaricatiRef.current.delete(mese))
+    }
+  }, [caricaCalendario])
+
+  // Poll delta: righe modificate e cancellate dopo l'ultimo cursore
+  const aggiornaDelta = useCallback(async () => {
+    if (!cursoreRef.current) return
+    try {
+      const data = await caricaCalendario(`since=${encodeURIComponent(cursoreRef.current)}`)
+      cursoreRef.current = data.cursor
+    } catch {
+      // Riprova al prossimo poll
+    }
+  }, [caricaCalendario])
+
+  // Poll di riserva: ricarica completa dei mesi gia' scaricati. Toglie anche le righe
+  // sparite senza tombstone; le righe arrivate durante la ricarica restano.
+  const righeRef = useRef(righe)
+  righeRef.current = righe
+  const ricaricaMesi = useCallback(async () => {
+    const mesi = Array.from(mesiCaricatiRef.current).sort()
+    if (mesi.length === 0) return
+    // Mesi consecutivi in un'unica richiesta from/to
+    const intervalli: string[][] = []
+    mesi.forEach((mese) => {
+      const ultimo = intervalli[intervalli.length - 1]
+      const [anno, numero] = (ultimo?.[ultimo.length - 1] || '').split('-').map(Number)
+      if (ultimo && chiaveMese(new Date(anno, numero, 1)) === mese) ultimo.push(mese)
+      else intervalli.push([mese])
+    })
+    const prima = righeRef.current
+    try {
+      const risposte = await Promise.all(intervalli.map(async (intervallo) => {
+        const [anno, mese] = intervallo[intervallo.length - 1].split('-').map(Number)
+        const response = await fetch(`/api/calendario?from=${intervallo[0]}-01&to=${chiaveMese(new Date(anno, mese, 1))}-01`)
         const data = await response.json()
         if (!response.ok) throw new Error(data.error || 'Errore caricamento calendario')
-        const parsedEventi = (Array.isArray(data.eventi) ? data.eventi : []).map((ev: any) => ({
-          ...ev,
-          dataConfermata: ev.dataConfermata?.split('T')[0] || null,
-          dataPrimoContatto: ev.dataPrimoContatto?.split('T')[0] || null,
-          dateProposte: Array.isArray(ev.dateProposte)
-            ? ev.dateProposte
-            : (typeof ev.dateProposte === 'string' ? JSON.parse(ev.dateProposte || '[]') : [])
-        }))
-        const registrazioniEvento = new Set(
-          parsedEventi.flatMap((ev: any) => (
-            ev.dataPrimoContatto
-              ? (Array.isArray(ev.clienti) ? ev.clienti.map((entry: any) => `${entry.cliente?.id || entry.clienteId}-${ev.dataPrimoContatto}`) : [])
-              : []
-          ))
-        )
-
-        const parsedPrimiContatti = (Array.isArray(data.primiContatti) ? data.primiContatti : [])
-          .map((cliente: any) => ({
-            ...cliente,
-            tipo: 'Primo contatto',
-            titolo: [cliente.nome, cliente.cognome].filter(Boolean).join(' ').trim() || 'Primo contatto',
-            dataPrimoContatto: cliente.dataPrimoContatto?.split('T')[0] || null,
-            clientePrincipale: cliente,
-            _isFirstContact: true,
-            stato: cliente.isSpam ? 'spam' : 'registrato'
-          }))
-          .filter((cliente: any) => cliente.dataPrimoContatto)
-          .filter((cliente: any) => !registrazioniEvento.has(`${cliente.id}-${cliente.dataPrimoContatto}`))
-
-        setEventi(parsedEventi)
-        setAppuntamenti(Array.isArray(data.appuntamenti) ? data.appuntamenti : [])
-        setPrimiContatti(parsedPrimiContatti)
-      })
-      .catch(() => {
-        setEventi([])
-        setAppuntamenti([])
-        setPrimiContatti([])
+        return data
+      }))
+      setRighe((prev) => {
+        const next: RigheCalendario = { eventi: {}, appuntamenti: {}, clienti: {} }
+        risposte.forEach((data) => {
+          ;(data.eventi || []).forEach((ev: any) => { next.eventi[ev.id] = ev })
+          ;(data.appuntamenti || []).forEach((a: any) => { next.appuntamenti[a.id] = a })
+          ;(data.primiContatti || []).forEach((c: any) => { next.clienti[c.id] = c })
+        })
+        ;(['eventi', 'appuntamenti', 'clienti'] as const).forEach((tipo) => {
+          Object.entries(prev[tipo]).forEach(([id, riga]) => {
+            if (prima[tipo][Number(id)] !== riga) next[tipo][Number(id)] = riga
+          })
+        })
+        return next
       })
+      // Il cursore piu' vecchio tra le risposte: il delta successivo non perde nulla
+      cursoreRef.current = risposte.map((data) => data.cursor).sort()[0] || cursoreRef.current
+    } catch {
+      // Riprova al prossimo poll
+    }
   }, [])
 
-  useEffect(() => { fetchEventi() }, [fetchEventi, calendarKey])
+  // Mese corrente e prossimi 12: bastano a "Prossimo evento" (oltre un anno non si cerca)
+  useEffect(() => {
+    const oggi = new Date()
+    caricaMesi(new Date(oggi.getFullYear(), oggi.getMonth(), 1), new Date(oggi.getFullYear(), oggi.getMonth() + 13, 1))
+  }, [caricaMesi])
+
+  // Le modifiche arrivano via SSE; piu' salvataggi ravvicinati diventano un solo delta
+  const deltaTimerRef = useRef<ReturnType<typeof setTimeout> | null>(null)
+  const pianificaDelta = useCallback(() => {
+    if (deltaTimerRef.current) clearTimeout(deltaTimerRef.current)
+    deltaTimerRef.current = setTimeout(aggiornaDelta, CALENDARIO_LIVE_DEBOUNCE_MS)
+  }, [aggiornaDelta])
+
+  useLiveEvents((event) => {
+    if (event.entity !== 'presenze') pianificaDelta()
+  }, pianificaDelta)
+
+  // Polling di riserva: ogni minuto con la connessione SSE giu', ogni 5 minuti con SSE attivo
+  const ultimoPollRef = useRef(Date.now())
+  useEffect(() => {
+    const timer = setInterval(() => {
+      const attesa = isLiveConnected() ? CALENDARIO_POLL_LIVE_MS : CALENDARIO_POLL_MS
+      if (Date.now() - ultimoPollRef.current < attesa) return
+      ultimoPollRef.current = Date.now()
+      ricaricaMesi()
+    }, CALENDARIO_POLL_MS)
+    return () => {
+      clearInterval(timer)
+      if (deltaTimerRef.current) clearTimeout(deltaTimerRef.current)
+    }
+  }, [ricaricaMesi])
+
+  useEffect(() => { if (calendarKey > 0) aggiornaDelta() }, [aggiornaDelta, calendarKey])
 
   const goToDate = useCallback((val: string) => {
     if (!val) return
@@ -274,11 +427,43 @@ export default function CalendarioPage() {
     return candidati[0] || null
   }, [eventi, appuntamenti, todayIso])
 
+  // La ricerca va sul server: i mesi caricati non coprono lo storico
+  useEffect(() => {
+    const q = ricercaEvento.trim()
+    if (q.length < 2) {
+      setTrovati({ eventi: [], primiContatti: [] })
+      return
+    }
+    const controller = new AbortController()
+    const timer = setTimeout(async () => {
+      try {
+        const response = await fetch(`/api/calendario?q=${encodeURIComponent(q)}`, { signal: controller.signal })
+        if (response.ok) setTrovati(await response.json())
+      } catch {
+        // Ricerca sostituita da una piu' recente o fallita: restano le righe caricate
+      }
+    }, CALENDARIO_RICERCA_DEBOUNCE_MS)
+    return () => {
+      clearTimeout(timer)
+      controller.abort()
+    }
+  }, [ricercaEvento])
+
   const risultatiRicerca = useMemo(() => {
     const q = ricercaEvento.trim().toLowerCase()
     if (q.length < 2) return []
 
-    const daEventi = eventi
+    // Le righe gia' caricate sono le piu' aggiornate (delta e SSE)
+    const eventiRicerca = [
+      ...trovati.eventi.filter((ev: any) => !righe.eventi[ev.id]).map(normalizzaEvento),
+      ...eventi
+    ]
+    const primiContattiRicerca = [
+      ...primiContattiDa(trovati.primiContatti.filter((cliente: any) => !righe.clienti[cliente.id]), eventiRicerca),
+      ...primiContatti
+    ]
+
+    const daEventi = eventiRicerca
       .map((ev) => {
         const cliente = ev.clienti?.[0]?.cliente
         const nomeCliente = [cliente?.nome, cliente?.cognome].filter(Boolean).join(' ').trim()
@@ -291,7 +476,7 @@ export default function CalendarioPage() {
           search: `${ev.titolo || ''} ${nomeCliente}`.toLowerCase()
         }
       })
-    const daPrimiContatti = primiContatti.map((cliente: any) => ({
+    const daPrimiContatti = primiContattiRicerca.map((cliente: any) => ({
       id: cliente.id,
       titolo: `Primo contatto - ${cliente.titolo}`,
       nomeCliente: cliente.titolo,
@@ -303,7 +488,7 @@ export default function CalendarioPage() {
       .filter((row) => row.data && row.search.includes(q))
       .sort((a, b) => a.data.localeCompare(b.data))
       .slice(0, 8)
-  }, [eventi, primiContatti, ricercaEvento])
+  }, [eventi, primiContatti, ricercaEvento, trovati, righe.eventi, righe.clienti])
 
   const aggiungiGiorni = useCallback((isoDate: string, days: number) => {
     const d = new Date(`${isoDate}T00:00:00`)
@@ -712,7 +897,10 @@ export default function CalendarioPage() {
               right: 'dayGridMonth,dayGridWeek'
             }}
             buttonText={{ today: 'Oggi', month: 'Mese', week: 'Settimana' }}
-            datesSet={(arg) => setCurrentYear(arg.view.currentStart.getFullYear())}
+            datesSet={(arg) => {
+              setCurrentYear(arg.view.currentStart.getFullYear())
+              caricaMesi(arg.start, arg.end)
+            }}
           />
         </CardContent>
       </Card>
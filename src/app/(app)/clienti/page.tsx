@@ -33,9 +33,20 @@ interface Cliente {
     tempoTotaleDedicatoMin: number
     totaleInterazioni: number
   }
-  eventi: { id: number }[]
+  eventi?: { id: number }[]
+  _count?: { eventi: number }
 }
 
+const PAGINA_CLIENTI = 60
+const ORDINAMENTI = [
+  { value: 'cognome', label: 'Cognome A-Z' },
+  { value: '-createdAt', label: 'Inseriti di recente' },
+  { value: '-dataPrimoContatto', label: 'Primo contatto recente' },
+  { value: '-updatedAt', label: 'Modificati di recente' }
+]
+
+const numeroEventi = (c: Cliente) => c._count?.eventi ?? c.eventi?.length ?? 0
+
 const TIPI_CLIENTE = ['sposa', 'sposo', 'festeggiato', 'azienda', 'altro']
 const CANALI = [
   { value: 'telefono',        label: 'Telefono',        icon: '📞' },
@@ -258,39 +269,62 @@ function ClienteForm({
 
 export default function ClientiPage() {
   const [clienti, setClienti] = useState<Cliente[]>([])
-  const [filtrati, setFiltrati] = useState<Cliente[]>([])
+  const [totale, setTotale] = useState(0)
+  const [cursore, setCursore] = useState<string | null>(null)
   const [search, setSearch] = useState('')
+  const [ricerca, setRicerca] = useState('')
+  const [filtroSpam, setFiltroSpam] = useState('')
+  const [ordinamento, setOrdinamento] = useState('cognome')
   const [loading, setLoading] = useState(true)
+  const [caricamentoAltri, setCaricamentoAltri] = useState(false)
   const [mostraForm, setMostraForm] = useState(false)
   const [clienteEdit, setClienteEdit] = useState<Cliente | null>(null)
 
+  // Ricerca, filtro e ordinamento vengono applicati dal server
+  const filtri = useCallback((limit: number, cursor?: string | null) => {
+    const params = new URLSearchParams({ limit: String(limit), sort: ordinamento })
+    if (ricerca) params.set('q', ricerca)
+    if (filtroSpam) params.set('isSpam', filtroSpam)
+    if (cursor) params.set('cursor', cursor)
+    return params.toString()
+  }, [ricerca, filtroSpam, ordinamento])
+
   const fetchClienti = useCallback(async () => {
     try {
-      const res = await fetch('/api/clienti')
+      const res = await fetch(`/api/clienti?${filtri(PAGINA_CLIENTI)}`)
       if (res.ok) {
         const data = await res.json()
-        setClienti(data)
-        setFiltrati(data)
+        setClienti(data.items)
+        setTotale(data.total)
+        setCursore(data.nextCursor)
       }
     } catch { /* ignora */ } finally {
       setLoading(false)
     }
-  }, [])
+  }, [filtri])
+
+  const caricaAltri = async () => {
+    if (!cursore) return
+    setCaricamentoAltri(true)
+    try {
+      const res = await fetch(`/api/clienti?${filtri(PAGINA_CLIENTI, cursore)}`)
+      if (res.ok) {
+        const data = await res.json()
+        setClienti(prev => [...prev, ...data.items])
+        setTotale(data.total)
+        setCursore(data.nextCursor)
+      }
+    } catch { /* ignora */ } finally {
+      setCaricamentoAltri(false)
+    }
+  }
 
   useEffect(() => { fetchClienti() }, [fetchClienti])
 
   useEffect(() => {
-    const q = search.toLowerCase()
-    setFiltrati(
-      q ? clienti.filter(c =>
-        c.nome.toLowerCase().includes(q) ||
-        (c.cognome ?? '').toLowerCase().includes(q) ||
-        (c.email ?? '').toLowerCase().includes(q) ||
-        (c.telefono ?? '').includes(q) ||
-        (c.citta ?? '').toLowerCase().includes(q)
-      ) : clienti
-    )
-  }, [search, clienti])
+    const timer = setTimeout(() => setRicerca(search.trim()), 300)
+    return () => clearTimeout(timer)
+  }, [search])
 
   const handleSave = () => {
     setMostraForm(false)
@@ -304,20 +338,31 @@ export default function ClientiPage() {
     fetchClienti()
   }
 
-  const esportaExcel = () => {
+  const esportaExcel = async () => {
+    // L'export comprende tutti i clienti filtrati, non solo le pagine gia' caricate
+    const tutti: Cliente[] = []
+    let cursor: string | null = null
+    do {
+      const res = await fetch(`/api/clienti?${filtri(200, cursor)}`)
+      if (!res.ok) return
+      const data = await res.json()
+      tutti.push(...data.items)
+      cursor = data.nextCursor
+    } while (cursor)
+
     const headers = [
       'Nome', 'Cognome', 'Tipo', 'Telefono', 'Tel.Alt', 'Email',
       'Indirizzo', 'CAP', 'Citta', 'CF',
       'Canale Contatto', 'Data 1 Contatto',
       'N Eventi', 'Note'
     ]
-    const rows = filtrati.map(c => [
+    const rows = tutti.map(c => [
       c.nome, c.cognome ?? '', c.tipoCliente ?? '',
       c.telefono ?? '', c.telefonoAlt ?? '', c.email ?? '',
       c.indirizzo ?? '', c.cap ?? '', c.citta ?? '', c.codiceFiscale ?? '',
       c.canalePrimoContatto ?? '',
       c.dataPrimoContatto ? new Date(c.dataPrimoContatto).toLocaleDateString('it-IT') : '',
-      c.eventi.length.toString(), c.notaAnagrafica ?? ''
+      numeroEventi(c).toString(), c.notaAnagrafica ?? ''
     ])
     let csv = '\uFEFF' + headers.join(';') + '\r\n'
     rows.forEach(r => { csv += r.map(v => `"${v}"`).join(';') + '\r\n' })
@@ -344,7 +389,7 @@ export default function ClientiPage() {
             <Users className="w-7 h-7 text-amber-500" />
             Anagrafica Clienti
           </h1>
-          <p className="text-gray-500">{filtrati.length} clienti</p>
+          <p className="text-gray-500">{totale} clienti</p>
         </div>
         <div className="flex gap-2">
           <Button variant="outline" onClick={esportaExcel} data-testid="esporta-clienti-btn">
@@ -364,20 +409,40 @@ export default function ClientiPage() {
 
       <Card>
         <CardContent className="p-4">
-          <div className="relative max-w-md">
-            <Search className="absolute left-3 top-1/2 -translate-y-1/2 w-4 h-4 text-gray-400" />
-            <Input
-              placeholder="Cerca per nome, email, telefono, citta..."
-              value={search}
-              onChange={e => setSearch(e.target.value)}
-              className="pl-10"
-              data-testid="cerca-cliente-input"
-            />
+          <div className="flex flex-col sm:flex-row gap-3">
+            <div className="relative flex-1 max-w-md">
+              <Search className="absolute left-3 top-1/2 -translate-y-1/2 w-4 h-4 text-gray-400" />
+              <Input
+                placeholder="Cerca per nome, email, telefono, citta..."
+                value={search}
+                onChange={e => setSearch(e.target.value)}
+                className="pl-10"
+                data-testid="cerca-cliente-input"
+              />
+            </div>
+            <select
+              value={filtroSpam}
+              onChange={e => setFiltroSpam(e.target.value)}
+              className="border rounded-md px-3 py-2 text-sm bg-white"
+              data-testid="filtro-spam-select"
+            >
+              <option value="">Tutti</option>
+              <option value="false">Esclusi spam</option>
+              <option value="true">Solo spam</option>
+            </select>
+            <select
+              value={ordinamento}
+              onChange={e => setOrdinamento(e.target.value)}
+              className="border rounded-md px-3 py-2 text-sm bg-white"
+              data-testid="ordina-clienti-select"
+            >
+              {ORDINAMENTI.map(o => <option key={o.value} value={o.value}>{o.label}</option>)}
+            </select>
           </div>
         </CardContent>
       </Card>
 
-      {filtrati.length === 0 ? (
+      {clienti.length === 0 ? (
         <Card>
           <CardContent className="text-center py-12">
             <Users className="w-12 h-12 mx-auto mb-4 text-gray-300" />
@@ -393,7 +458,7 @@ export default function ClientiPage() {
         </Card>
       ) : (
         <div className="grid gap-4 md:grid-cols-2 lg:grid-cols-3">
-          {filtrati.map(c => (
+          {clienti.map(c => (
             <Card key={c.id} className="hover:shadow-md transition-shadow" data-testid={`cliente-card-${c.id}`}>
               <CardContent className="p-4">
                 <div className="flex items-start justify-between mb-3">
@@ -413,7 +478,7 @@ export default function ClientiPage() {
                             {c.tipoCliente}
                           </span>
                         )}
-                    <span className="text-xs text-gray-400">{c.eventi.length} eventi</span>
+                    <span className="text-xs text-gray-400">{numeroEventi(c)} eventi</span>
                     {c.statsPreEvento && (
                       <span className="text-xs text-violet-500">· {c.statsPreEvento.totaleAppuntamenti} appunt.</span>
                     )}
@@ -477,6 +542,14 @@ export default function ClientiPage() {
         </div>
       )}
 
+      {cursore && (
+        <div className="flex justify-center">
+          <Button variant="outline" onClick={caricaAltri} disabled={caricamentoAltri} data-testid="carica-altri-clienti-btn">
+            {caricamentoAltri ? 'Caricamento...' : `Carica altri (${clienti.length} di ${totale})`}
+          </Button>
+        </div>
+      )}
+
       {mostraForm && (
         <ClienteForm
           cliente={clienteEdit}
@@ -47,8 +47,8 @@ export default function DashboardPage() {
       setError('')
       try {
         const [reportRes, eventsRes] = await Promise.all([
-          fetch(`/api/report/stats?${queryString}`, { signal: controller.signal }),
-          fetch('/api/eventi', { signal: controller.signal })
+          fetch(`/api/report/stats?${queryString}&clientsLimit=0`, { signal: controller.signal }),
+          fetch('/api/eventi?fields=titolo,tipo,stato,personePreviste,createdAt', { signal: controller.signal })
         ])
 
         if (!reportRes.ok) {
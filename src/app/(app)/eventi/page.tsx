@@ -45,7 +45,7 @@ export default function EventiPage() {
   const fetchEventi = async () => {
     setLoading(true)
     try {
-      const res = await fetch('/api/eventi')
+      const res = await fetch('/api/eventi?fields=titolo,tipo,fascia,stato,personePreviste,clienti')
       const data = await res.json()
       const normalized = (Array.isArray(data) ? data : [])
         .filter((e: any) => e.tipo !== 'Appuntamento')
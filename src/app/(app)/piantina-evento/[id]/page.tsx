@@ -8,6 +8,7 @@ import VillaPiantina from '@/components/VillaPiantina'
 import VillaPiantinaDnDWrapper from '@/components/VillaPiantinaDnDWrapper'
 import { type VariantId, calcolaRiepilogoVarianti, VARIANTI_DEFAULT } from '@/lib/types'
 import BannerBlocco, { getOverrideHeaders } from '@/components/BannerBlocco'
+import { createJsonPatch, JsonPatchOperation } from '@/lib/json-patch'
 import jsPDF from 'jspdf'
 import { 
   Layout, 
@@ -38,6 +39,8 @@ export default function GestionePiantinaPage() {
   const [status, setStatus] = useState('')
   const [isSaving, setIsSaving] = useState(false)
   const stampaRef = useRef<HTMLDivElement>(null)
+  // Ultima versione salvata sul server: il salvataggio manda solo la differenza (JSON Patch)
+  const salvatoRef = useRef<{ updatedAt: string; disposizioneSala: any; disposizioneSalaPianoB: any; pianoAttivo: string | null } | null>(null)
 
   const aggiornaDisposizione = useCallback((nuova: any) => {
     const cloned = JSON.parse(JSON.stringify(nuova))
@@ -63,6 +66,12 @@ export default function GestionePiantinaPage() {
     }
   }
 
+  // Stesso valore che il server usa come base della patch (stringa su SQLite, oggetto su Postgres)
+  const parseJsonCampo = (raw: any) => {
+    if (typeof raw !== 'string') return raw ?? null
+    try { return JSON.parse(raw) } catch { return null }
+  }
+
   const fetchPlanimetrie = useCallback(async () => {
     try {
       const res = await fetch('/api/piantine')
@@ -92,6 +101,12 @@ export default function GestionePiantinaPage() {
         setDisposizione(parseDisposizione(data.disposizioneSala))
         setDisposizionePianoB(parseDisposizione(data.disposizioneSalaPianoB))
         if (data.pianoAttivo === 'B') setPianoAttivo('B')
+        salvatoRef.current = {
+          updatedAt: data.updatedAt,
+          disposizioneSala: parseJsonCampo(data.disposizioneSala),
+          disposizioneSalaPianoB: parseJsonCampo(data.disposizioneSalaPianoB),
+          pianoAttivo: data.pianoAttivo ?? null
+        }
       } catch (error) {
         console.error('Errore nel caricamento evento:', error)
       }
@@ -120,7 +135,7 @@ export default function GestionePiantinaPage() {
     const fetchEventiSimili = async () => {
       if (!evento?.tipo) return
       try {
-        const res = await fetch('/api/eventi')
+        const res = await fetch('/api/eventi?fields=titolo,tipo,personePreviste,disposizioneSala')
         const data = await res.json()
         if (!Array.isArray(data)) return
 
@@ -213,29 +228,43 @@ export default function GestionePiantinaPage() {
   }
 
   const handleSave = async () => {
-    if (!evento) return
+    const salvato = salvatoRef.current
+    if (!evento || !salvato) return
+    const corrente = { disposizioneSala: disposizione, disposizioneSalaPianoB: disposizionePianoB, pianoAttivo }
+    const operations: JsonPatchOperation[] = [
+      ...createJsonPatch(salvato.disposizioneSala, corrente.disposizioneSala, ['disposizioneSala']),
+      ...createJsonPatch(salvato.disposizioneSalaPianoB, corrente.disposizioneSalaPianoB, ['disposizioneSalaPianoB']),
+      ...createJsonPatch(salvato.pianoAttivo, corrente.pianoAttivo, ['pianoAttivo'])
+    ]
+    if (operations.length === 0) {
+      setStatus('✅ Nessuna modifica da salvare')
+      setTimeout(() => setStatus(''), 2000)
+      return
+    }
+
     setIsSaving(true)
     setStatus('Salvataggio in corso...')
     const overrideHeaders = getOverrideHeaders()
     try {
       const res = await fetch(`/api/eventi?id=${id}`, {
-        method: 'PUT',
-        headers: { 'Content-Type': 'application/json', ...overrideHeaders },
-        body: JSON.stringify({
-          ...evento,
-          disposizioneSala: disposizione,
-          disposizioneSalePianoB: disposizionePianoB,
-          pianoAttivo
-        })
+        method: 'PATCH',
+        headers: { 'Content-Type': 'application/json', 'If-Match': salvato.updatedAt, ...overrideHeaders },
+        body: JSON.stringify(operations)
       })
 
       if (res.status === 423) {
         const body = await res.json()
         setStatus(`🔒 ${body.message || 'Evento bloccato: serve override amministrativo.'}`)
+      } else if (res.status === 412) {
+        setStatus('⚠️ Evento modificato da un altro utente: ricarica la pagina prima di salvare')
+      } else if (res.ok) {
+        const body = await res.json()
+        salvatoRef.current = { ...structuredClone(corrente), updatedAt: body.updatedAt }
+        setStatus('✅ Salvato con successo')
       } else {
-        setStatus(res.ok ? '✅ Salvato con successo' : '❌ Errore nel salvataggio')
+        setStatus('❌ Errore nel salvataggio')
       }
-      setTimeout(() => setStatus(''), 2000)
+      if (res.status !== 412) setTimeout(() => setStatus(''), 2000)
     } catch (error) {
       console.error('Errore nel salvataggio:', error)
       setStatus('❌ Errore nel salvataggio')
@@ -33,6 +33,7 @@ export default function ReportAziendaPage() {
   const [loading, setLoading] = useState(true)
   const [downloadingExcel, setDownloadingExcel] = useState(false)
   const [downloadingPdf, setDownloadingPdf] = useState(false)
+  const [loadingMoreClients, setLoadingMoreClients] = useState(false)
   const [error, setError] = useState('')
 
   const queryString = useMemo(() => buildReportQuery(filters), [filters])
@@ -71,6 +72,26 @@ export default function ReportAziendaPage() {
     })
   }
 
+  // Pagina successiva della tabella clienti con gli stessi filtri
+  const loadMoreClients = async () => {
+    if (!report) return
+    setLoadingMoreClients(true)
+    try {
+      const res = await fetch(`/api/report/stats?${queryString}&clientsOffset=${report.clients.length}`)
+      if (!res.ok) throw new Error(`Errore ${res.status}`)
+      const data: OperationalReportResponse = await res.json()
+      setReport((current) => current && ({
+        ...current,
+        clients: [...current.clients, ...data.clients],
+        clientsPage: data.clientsPage
+      }))
+    } catch (err: any) {
+      setError(err.message || 'Errore caricamento clienti')
+    } finally {
+      setLoadingMoreClients(false)
+    }
+  }
+
   const handleDownloadExcel = async () => {
     setDownloadingExcel(true)
     setError('')
@@ -180,7 +201,7 @@ export default function ReportAziendaPage() {
 
           <ReportSummaryCards summary={report.summary} />
           <ReportCharts report={report} />
-          <ReportTables report={report} />
+          <ReportTables report={report} onLoadMoreClients={loadMoreClients} loadingMoreClients={loadingMoreClients} />
         </>
       )}
     </div>
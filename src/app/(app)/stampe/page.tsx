@@ -32,7 +32,7 @@ export default function StampePage() {
   useEffect(() => {
     const fetchEventi = async () => {
       try {
-        const res = await fetch('/api/eventi')
+        const res = await fetch('/api/eventi?fields=titolo,tipo,stato,personePreviste')
         const data = await res.json()
         // Filtra solo eventi con data confermata
         setEventi(data.filter((e: any) => e.dataConfermata))
@@ -1,6 +1,6 @@
 import { NextRequest, NextResponse } from 'next/server'
 import prisma from '@/lib/prisma'
-import { ensureInitialAdmin, getJwtExpiryHours, signToken, verifyPassword } from '@/lib/auth'
+import { ensureInitialAdmin, getJwtExpiryHours, hashPassword, passwordNeedsRehash, signToken, verifyPassword } from '@/lib/auth'
 import { writeAuditLog } from '@/lib/audit'
 
 export const runtime = 'nodejs'
@@ -22,11 +22,23 @@ export async function POST(req: NextRequest) {
       return NextResponse.json({ error: 'Credenziali non valide' }, { status: 401 })
     }
 
-    const ok = verifyPassword(password, user.passwordHash)
+    const ok = await verifyPassword(password, user.passwordHash)
     if (!ok) {
       return NextResponse.json({ error: 'Credenziali non valide' }, { status: 401 })
     }
 
+    // Hash legacy o con parametri scrypt superati: si rigenera ora che la password e' nota
+    if (passwordNeedsRehash(user.passwordHash)) {
+      try {
+        await prisma.user.update({
+          where: { id: user.id },
+          data: { passwordHash: await hashPassword(password) }
+        })
+      } catch (error) {
+        console.error('Errore rehash password:', error)
+      }
+    }
+
     const token = signToken({
       sub: user.id,
       email: user.email,
@@ -1,11 +1,87 @@
 import { NextRequest, NextResponse } from 'next/server'
+import { Prisma } from '@prisma/client'
 import prisma from '@/lib/prisma'
 import { requireAuth } from '@/lib/auth'
-import { dbJsonParse } from '@/lib/db-json'
+import { dbJsonParse, isSqliteDb } from '@/lib/db-json'
 
 export const runtime = 'nodejs'
 export const dynamic = 'force-dynamic'
 
+const MAX_WINDOW_DAYS = 400
+const DAY_MS = 24 * 60 * 60 * 1000
+const SEARCH_LIMIT = 50
+// updatedAt e' l'ora della query, non del commit, e gli orologi delle istanze non
+// coincidono: il cursore resta indietro di questo margine e il client deduplica per id
+const DELTA_MARGIN_MS = Number(process.env.CALENDARIO_DELTA_MARGIN_MS ?? 30_000)
+
+// Entita' i cui DELETE nell'audit log diventano tombstone della modalita' delta
+const TOMBSTONE_TYPES: Record<string, 'eventi' | 'appuntamenti' | 'clienti'> = {
+  EVENT: 'eventi',
+  APPOINTMENT: 'appuntamenti',
+  CLIENT: 'clienti'
+}
+
+const EVENTO_SELECT = {
+  id: true,
+  titolo: true,
+  tipo: true,
+  dataConfermata: true,
+  dataPrimoContatto: true,
+  canalePrimoContatto: true,
+  dateProposte: true,
+  fascia: true,
+  stato: true,
+  personePreviste: true,
+  note: true,
+  clienti: {
+    take: 1,
+    select: {
+      clienteId: true,
+      cliente: {
+        select: {
+          id: true,
+          nome: true,
+          cognome: true,
+          telefono: true,
+          email: true
+        }
+      }
+    }
+  }
+} as const
+
+const APPUNTAMENTO_SELECT = {
+  id: true,
+  dataAppuntamento: true,
+  durataMinuti: true,
+  esito: true,
+  riassuntoColloquio: true,
+  noteColloquio: true,
+  statoFunnel: true,
+  dateOpzionate: true,
+  statoOpzione: true,
+  clientePrincipale: {
+    select: {
+      id: true,
+      nome: true,
+      cognome: true,
+      telefono: true,
+      email: true
+    }
+  }
+} as const
+
+const CLIENTE_SELECT = {
+  id: true,
+  nome: true,
+  cognome: true,
+  telefono: true,
+  email: true,
+  dataPrimoContatto: true,
+  canalePrimoContatto: true,
+  isSpam: true
+} as const
+
 function threeYearsAgo() {
   const date = new Date()
   date.setFullYear(date.getFullYear() - 3)
@@ -13,103 +89,213 @@ function threeYearsAgo() {
   return date
 }
 
+// Le date del calendario sono giorni (YYYY-MM-DD): i limiti della finestra sono in UTC
+function parseDay(value: string | null) {
+  if (!value || !/^\d{4}-\d{2}-\d{2}$/.test(value)) return null
+  const date = new Date(`${value}T00:00:00.000Z`)
+  return Number.isNaN(date.getTime()) ? null : date
+}
+
+function serialize(eventi: any[], appuntamenti: any[], primiContatti: any[]) {
+  return {
+    eventi: eventi.map((evento) => ({
+      ...evento,
+      dateProposte: dbJsonParse(evento.dateProposte, [])
+    })),
+    appuntamenti: appuntamenti.map((appuntamento) => ({
+      ...appuntamento,
+      dateOpzionate: dbJsonParse(appuntamento.dateOpzionate, [])
+    })),
+    primiContatti
+  }
+}
+
+async function loadLegacy(cursor: string) {
+  const from = threeYearsAgo()
+  const [eventi, appuntamenti, primiContatti] = await Promise.all([
+    prisma.evento.findMany({
+      where: {
+        OR: [
+          { dataConfermata: { gte: from } },
+          { dataPrimoContatto: { gte: from } },
+          { createdAt: { gte: from } }
+        ]
+      },
+      orderBy: { dataConfermata: 'asc' },
+      select: EVENTO_SELECT
+    }),
+    prisma.appuntamento.findMany({
+      where: { dataAppuntamento: { gte: from } },
+      orderBy: { dataAppuntamento: 'desc' },
+      select: APPUNTAMENTO_SELECT
+    }),
+    prisma.cliente.findMany({
+      where: { dataPrimoContatto: { gte: from } },
+      orderBy: { dataPrimoContatto: 'asc' },
+      select: CLIENTE_SELECT
+    })
+  ])
+  return { from: from.toISOString(), cursor, ...serialize(eventi, appuntamenti, primiContatti) }
+}
+
+// Eventi con almeno una data proposta nella finestra: dateProposte e' un array JSON
+// di giorni YYYY-MM-DD, lo si scompone nel database
+async function eventiConProposte(fromDay: string, toDay: string) {
+  const rows = isSqliteDb()
+    ? await prisma.$queryRaw<{ id: number }[]>(Prisma.sql`
+        SELECT DISTINCT e."id" AS id
+        FROM "Evento" e, json_each(CASE WHEN json_valid(e."dateProposte") THEN e."dateProposte" ELSE '[]' END) d
+        WHERE d."value" >= ${fromDay} AND d."value" < ${toDay}`)
+    : await prisma.$queryRaw<{ id: number }[]>(Prisma.sql`
+        SELECT DISTINCT e."id" AS id
+        FROM "Evento" e
+        CROSS JOIN LATERAL jsonb_array_elements_text(
+          CASE WHEN jsonb_typeof(e."dateProposte") = 'array' THEN e."dateProposte" ELSE '[]'::jsonb END
+        ) AS d(giorno)
+        WHERE d.giorno COLLATE "C" >= ${fromDay} AND d.giorno COLLATE "C" < ${toDay}`)
+  return rows.map((row) => Number(row.id))
+}
+
+async function loadWindow(from: Date, to: Date, cursor: string) {
+  const idsConProposte = await eventiConProposte(from.toISOString().slice(0, 10), to.toISOString().slice(0, 10))
+
+  const range = { gte: from, lt: to }
+  const [eventi, appuntamenti, primiContatti] = await Promise.all([
+    prisma.evento.findMany({
+      where: {
+        OR: [
+          { dataConfermata: range },
+          { dataPrimoContatto: range },
+          { id: { in: idsConProposte } }
+        ]
+      },
+      orderBy: { dataConfermata: 'asc' },
+      select: EVENTO_SELECT
+    }),
+    prisma.appuntamento.findMany({
+      where: { dataAppuntamento: range },
+      orderBy: { dataAppuntamento: 'desc' },
+      select: APPUNTAMENTO_SELECT
+    }),
+    prisma.cliente.findMany({
+      where: { dataPrimoContatto: range },
+      orderBy: { dataPrimoContatto: 'asc' },
+      select: CLIENTE_SELECT
+    })
+  ])
+  return { from: from.toISOString(), to: to.toISOString(), cursor, ...serialize(eventi, appuntamenti, primiContatti) }
+}
+
+// Ricerca per la pagina Calendario: copre gli stessi tre anni della modalita' senza parametri
+async function loadSearch(q: string, cursor: string) {
+  const from = threeYearsAgo()
+  // SQLite (sviluppo) confronta gia' senza distinguere maiuscole e non accetta `mode`
+  const match = (word: string) => (isSqliteDb() ? { contains: word } : { contains: word, mode: 'insensitive' as const })
+  const words = q.split(/\s+/).filter(Boolean).slice(0, 5)
+  const [eventi, primiContatti] = await Promise.all([
+    prisma.evento.findMany({
+      where: {
+        AND: [
+          { OR: [{ dataConfermata: { gte: from } }, { dataPrimoContatto: { gte: from } }, { createdAt: { gte: from } }] },
+          ...words.map((word) => ({
+            OR: [
+              { titolo: match(word) },
+              { clienti: { some: { cliente: { OR: [{ nome: match(word) }, { cognome: match(word) }] } } } }
+            ]
+          }))
+        ]
+      },
+      orderBy: { dataConfermata: 'asc' },
+      take: SEARCH_LIMIT,
+      select: EVENTO_SELECT
+    }),
+    prisma.cliente.findMany({
+      where: {
+        AND: [
+          { dataPrimoContatto: { gte: from } },
+          ...words.map((word) => ({ OR: [{ nome: match(word) }, { cognome: match(word) }, { canalePrimoContatto: match(word) }] }))
+        ]
+      },
+      orderBy: { dataPrimoContatto: 'asc' },
+      take: SEARCH_LIMIT,
+      select: CLIENTE_SELECT
+    })
+  ])
+  return { from: from.toISOString(), cursor, ...serialize(eventi, [], primiContatti) }
+}
+
+async function loadDelta(since: Date, cursor: string) {
+  const changed = { updatedAt: { gt: since } }
+  const [eventi, appuntamenti, clienti, cancellazioni] = await Promise.all([
+    prisma.evento.findMany({ where: changed, select: EVENTO_SELECT }),
+    prisma.appuntamento.findMany({ where: changed, select: APPUNTAMENTO_SELECT }),
+    // Anche i clienti senza data di primo contatto: il client li toglie dal calendario
+    prisma.cliente.findMany({ where: changed, select: CLIENTE_SELECT }),
+    prisma.auditLog.findMany({
+      where: {
+        action: 'DELETE',
+        entityType: { in: Object.keys(TOMBSTONE_TYPES) },
+        createdAt: { gt: since }
+      },
+      select: { entityType: true, entityId: true }
+    })
+  ])
+
+  const deleted = { eventi: [] as number[], appuntamenti: [] as number[], clienti: [] as number[] }
+  cancellazioni.forEach((row) => {
+    const id = Number(row.entityId)
+    if (Number.isInteger(id)) deleted[TOMBSTONE_TYPES[row.entityType]].push(id)
+  })
+
+  return { since: since.toISOString(), cursor, ...serialize(eventi, appuntamenti, clienti), deleted }
+}
+
+/**
+ * GET /api/calendario
+ * - senza parametri: ultimi tre anni (compatibilita')
+ * - ?from=YYYY-MM-DD&to=YYYY-MM-DD: solo la finestra visibile, `to` escluso
+ * - ?since=<cursor>: righe modificate dopo il cursore e tombstone delle cancellate
+ * - ?q=<testo>: eventi e primi contatti degli ultimi tre anni che corrispondono (al massimo 50 per tipo)
+ * Ogni risposta restituisce `cursor` da passare come `since` al poll successivo.
+ */
 export async function GET(req: NextRequest) {
   const auth = await requireAuth(req, ['ADMIN', 'REPORT', 'WORKER'])
   if (!auth.ok) return NextResponse.json({ error: auth.error }, { status: auth.status })
 
   try {
-    const from = threeYearsAgo()
-    const [eventi, appuntamenti, primiContatti] = await Promise.all([
-      prisma.evento.findMany({
-        where: {
-          OR: [
-            { dataConfermata: { gte: from } },
-            { dataPrimoContatto: { gte: from } },
-            { createdAt: { gte: from } }
-          ]
-        },
-        orderBy: { dataConfermata: 'asc' },
-        select: {
-          id: true,
-          titolo: true,
-          tipo: true,
-          dataConfermata: true,
-          dataPrimoContatto: true,
-          canalePrimoContatto: true,
-          dateProposte: true,
-          fascia: true,
-          stato: true,
-          personePreviste: true,
-          note: true,
-          clienti: {
-            take: 1,
-            select: {
-              clienteId: true,
-              cliente: {
-                select: {
-                  id: true,
-                  nome: true,
-                  cognome: true,
-                  telefono: true,
-                  email: true
-                }
-              }
-            }
-          }
-        }
-      }),
-      prisma.appuntamento.findMany({
-        where: { dataAppuntamento: { gte: from } },
-        orderBy: { dataAppuntamento: 'desc' },
-        select: {
-          id: true,
-          dataAppuntamento: true,
-          durataMinuti: true,
-          esito: true,
-          riassuntoColloquio: true,
-          noteColloquio: true,
-          statoFunnel: true,
-          dateOpzionate: true,
-          statoOpzione: true,
-          clientePrincipale: {
-            select: {
-              id: true,
-              nome: true,
-              cognome: true,
-              telefono: true,
-              email: true
-            }
-          }
-        }
-      }),
-      prisma.cliente.findMany({
-        where: { dataPrimoContatto: { gte: from } },
-        orderBy: { dataPrimoContatto: 'asc' },
-        select: {
-          id: true,
-          nome: true,
-          cognome: true,
-          telefono: true,
-          email: true,
-          dataPrimoContatto: true,
-          canalePrimoContatto: true,
-          isSpam: true
-        }
-      })
-    ])
-
-    return NextResponse.json({
-      from: from.toISOString(),
-      eventi: eventi.map((evento) => ({
-        ...evento,
-        dateProposte: dbJsonParse(evento.dateProposte, [])
-      })),
-      appuntamenti: appuntamenti.map((appuntamento) => ({
-        ...appuntamento,
-        dateOpzionate: dbJsonParse(appuntamento.dateOpzionate, [])
-      })),
-      primiContatti
-    })
+    const { searchParams } = new URL(req.url)
+    // Il cursore precede le query di DELTA_MARGIN_MS: le righe scritte nel margine
+    // arrivano di nuovo al poll successivo, ma non se ne perde nessuna salvata in ritardo
+    const cursor = new Date(Date.now() - DELTA_MARGIN_MS).toISOString()
+
+    const sinceParam = searchParams.get('since')
+    if (sinceParam) {
+      const since = new Date(sinceParam)
+      if (Number.isNaN(since.getTime())) {
+        return NextResponse.json({ error: 'Parametro since non valido' }, { status: 400 })
+      }
+      return NextResponse.json(await loadDelta(since, cursor))
+    }
+
+    const q = searchParams.get('q')?.trim()
+    if (q !== undefined) {
+      if (q.length < 2) return NextResponse.json({ error: 'Ricerca di almeno 2 caratteri' }, { status: 400 })
+      return NextResponse.json(await loadSearch(q, cursor))
+    }
+
+    if (searchParams.has('from') || searchParams.has('to')) {
+      const from = parseDay(searchParams.get('from'))
+      const to = parseDay(searchParams.get('to'))
+      if (!from || !to || to <= from) {
+        return NextResponse.json({ error: 'Finestra from/to non valida (YYYY-MM-DD, to escluso)' }, { status: 400 })
+      }
+      if (to.getTime() - from.getTime() > MAX_WINDOW_DAYS * DAY_MS) {
+        return NextResponse.json({ error: `Finestra massima di ${MAX_WINDOW_DAYS} giorni` }, { status: 400 })
+      }
+      return NextResponse.json(await loadWindow(from, to, cursor))
+    }
+
+    return NextResponse.json(await loadLegacy(cursor))
   } catch (error) {
     console.error('[Calendario] Errore caricamento dati:', error)
     return NextResponse.json({ error: 'Errore caricamento calendario' }, { status: 500 })
@@ -1,13 +1,80 @@
 import { NextRequest, NextResponse } from 'next/server'
 import prisma from '@/lib/prisma'
-import { actorFromHeaders, writeAuditLog } from '@/lib/audit'
+import { actorFromHeaders, writeAuditLog, writeDeleteTombstones } from '@/lib/audit'
 import { requireAuth } from '@/lib/auth'
+import { isSqliteDb } from '@/lib/db-json'
+import { afterCursor, decodeCursor, encodeCursor, keysetOrderBy, KeysetSort, pageSize } from '@/lib/keyset-pagination'
 
 export const runtime = 'nodejs'
 export const dynamic = 'force-dynamic'
 
 const has = (obj: any, key: string) => Object.prototype.hasOwnProperty.call(obj, key)
 
+const SEARCH_FIELDS = ['nome', 'cognome', 'email', 'telefono', 'citta'] as const
+const SORT_FIELDS: Record<string, Omit<KeysetSort, 'direction'>> = {
+  cognome: { field: 'cognome', nullable: true },
+  nome: { field: 'nome' },
+  dataPrimoContatto: { field: 'dataPrimoContatto', nullable: true, date: true },
+  createdAt: { field: 'createdAt', date: true },
+  updatedAt: { field: 'updatedAt', date: true }
+}
+const EMPTY_STATS = { totaleAppuntamenti: 0, tempoTotaleDedicatoMin: 0, totaleInterazioni: 0 }
+
+function parseSort(value: string | null): KeysetSort | null {
+  const raw = value || 'cognome'
+  const field = raw.replace(/^-/, '')
+  if (!has(SORT_FIELDS, field)) return null
+  return { ...SORT_FIELDS[field], direction: raw.startsWith('-') ? 'desc' : 'asc' }
+}
+
+function clientiWhere(searchParams: URLSearchParams) {
+  const where: any = {}
+  const q = searchParams.get('q')?.trim()
+  if (q) {
+    // SQLite (sviluppo) confronta gia' senza distinguere maiuscole e non accetta `mode`
+    const match = isSqliteDb() ? { contains: q } : { contains: q, mode: 'insensitive' }
+    where.OR = SEARCH_FIELDS.map((field) => ({ [field]: match }))
+  }
+  const isSpam = searchParams.get('isSpam')
+  if (isSpam === 'true' || isSpam === 'false') where.isSpam = isSpam === 'true'
+  return where
+}
+
+// Appuntamenti e interazioni aggregati in SQL; senza ids su tutti i clienti
+async function statsPreEvento(ids?: number[]) {
+  const [appuntamenti, interazioni] = await Promise.all([
+    prisma.appuntamento.groupBy({
+      by: ['clientePrincipaleId'],
+      where: ids ? { clientePrincipaleId: { in: ids } } : undefined,
+      _count: { _all: true },
+      _sum: { durataMinuti: true }
+    }),
+    prisma.interazioneCliente.groupBy({
+      by: ['clienteId'],
+      where: ids ? { clienteId: { in: ids } } : undefined,
+      _count: { _all: true },
+      _sum: { durataMinuti: true }
+    })
+  ])
+
+  const stats = new Map<number, typeof EMPTY_STATS>()
+  const statsFor = (id: number) => {
+    if (!stats.has(id)) stats.set(id, { ...EMPTY_STATS })
+    return stats.get(id)!
+  }
+  appuntamenti.forEach((g) => {
+    const s = statsFor(g.clientePrincipaleId)
+    s.totaleAppuntamenti = g._count._all
+    s.tempoTotaleDedicatoMin += g._sum.durataMinuti || 0
+  })
+  interazioni.forEach((g) => {
+    const s = statsFor(g.clienteId)
+    s.totaleInterazioni = g._count._all
+    s.tempoTotaleDedicatoMin += g._sum.durataMinuti || 0
+  })
+  return stats
+}
+
 function parseDate(value: any): Date | null {
   if (!value) return null
   const d = new Date(value)
@@ -22,6 +89,9 @@ function buildFirstContactSummary(canale?: string | null, note?: string | null)
 }
 
 // GET /api/clienti          → lista tutti
+// GET /api/clienti?limit=50 → pagina { items, nextCursor, total }; poi &cursor=nextCursor
+//   filtri: q (nome, cognome, email, telefono, citta), isSpam=true|false
+//   sort: cognome (predefinito), nome, dataPrimoContatto, createdAt, updatedAt; -campo decrescente
 // GET /api/clienti?id=X     → dettaglio singolo
 export async function GET(req: NextRequest) {
   const auth = await requireAuth(req, ['ADMIN', 'REPORT', 'WORKER'])
@@ -46,27 +116,43 @@ export async function GET(req: NextRequest) {
       return NextResponse.json(cliente)
     }
 
-    const clienti = await prisma.cliente.findMany({
-      include: {
-        eventi: { select: { id: true } },
-        appuntamentiPrincipali: { select: { id: true, durataMinuti: true } },
-        interazioni: { select: { id: true, durataMinuti: true } }
-      },
-      orderBy: { cognome: 'asc' }
-    })
+    const sort = parseSort(searchParams.get('sort'))
+    if (!sort) return NextResponse.json({ error: `sort non valido: usa ${Object.keys(SORT_FIELDS).join(', ')} (prefisso - per decrescente)` }, { status: 400 })
+    const where = clientiWhere(searchParams)
 
-    return NextResponse.json(
-      clienti.map((c) => ({
-        ...c,
-        statsPreEvento: {
-          totaleAppuntamenti: c.appuntamentiPrincipali.length,
-          tempoTotaleDedicatoMin:
-            c.appuntamentiPrincipali.reduce((sum, a) => sum + (a.durataMinuti || 0), 0) +
-            c.interazioni.reduce((sum, i) => sum + (i.durataMinuti || 0), 0),
-          totaleInterazioni: c.interazioni.length
-        }
-      }))
-    )
+    // Senza limit/cursor resta la lista completa usata dalle versioni precedenti
+    if (!searchParams.has('limit') && !searchParams.has('cursor')) {
+      const clienti = await prisma.cliente.findMany({
+        where,
+        include: { eventi: { select: { id: true } } },
+        orderBy: keysetOrderBy(sort)
+      })
+      const stats = await statsPreEvento()
+      return NextResponse.json(clienti.map((c) => ({ ...c, statsPreEvento: stats.get(c.id) || EMPTY_STATS })))
+    }
+
+    const limit = pageSize(searchParams.get('limit'))
+    const rawCursor = searchParams.get('cursor')
+    const cursor = rawCursor ? decodeCursor(rawCursor) : null
+    if (rawCursor && !cursor) return NextResponse.json({ error: 'Cursore non valido' }, { status: 400 })
+
+    const [righe, total] = await Promise.all([
+      prisma.cliente.findMany({
+        where: cursor ? { AND: [where, afterCursor(sort, cursor)] } : where,
+        include: { _count: { select: { eventi: true } } },
+        orderBy: keysetOrderBy(sort),
+        take: limit + 1
+      }),
+      prisma.cliente.count({ where })
+    ])
+    const pagina = righe.slice(0, limit)
+    const stats = await statsPreEvento(pagina.map((c) => c.id))
+
+    return NextResponse.json({
+      items: pagina.map((c) => ({ ...c, statsPreEvento: stats.get(c.id) || EMPTY_STATS })),
+      nextCursor: righe.length > limit ? encodeCursor(sort, pagina[pagina.length - 1]) : null,
+      total
+    })
   } catch (error) {
     console.error('Errore nel recupero clienti:', error)
     return new NextResponse('Errore database', { status: 500 })
@@ -227,6 +313,9 @@ export async function DELETE(req: NextRequest) {
     const before = await prisma.cliente.findUnique({ where: { id } })
     if (!before) return new NextResponse('Cliente non trovato', { status: 404 })
 
+    // Gli appuntamenti principali spariscono in cascata: servono i loro id per le tombstone
+    const cascaded = await prisma.appuntamento.findMany({ where: { clientePrincipaleId: id }, select: { id: true } })
+
     // Rimuovi prima le relazioni evento
     await prisma.eventoCliente.deleteMany({ where: { clienteId: id } })
     await prisma.cliente.delete({ where: { id } })
@@ -238,6 +327,7 @@ export async function DELETE(req: NextRequest) {
       oldValue: before,
       actor
     })
+    await writeDeleteTombstones('APPOINTMENT', cascaded.map((item) => item.id), actor, { cascadeFrom: { entityType: 'CLIENT', entityId: id } })
 
     return new NextResponse(null, { status: 204 })
   } catch (error) {
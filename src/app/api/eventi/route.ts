@@ -11,12 +11,88 @@ import { actorFromHeaders, writeAuditLog } from '@/lib/audit'
 import { syncEventoToGcal, removeEventoFromGcal } from '@/lib/google-calendar-sync'
 import { dbJsonParse, dbJsonSerialize } from '@/lib/db-json'
 import { requireAuth } from '@/lib/auth'
+import { afterCursor, decodeCursor, encodeCursor, keysetOrderBy, KeysetSort, pageSize } from '@/lib/keyset-pagination'
+import { applyJsonPatch, parsePointer } from '@/lib/json-patch'
 
 export const runtime = 'nodejs'
 export const dynamic = 'force-dynamic'
 
 const has = (obj: any, key: string) => Object.prototype.hasOwnProperty.call(obj, key)
 
+// Colonne selezionabili con ?fields= nella lista; i JSON pesanti (menu,
+// struttura, disposizioni sala) arrivano solo se richiesti esplicitamente
+const LIST_FIELDS = [
+  'id', 'titolo', 'tipo', 'dataConfermata', 'fascia', 'stato', 'personePreviste', 'note',
+  'menu', 'struttura', 'dateProposte', 'disposizioneSala', 'disposizioneSalaPianoB', 'pianoAttivo',
+  'luogo', 'prezzo', 'menuPasto', 'menuBuffet', 'sposa', 'sposo',
+  'dataPrimoContatto', 'canalePrimoContatto', 'appuntamentoOrigineId', 'gcalEventId', 'createdAt', 'updatedAt'
+]
+const LIST_RELATIONS: Record<string, any> = {
+  clienti: {
+    select: {
+      clienteId: true,
+      cliente: { select: { id: true, nome: true, cognome: true, email: true, telefono: true } }
+    }
+  },
+  appuntamentoOrigine: {
+    select: { id: true, dataAppuntamento: true, esito: true, statoFunnel: true }
+  }
+}
+const JSON_FIELDS: Record<string, any> = {
+  dateProposte: [],
+  menu: {},
+  struttura: {},
+  disposizioneSala: null,
+  disposizioneSalaPianoB: null
+}
+// Campi modificabili con PATCH (RFC 6902): i JSON della piantina e del menu
+const PATCHABLE_FIELDS = ['menu', 'disposizioneSala', 'disposizioneSalaPianoB', 'pianoAttivo'] as const
+const MAX_PATCH_OPERATIONS = 500
+
+const LIST_SORT: KeysetSort = { field: 'dataConfermata', direction: 'asc', nullable: true, date: true }
+
+function parseFields(value: string | null): string[] | undefined | null {
+  if (!value) return undefined
+  const fields = value.split(',').map((field) => field.trim()).filter(Boolean)
+  if (fields.some((field) => !LIST_FIELDS.includes(field) && !has(LIST_RELATIONS, field))) return null
+  // id e dataConfermata servono al cursore
+  return Array.from(new Set(['id', 'dataConfermata', ...fields]))
+}
+
+function listSelect(fields: string[]) {
+  return Object.fromEntries(fields.map((field) => [field, LIST_RELATIONS[field] ?? true]))
+}
+
+function parseJsonFields(evento: any) {
+  const out = { ...evento }
+  Object.entries(JSON_FIELDS).forEach(([field, fallback]) => {
+    if (has(out, field)) out[field] = dbJsonParse(out[field], fallback)
+  })
+  return out
+}
+
+function parseDay(value: string | null) {
+  if (!value || !/^\d{4}-\d{2}-\d{2}$/.test(value)) return null
+  const date = new Date(`${value}T00:00:00.000Z`)
+  return Number.isNaN(date.getTime()) ? null : date
+}
+
+// Filtri della lista: from (incluso) / to (escluso) su dataConfermata, stato separati da virgola
+function listWhere(searchParams: URLSearchParams) {
+  const where: any = {}
+  const from = searchParams.get('from')
+  const to = searchParams.get('to')
+  if (from || to) {
+    const gte = from ? parseDay(from) : null
+    const lt = to ? parseDay(to) : null
+    if ((from && !gte) || (to && !lt)) return null
+    where.dataConfermata = { ...(gte ? { gte } : {}), ...(lt ? { lt } : {}) }
+  }
+  const stati = (searchParams.get('stato') || '').split(',').map((stato) => stato.trim()).filter(Boolean)
+  if (stati.length > 0) where.stato = { in: stati }
+  return where
+}
+
 function parseDate(value: any): Date | null {
   if (!value) return null
   const d = new Date(value)
@@ -29,6 +105,59 @@ function addDays(date: Date, days: number) {
   return next
 }
 
+// Campo radice toccato da un'operazione, null se fuori da PATCHABLE_FIELDS o se rimuove/sposta il campo intero
+function patchField(pointer: any, allowRoot: boolean): string | null {
+  const tokens = typeof pointer === 'string' ? parsePointer(pointer) : null
+  if (!tokens || tokens.length === 0 || !(PATCHABLE_FIELDS as readonly string[]).includes(tokens[0])) return null
+  return tokens.length > 1 || allowRoot ? tokens[0] : null
+}
+
+// If-Match porta l'updatedAt letto dal client (anche come ETag debole/quotato)
+function parseIfMatch(value: string | null) {
+  if (!value) return null
+  const date = new Date(value.trim().replace(/^W\//, '').replace(/^"|"$/g, ''))
+  return Number.isNaN(date.getTime()) ? null : date
+}
+
+// 423 se l'evento e' bloccato e mancano gli header di override; con override valido lo registra
+async function verificaBlocco(req: NextRequest, id: number, infoBlocco: ReturnType<typeof calcolaInfoBlocco>, campiBloccatiModificati: string[]) {
+  if (!infoBlocco.isBloccato || campiBloccatiModificati.length === 0) return null
+
+  // Verifica override headers
+  const overrideResult = validateOverrideHeaders(req.headers)
+
+  if (!overrideResult.valid) {
+    return new NextResponse(
+      JSON.stringify({
+        error: 'Evento bloccato',
+        message: infoBlocco.messaggioBlocco,
+        giorniMancanti: infoBlocco.giorniMancanti,
+        campiBloccati: campiBloccatiModificati,
+        overrideRequired: true,
+        overrideHeaders: {
+          token: OVERRIDE_HEADERS.TOKEN,
+          motivo: OVERRIDE_HEADERS.MOTIVO,
+          autore: OVERRIDE_HEADERS.AUTORE
+        },
+        overrideError: overrideResult.error
+      }),
+      { 
+        status: 423,
+        headers: { 'Content-Type': 'application/json' }
+      }
+    )
+  }
+
+  // Override valido: registra nel log
+  await registraOverride(id, {
+    ...overrideResult.override!,
+    campoModificato: campiBloccatiModificati.join(', ')
+  })
+
+  console.log(`[OVERRIDE] Evento ${id} modificato con override: ${overrideResult.override!.motivo}`)
+  return null
+}
+
 async function resolveClientIds(clientiRaw: any[], fallbackCanale?: string | null, fallbackData?: Date | null) {
   const ids: number[] = []
 
@@ -149,6 +278,8 @@ export async function POST(req: NextRequest) {
 }
 
 // RECUPERA TUTTI GLI EVENTI O UNO SINGOLO SE SPECIFICATO L'ID
+// Lista: ?fields=id,titolo,clienti (proiezione), ?from=&to= su dataConfermata, ?stato=a,b,
+// ?limit=50 → { items, nextCursor, total } ordinati per dataConfermata; poi &cursor=nextCursor
 export async function GET(req: NextRequest) {
   const auth = await requireAuth(req, ['ADMIN', 'REPORT', 'WORKER'])
   if (!auth.ok) return NextResponse.json({ error: auth.error }, { status: auth.status })
@@ -213,25 +344,60 @@ export async function GET(req: NextRequest) {
       return NextResponse.json(eventi)
     }
 
-    const eventi = await prisma.evento.findMany({
-      orderBy: { dataConfermata: 'asc' },
-      include: {
-        clienti: {
-          include: { cliente: true }
-        },
-        appuntamentoOrigine: {
-          select: { id: true, dataAppuntamento: true, esito: true, statoFunnel: true }
+    const fields = parseFields(searchParams.get('fields'))
+    if (fields === null) {
+      return NextResponse.json({ error: `fields non valido: campi ammessi ${[...LIST_FIELDS, ...Object.keys(LIST_RELATIONS)].join(', ')}` }, { status: 400 })
+    }
+    const where = listWhere(searchParams)
+    if (!where) return NextResponse.json({ error: 'from/to devono essere date YYYY-MM-DD' }, { status: 400 })
+
+    const query = fields
+      ? { select: listSelect(fields) }
+      : {
+          include: {
+            clienti: {
+              include: { cliente: true }
+            },
+            appuntamentoOrigine: {
+              select: { id: true, dataAppuntamento: true, esito: true, statoFunnel: true }
+            }
+          }
         }
-      }
-    })
-
-    return NextResponse.json(eventi.map((e) => ({
+    const serialize = (e: any) => (fields ? parseJsonFields(e) : {
       ...e,
       dateProposte: dbJsonParse(e.dateProposte, []),
       menu: dbJsonParse(e.menu, {}),
       struttura: dbJsonParse(e.struttura, {}),
       disposizioneSala: dbJsonParse(e.disposizioneSala, null)
-    })))
+    })
+
+    // Senza limit/cursor resta la lista completa usata dalle versioni precedenti
+    if (!searchParams.has('limit') && !searchParams.has('cursor')) {
+      const eventi = await prisma.evento.findMany({ ...query, where, orderBy: keysetOrderBy(LIST_SORT) })
+      return NextResponse.json(eventi.map(serialize))
+    }
+
+    const limit = pageSize(searchParams.get('limit'))
+    const rawCursor = searchParams.get('cursor')
+    const cursor = rawCursor ? decodeCursor(rawCursor) : null
+    if (rawCursor && !cursor) return NextResponse.json({ error: 'Cursore non valido' }, { status: 400 })
+
+    const [righe, total] = await Promise.all([
+      prisma.evento.findMany({
+        ...query,
+        where: cursor ? { AND: [where, afterCursor(LIST_SORT, cursor)] } : where,
+        orderBy: keysetOrderBy(LIST_SORT),
+        take: limit + 1
+      }),
+      prisma.evento.count({ where })
+    ])
+    const pagina = righe.slice(0, limit)
+
+    return NextResponse.json({
+      items: pagina.map(serialize),
+      nextCursor: righe.length > limit ? encodeCursor(LIST_SORT, pagina[pagina.length - 1]) : null,
+      total
+    })
   } catch (error) {
     console.error('Errore nel recupero eventi:', error)
     return new NextResponse('Errore durante il recupero degli eventi', { status: 500 })
@@ -268,41 +434,8 @@ export async function PUT(req: NextRequest) {
     // Verifica blocco -10 giorni
     const infoBlocco = calcolaInfoBlocco(eventoEsistente.dataConfermata)
     const campiBloccatiModificati = getCampiBloccatiModificati(body)
-
-    if (infoBlocco.isBloccato && campiBloccatiModificati.length > 0) {
-      // Verifica override headers
-      const overrideResult = validateOverrideHeaders(req.headers)
-
-      if (!overrideResult.valid) {
-        return new NextResponse(
-          JSON.stringify({
-            error: 'Evento bloccato',
-            message: infoBlocco.messaggioBlocco,
-            giorniMancanti: infoBlocco.giorniMancanti,
-            campiBloccati: campiBloccatiModificati,
-            overrideRequired: true,
-            overrideHeaders: {
-              token: OVERRIDE_HEADERS.TOKEN,
-              motivo: OVERRIDE_HEADERS.MOTIVO,
-              autore: OVERRIDE_HEADERS.AUTORE
-            },
-            overrideError: overrideResult.error
-          }),
-          { 
-            status: 423,
-            headers: { 'Content-Type': 'application/json' }
-          }
-        )
-      }
-
-      // Override valido: registra nel log
-      await registraOverride(id, {
-        ...overrideResult.override!,
-        campoModificato: campiBloccatiModificati.join(', ')
-      })
-
-      console.log(`[OVERRIDE] Evento ${id} modificato con override: ${overrideResult.override!.motivo}`)
-    }
+    const bloccato = await verificaBlocco(req, id, infoBlocco, campiBloccatiModificati)
+    if (bloccato) return bloccato
 
     const before = await prisma.evento.findUnique({
       where: { id },
@@ -375,6 +508,115 @@ export async function PUT(req: NextRequest) {
   }
 }
 
+// AGGIORNA PIANTINA E MENU CON JSON PATCH (RFC 6902)
+// Il client manda solo le operazioni e l'updatedAt letto in If-Match; l'audit salva la patch, non i JSON interi.
+export async function PATCH(req: NextRequest) {
+  const auth = await requireAuth(req, ['ADMIN', 'REPORT', 'WORKER'])
+  if (!auth.ok) return NextResponse.json({ error: auth.error }, { status: auth.status })
+
+  try {
+    const { searchParams } = new URL(req.url)
+    const id = Number(searchParams.get('id'))
+    if (!id) return new NextResponse('ID mancante', { status: 400 })
+
+    const operations = await req.json().catch(() => null)
+    if (!Array.isArray(operations) || operations.length === 0 || operations.length > MAX_PATCH_OPERATIONS) {
+      return NextResponse.json({ error: `Body deve essere un array JSON Patch di 1-${MAX_PATCH_OPERATIONS} operazioni` }, { status: 400 })
+    }
+
+    // Ogni operazione deve restare dentro un campo modificabile; remove/move del campo intero non sono ammessi
+    const opsPerCampo: Record<string, any[]> = {}
+    for (let i = 0; i < operations.length; i++) {
+      const op = operations[i]
+      const field = patchField(op?.path, ['add', 'replace', 'test'].includes(op?.op))
+      const fromField = op?.op === 'move' || op?.op === 'copy' ? patchField(op?.from, false) : field
+      if (!field || !fromField) {
+        return NextResponse.json({ error: `Operazione ${i}: path non modificabile`, campi: PATCHABLE_FIELDS }, { status: 400 })
+      }
+      ;(opsPerCampo[field] ??= []).push(op)
+      if (fromField !== field) (opsPerCampo[fromField] ??= []).push(op)
+    }
+
+    const ifMatch = parseIfMatch(req.headers.get('if-match'))
+    if (!ifMatch) {
+      return NextResponse.json({ error: "Header If-Match con l'updatedAt dell'evento obbligatorio" }, { status: 428 })
+    }
+
+    const esistente = await prisma.evento.findUnique({
+      where: { id },
+      select: { id: true, dataConfermata: true, updatedAt: true, menu: true, disposizioneSala: true, disposizioneSalaPianoB: true, pianoAttivo: true }
+    })
+    if (!esistente) return new NextResponse('Evento non trovato', { status: 404 })
+
+    const modificatoAltrove = () => NextResponse.json(
+      { error: 'Evento modificato da un altro utente', updatedAt: esistente.updatedAt },
+      { status: 412, headers: { ETag: `"${esistente.updatedAt.toISOString()}"` } }
+    )
+    if (ifMatch.getTime() !== esistente.updatedAt.getTime()) return modificatoAltrove()
+
+    const campiToccati = Object.keys(opsPerCampo)
+    const infoBlocco = calcolaInfoBlocco(esistente.dataConfermata)
+    const campiBloccatiModificati = getCampiBloccatiModificati(Object.fromEntries(campiToccati.map((campo) => [campo, true])))
+    const bloccato = await verificaBlocco(req, id, infoBlocco, campiBloccatiModificati)
+    if (bloccato) return bloccato
+
+    const documento = {
+      menu: dbJsonParse(esistente.menu, null),
+      disposizioneSala: dbJsonParse(esistente.disposizioneSala, null),
+      disposizioneSalaPianoB: dbJsonParse(esistente.disposizioneSalaPianoB, null),
+      pianoAttivo: esistente.pianoAttivo
+    }
+    const result = applyJsonPatch(documento, operations)
+    if (!result.ok) return NextResponse.json({ error: result.error }, { status: 422 })
+
+    const data: any = {}
+    for (const campo of campiToccati) {
+      if (campo === 'pianoAttivo') {
+        if (![null, 'A', 'B'].includes(result.value.pianoAttivo)) {
+          return NextResponse.json({ error: "pianoAttivo deve essere 'A', 'B' o null" }, { status: 422 })
+        }
+        data.pianoAttivo = result.value.pianoAttivo
+      } else {
+        data[campo] = dbJsonSerialize(result.value[campo])
+      }
+    }
+
+    // Scrittura condizionata: se un altro salvataggio e' passato nel frattempo non aggiorna nulla
+    const { count } = await prisma.evento.updateMany({ where: { id, updatedAt: esistente.updatedAt }, data })
+    if (count === 0) return modificatoAltrove()
+
+    const aggiornato = await prisma.evento.findUnique({ where: { id }, select: { id: true, updatedAt: true } })
+    if (!aggiornato) return new NextResponse('Evento non trovato', { status: 404 })
+
+    await writeAuditLog({
+      entityType: 'EVENT',
+      entityId: id,
+      action: 'UPDATE',
+      oldValue: { id, updatedAt: esistente.updatedAt },
+      newValue: aggiornato,
+      changedFields: Object.fromEntries(campiToccati.map((campo) => [campo, { patch: opsPerCampo[campo] }])),
+      actor: {
+        ...actorFromHeaders(req.headers),
+        actorId: auth.user.id,
+        actorRole: auth.user.role,
+        actorEmail: auth.user.email
+      },
+      metadata: {
+        jsonPatch: true,
+        updatedAtFrom: esistente.updatedAt,
+        updatedAtTo: aggiornato.updatedAt,
+        blockedFieldsModified: campiBloccatiModificati,
+        wasBlocked: infoBlocco.isBloccato
+      }
+    })
+
+    return NextResponse.json(aggiornato, { headers: { ETag: `"${aggiornato.updatedAt.toISOString()}"` } })
+  } catch (error) {
+    console.error('Errore patch evento:', error)
+    return new NextResponse("Errore durante l'aggiornamento", { status: 500 })
+  }
+}
+
 // ELIMINA UN EVENTO
 export async function DELETE(req: NextRequest) {
   const auth = await requireAuth(req, ['ADMIN', 'REPORT', 'WORKER'])
@@ -1,4 +1,5 @@
 import { NextRequest, NextResponse } from 'next/server'
+import { actorFromHeaders } from '@/lib/audit'
 import { requireAuth } from '@/lib/auth'
 import {
   getGoogleImportRollbackPreview,
@@ -36,7 +37,12 @@ export async function POST(req: NextRequest) {
     if (body.confirm !== 'ROLLBACK_GOOGLE_IMPORT') {
       return NextResponse.json({ error: 'Conferma rollback non valida' }, { status: 400 })
     }
-    return NextResponse.json(await rollbackGoogleImport())
+    return NextResponse.json(await rollbackGoogleImport({
+      ...actorFromHeaders(req.headers),
+      actorId: auth.user.id,
+      actorRole: auth.user.role,
+      actorEmail: auth.user.email
+    }))
   } catch (error: any) {
     console.error('[GCal Rollback] Errore:', error)
     return NextResponse.json({ error: error.message || 'Errore rollback importazione' }, { status: 500 })
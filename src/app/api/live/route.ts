@@ -0,0 +1,98 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { requireAuth } from '@/lib/auth'
+import { formatCursor, LiveEvent, replayLiveEvents, subscribeLiveEvents, visibleTo } from '@/lib/live-events'
+
+export const runtime = 'nodejs'
+export const dynamic = 'force-dynamic'
+
+// Sotto il timeout di lettura del proxy (60s) e dei load balancer piu' comuni
+const HEARTBEAT_MS = Number(process.env.LIVE_HEARTBEAT_MS ?? 25_000)
+const RETRY_MS = 5_000
+
+/**
+ * Server-sent events con le modifiche a eventi, appuntamenti, clienti e
+ * presenze. Alla riconnessione il browser rimanda Last-Event-ID (oppure
+ * ?cursor=) e riceve gli eventi persi; se sono troppi arriva `reset` e il
+ * client ricarica i dati da zero.
+ */
+export async function GET(req: NextRequest) {
+  const auth = await requireAuth(req, ['ADMIN', 'REPORT', 'WORKER'])
+  if (!auth.ok) return NextResponse.json({ error: auth.error }, { status: auth.status })
+
+  const role = auth.user.role
+  const cursor = req.headers.get('last-event-id') || req.nextUrl.searchParams.get('cursor')
+  const encoder = new TextEncoder()
+  let cleanup = () => {}
+
+  const stream = new ReadableStream<Uint8Array>({
+    async start(controller) {
+      let closed = false
+      const write = (chunk: string) => {
+        if (closed) return
+        try {
+          controller.enqueue(encoder.encode(chunk))
+        } catch {
+          cleanup()
+        }
+      }
+      const sendEvent = (event: LiveEvent) => {
+        write(`${event.id ? `id: ${event.id}\n` : ''}event: change\ndata: ${JSON.stringify(event)}\n\n`)
+      }
+
+      // Iscrizione prima del replay: quello che arriva nel frattempo resta in coda
+      let queued: LiveEvent[] | null = []
+      const unsubscribe = subscribeLiveEvents((event) => {
+        const visible = visibleTo(role, event)
+        if (!visible) return
+        if (queued) queued.push(visible)
+        else sendEvent(visible)
+      })
+      const heartbeat = setInterval(() => write(': ping\n\n'), HEARTBEAT_MS)
+      cleanup = () => {
+        if (closed) return
+        closed = true
+        clearInterval(heartbeat)
+        unsubscribe()
+        try {
+          controller.close()
+        } catch {
+          // Stream gia' chiuso dal client
+        }
+      }
+      req.signal.addEventListener('abort', () => cleanup())
+
+      write(`retry: ${RETRY_MS}\n\n`)
+      const replayed = new Set<string>()
+      if (cursor) {
+        const events = await replayLiveEvents(cursor, role).catch(() => null)
+        if (events) {
+          events.forEach((event) => {
+            replayed.add(event.id as string)
+            sendEvent(event)
+          })
+        } else {
+          // Il nuovo cursore evita di ripetere il reset a ogni riconnessione
+          write(`id: ${formatCursor(new Date())}\nevent: reset\ndata: {}\n\n`)
+        }
+      }
+
+      const pending = queued
+      queued = null
+      pending.forEach((event) => {
+        if (!event.id || !replayed.has(event.id)) sendEvent(event)
+      })
+    },
+    cancel() {
+      cleanup()
+    }
+  })
+
+  return new Response(stream, {
+    headers: {
+      'Content-Type': 'text/event-stream; charset=utf-8',
+      'Cache-Control': 'no-cache, no-transform',
+      Connection: 'keep-alive',
+      'X-Accel-Buffering': 'no'
+    }
+  })
+}
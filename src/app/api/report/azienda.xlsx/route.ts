@@ -2,7 +2,8 @@ import { NextRequest, NextResponse } from 'next/server'
 import ExcelJS from 'exceljs'
 import { requireAuth } from '@/lib/auth'
 import { formatDateTime, formatMinutes } from '@/lib/report/types'
-import { getOperationalReport, parseReportFilters } from '@/lib/report/operational'
+import { reportCacheHeaders } from '@/lib/report/cache'
+import { getCachedOperationalReport, parseReportFilters } from '@/lib/report/operational'
 
 export const runtime = 'nodejs'
 export const dynamic = 'force-dynamic'
@@ -16,7 +17,7 @@ export async function GET(req: NextRequest) {
   try {
     const { searchParams } = new URL(req.url)
     const filters = parseReportFilters(searchParams)
-    const report = await getOperationalReport(filters)
+    const { report, hit, computeMs } = await getCachedOperationalReport(filters, { clientsLimit: Infinity })
 
     const wb = new ExcelJS.Workbook()
     wb.creator = 'Villa Paris Gestionale'
@@ -255,6 +256,7 @@ export async function GET(req: NextRequest) {
         'Content-Disposition': `attachment; filename="${filename}"`,
         'Cache-Control': 'no-cache, no-store, must-revalidate',
         'Pragma': 'no-cache',
+        ...reportCacheHeaders(hit, computeMs)
       }
     })
   } catch (error) {
@@ -0,0 +1,46 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { requireAuth } from '@/lib/auth'
+import { rebuildReportRollup } from '@/lib/report/rollup'
+
+export const runtime = 'nodejs'
+export const dynamic = 'force-dynamic'
+export const maxDuration = 300
+
+function parseDay(value: string | null) {
+  if (!value) return undefined
+  if (!/^\d{4}-\d{2}-\d{2}$/.test(value)) return null
+  const [year, month, day] = value.split('-').map(Number)
+  const date = new Date(year, month - 1, day)
+  return date.getDate() === day ? date : null
+}
+
+/**
+ * Backfill del rollup giornaliero dei trend: ricalcola i giorni tra from e to
+ * (YYYY-MM-DD, giorni locali del server). Senza parametri copre tutto lo storico.
+ */
+export async function POST(req: NextRequest) {
+  const auth = await requireAuth(req, ['ADMIN'])
+  if (!auth.ok) return NextResponse.json({ error: auth.error }, { status: auth.status })
+
+  const from = parseDay(req.nextUrl.searchParams.get('from'))
+  const to = parseDay(req.nextUrl.searchParams.get('to'))
+  if (from === null || to === null) {
+    return NextResponse.json({ error: 'from e to devono essere date YYYY-MM-DD' }, { status: 400 })
+  }
+  if (from && to && from > to) {
+    return NextResponse.json({ error: 'from successivo a to' }, { status: 400 })
+  }
+
+  const startedAt = Date.now()
+  try {
+    const result = await rebuildReportRollup({ from, to })
+    console.log(`[Report Rollup] backfill ${result.from}..${result.to} (${result.days} giorni) in ${Date.now() - startedAt}ms`)
+    return NextResponse.json({ success: true, ...result, durationMs: Date.now() - startedAt })
+  } catch (error) {
+    console.error('[Report Rollup] Errore backfill:', error)
+    return NextResponse.json(
+      { error: 'Errore nel ricalcolo del rollup report', detail: String(error) },
+      { status: 500 }
+    )
+  }
+}
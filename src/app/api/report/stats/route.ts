@@ -1,6 +1,7 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { requireAuth } from '@/lib/auth'
-import { getOperationalReport, parseReportFilters } from '@/lib/report/operational'
+import { getReportCacheStats, reportCacheHeaders } from '@/lib/report/cache'
+import { getCachedOperationalReport, parseClientPage, parseReportFilters } from '@/lib/report/operational'
 
 export const runtime = 'nodejs'
 export const dynamic = 'force-dynamic'
@@ -11,13 +12,23 @@ export async function GET(req: NextRequest) {
     return NextResponse.json({ error: auth.error }, { status: auth.status })
   }
 
+  // GET /api/report/stats?stats=cache: contatori della cache report di questo processo
+  if (req.nextUrl.searchParams.get('stats') === 'cache') {
+    return NextResponse.json(getReportCacheStats())
+  }
+
+  // X-Request-ID arriva dal proxy sulla porta 8001: collega questa riga all'access log
+  const requestId = req.headers.get('x-request-id') ?? '-'
+  const startedAt = Date.now()
+
   try {
     const { searchParams } = new URL(req.url)
     const filters = parseReportFilters(searchParams)
-    const report = await getOperationalReport(filters)
-    return NextResponse.json(report)
+    const { report, hit, computeMs } = await getCachedOperationalReport(filters, parseClientPage(searchParams))
+    console.log(`[Report Stats] ${requestId} ${hit ? 'cache' : 'calcolato'} in ${Date.now() - startedAt}ms (calcolo ${computeMs}ms)`)
+    return NextResponse.json(report, { headers: reportCacheHeaders(hit, computeMs) })
   } catch (error) {
-    console.error('[Report Stats] Errore:', error)
+    console.error(`[Report Stats] ${requestId} Errore:`, error)
     return NextResponse.json(
       { error: 'Errore nel recupero statistiche report', detail: String(error) },
       { status: 500 }
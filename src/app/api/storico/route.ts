@@ -2,6 +2,7 @@ import { mkdir, readFile, writeFile } from 'fs/promises'
 import path from 'path'
 import { NextRequest, NextResponse } from 'next/server'
 import prisma from '@/lib/prisma'
+import { actorFromHeaders, writeDeleteTombstones } from '@/lib/audit'
 import { requireAuth } from '@/lib/auth'
 
 export const runtime = 'nodejs'
@@ -167,6 +168,16 @@ export async function POST(req: NextRequest) {
       }
     })
 
+    const actor = {
+      ...actorFromHeaders(req.headers),
+      actorId: auth.user.id,
+      actorRole: auth.user.role,
+      actorEmail: auth.user.email
+    }
+    const metadata = { archivedTo: filename }
+    await writeDeleteTombstones('EVENT', eventIds, actor, metadata)
+    await writeDeleteTombstones('APPOINTMENT', appointmentIds, actor, metadata)
+
     return NextResponse.json({
       success: true,
       file: filename,
@@ -1,6 +1,6 @@
 import { NextRequest, NextResponse } from 'next/server'
 import prisma from '@/lib/prisma'
-import { hashPassword, requireAuth } from '@/lib/auth'
+import { getAuthUserCacheStats, hashPassword, invalidateAuthUser, requireAuth } from '@/lib/auth'
 import { writeAuditLog } from '@/lib/audit'
 
 export const runtime = 'nodejs'
@@ -10,6 +10,11 @@ export async function GET(req: NextRequest) {
   const auth = await requireAuth(req, ['ADMIN'])
   if (!auth.ok) return NextResponse.json({ error: auth.error }, { status: auth.status })
 
+  // GET /api/users?stats=auth-cache: contatori della cache utenti di requireAuth
+  if (req.nextUrl.searchParams.get('stats') === 'auth-cache') {
+    return NextResponse.json(getAuthUserCacheStats())
+  }
+
   const users = await prisma.user.findMany({
     orderBy: { createdAt: 'desc' },
     select: {
@@ -50,7 +55,7 @@ export async function POST(req: NextRequest) {
     const created = await prisma.user.create({
       data: {
         email,
-        passwordHash: hashPassword(password),
+        passwordHash: await hashPassword(password),
         role,
         isActive: true
       },
@@ -98,7 +103,7 @@ export async function PATCH(req: NextRequest) {
       data.role = body.role
     }
     if (typeof body.isActive === 'boolean') data.isActive = body.isActive
-    if (body.newPassword) data.passwordHash = hashPassword(body.newPassword)
+    if (body.newPassword) data.passwordHash = await hashPassword(body.newPassword)
 
     const updated = await prisma.user.update({
       where: { id },
@@ -112,6 +117,9 @@ export async function PATCH(req: NextRequest) {
       }
     })
 
+    // Ruolo e stato attivo devono valere dalla prossima richiesta dell'utente
+    if (data.role !== undefined || data.isActive !== undefined) invalidateAuthUser(id)
+
     await writeAuditLog({
       entityType: 'USER',
       entityId: id,
@@ -171,6 +179,7 @@ export async function DELETE(req: NextRequest) {
     }
 
     await prisma.user.delete({ where: { id } })
+    invalidateAuthUser(id)
 
     await writeAuditLog({
       entityType: 'USER',
@@ -3,6 +3,7 @@
 import { useState, useEffect, useRef } from 'react'
 import { useRouter, usePathname } from 'next/navigation'
 import type { CurrentUser } from '../layout/AppShell'
+import { useLiveEvents } from '@/lib/use-live-events'
 import { 
   Menu, 
   Search, 
@@ -132,6 +133,11 @@ function NotificheDropdown({ role }: { role?: string }) {
     setNotifiche([])
   }, [role])
 
+  // Eventi e appuntamenti modificati altrove: le notifiche vanno ricaricate
+  useLiveEvents((event) => {
+    if (event.entity === 'eventi' || event.entity === 'appuntamenti') setLoaded(false)
+  }, () => setLoaded(false))
+
   useEffect(() => {
     function handleClick(e: MouseEvent) {
       if (ref.current && !ref.current.contains(e.target as Node)) setOpen(false)
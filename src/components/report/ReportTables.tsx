@@ -1,13 +1,16 @@
 'use client'
 
+import { Button } from '@/components/ui/button'
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card'
 import { OperationalReportResponse, formatDateTime, formatMinutes } from '@/lib/report/types'
 
 interface ReportTablesProps {
   report: OperationalReportResponse
+  onLoadMoreClients?: () => void
+  loadingMoreClients?: boolean
 }
 
-export function ReportTables({ report }: ReportTablesProps) {
+export function ReportTables({ report, onLoadMoreClients, loadingMoreClients }: ReportTablesProps) {
   const weeklySpamVisible = report.meta.period === 'week' && report.meta.effectiveSpamMode === 'include'
 
   return (
@@ -131,6 +134,20 @@ export function ReportTables({ report }: ReportTablesProps) {
               )}
             </tbody>
           </table>
+          {onLoadMoreClients && report.clients.length < report.clientsPage.total && (
+            <div className="flex items-center justify-between pt-4 text-sm text-slate-500">
+              <span data-testid="report-clients-count">{report.clients.length} di {report.clientsPage.total} clienti</span>
+              <Button
+                type="button"
+                variant="outline"
+                onClick={onLoadMoreClients}
+                disabled={loadingMoreClients}
+                data-testid="report-clients-load-more"
+              >
+                {loadingMoreClients ? 'Caricamento...' : 'Carica altri clienti'}
+              </Button>
+            </div>
+          )}
         </CardContent>
       </Card>
 
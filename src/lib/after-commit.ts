@@ -0,0 +1,49 @@
+import { AsyncLocalStorage } from 'async_hooks'
+import { Prisma } from '@prisma/client'
+
+// Azioni che devono vedere i dati gia' scritti (ricalcolo rollup, cache report):
+// fuori da una transazione partono subito, dentro prisma.$transaction dopo il
+// commit. Con il rollback non partono: i dati non sono cambiati.
+type PendingTransaction = {
+  actions: Array<() => void | Promise<void>>
+  // Client della transazione interattiva in corso (null per il batch di query)
+  tx: any
+}
+
+const pendingActions = new AsyncLocalStorage<PendingTransaction>()
+
+export async function afterCommit(action: () => void | Promise<void>) {
+  const pending = pendingActions.getStore()
+  if (pending) pending.actions.push(action)
+  else await action()
+}
+
+/** Client della transazione interattiva in corso: per scritture che devono fare commit insieme ai dati. */
+export function transactionClient() {
+  return pendingActions.getStore()?.tx ?? null
+}
+
+/** Estensione del client Prisma: $transaction esegue dopo il commit le azioni registrate con afterCommit. */
+export const runAfterCommit = Prisma.defineExtension((client) =>
+  client.$extends({
+    name: 'after-commit',
+    client: {
+      async $transaction(...args: any[]) {
+        if (pendingActions.getStore()) return (client as any).$transaction(...args)
+        const pending: PendingTransaction = { actions: [], tx: null }
+        const [operations, ...options] = args
+        const run = typeof operations === 'function'
+          ? (tx: any) => {
+              pending.tx = tx
+              return operations(tx)
+            }
+          : operations
+        const result = await pendingActions.run(pending, () => (client as any).$transaction(run, ...options))
+        await Promise.all(pending.actions.map((action) =>
+          Promise.resolve().then(action).catch((error) => console.error('[Prisma] azione dopo il commit fallita', error))
+        ))
+        return result
+      }
+    } as { $transaction: typeof client['$transaction'] }
+  })
+)
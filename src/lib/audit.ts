@@ -1,9 +1,10 @@
 import prisma from '@/lib/prisma'
 import { dbJsonSerialize } from '@/lib/db-json'
+import { publishLiveEvent } from '@/lib/live-events'
 
 type AuditAction = 'CREATE' | 'UPDATE' | 'DELETE'
 
-interface ActorContext {
+export interface ActorContext {
   actorId?: string
   actorRole?: string
   actorEmail?: string
@@ -50,13 +51,15 @@ export async function writeAuditLog(params: {
   newValue?: any
   actor?: ActorContext
   metadata?: any
+  // Gia' calcolati dal chiamante (es. JSON Patch): evita di salvare i valori completi
+  changedFields?: Record<string, any>
 }) {
   const { entityType, entityId, action, oldValue, newValue, actor, metadata } = params
 
-  const changed = action === 'UPDATE' ? diffObjects(oldValue, newValue) : undefined
+  const changed = params.changedFields ?? (action === 'UPDATE' ? diffObjects(oldValue, newValue) : undefined)
 
   try {
-    await prisma.auditLog.create({
+    const entry = await prisma.auditLog.create({
       data: {
         entityType,
         entityId: String(entityId),
@@ -68,9 +71,48 @@ export async function writeAuditLog(params: {
         actorRole: actor?.actorRole,
         actorEmail: actor?.actorEmail,
         metadata: dbJsonSerialize(safeJson(metadata) || null)
-      }
+      },
+      select: { id: true, createdAt: true }
     })
+    publishLiveEvent({ ...entry, entityType, entityId: String(entityId), action, actorRole: actor?.actorRole, actorEmail: actor?.actorEmail })
   } catch (error) {
     console.error('[AUDIT] write failed', error)
+    // I client collegati vanno avvisati anche senza riga audit (niente cursore)
+    publishLiveEvent({ entityType, entityId: String(entityId), action, createdAt: new Date(), actorRole: actor?.actorRole, actorEmail: actor?.actorEmail })
+  }
+}
+
+const TOMBSTONE_CHUNK = 500
+
+/**
+ * Righe DELETE per record rimossi senza una delete singola con audit: cascate
+ * (appuntamenti di un cliente cancellato), archivio storico, rollback import.
+ * Il delta di /api/calendario le legge come tombstone.
+ */
+export async function writeDeleteTombstones(entityType: string, ids: number[], actor?: ActorContext, metadata?: any) {
+  try {
+    for (let index = 0; index < ids.length; index += TOMBSTONE_CHUNK) {
+      const entries = await prisma.auditLog.createManyAndReturn({
+        data: ids.slice(index, index + TOMBSTONE_CHUNK).map((id) => ({
+          entityType,
+          entityId: String(id),
+          action: 'DELETE',
+          actorId: actor?.actorId,
+          actorRole: actor?.actorRole,
+          actorEmail: actor?.actorEmail,
+          metadata: dbJsonSerialize(safeJson(metadata) || null)
+        })),
+        select: { id: true, createdAt: true, entityId: true }
+      })
+      entries.forEach((entry) => publishLiveEvent({
+        ...entry,
+        entityType,
+        action: 'DELETE',
+        actorRole: actor?.actorRole,
+        actorEmail: actor?.actorEmail
+      }))
+    }
+  } catch (error) {
+    console.error('[AUDIT] tombstone write failed', error)
   }
 }
@@ -1,4 +1,4 @@
-import { createHmac, randomBytes, scryptSync, timingSafeEqual } from 'crypto'
+import { createHmac, randomBytes, scrypt, timingSafeEqual } from 'crypto'
 import { NextRequest } from 'next/server'
 import prisma from '@/lib/prisma'
 
@@ -38,20 +38,89 @@ export function getJwtExpiryHours() {
   return n
 }
 
-export function hashPassword(password: string) {
+type ScryptParams = { N: number; r: number; p: number }
+
+// Parametri dei formati legacy `salt:hash`, generati con scryptSync e i default di Node
+const LEGACY_SCRYPT: ScryptParams = { N: 16384, r: 8, p: 1 }
+const SCRYPT_KEY_LENGTH = 64
+
+function isValidScryptParams({ N, r, p }: ScryptParams) {
+  const positive = (n: number) => Number.isSafeInteger(n) && n > 0
+  // N deve essere una potenza di 2 maggiore di 1
+  return positive(N) && N > 1 && (N & (N - 1)) === 0 && positive(r) && positive(p)
+}
+
+function readScryptParam(name: string, fallback: number) {
+  const raw = process.env[name]?.trim()
+  return raw ? Number(raw) : fallback
+}
+
+// Letti una volta al caricamento: un valore sbagliato blocca l'avvio invece di far fallire ogni login
+const SCRYPT_PARAMS: ScryptParams = {
+  N: readScryptParam('AUTH_SCRYPT_N', LEGACY_SCRYPT.N),
+  r: readScryptParam('AUTH_SCRYPT_R', LEGACY_SCRYPT.r),
+  p: readScryptParam('AUTH_SCRYPT_P', LEGACY_SCRYPT.p)
+}
+if (!isValidScryptParams(SCRYPT_PARAMS)) {
+  throw new Error('AUTH_SCRYPT_N/AUTH_SCRYPT_R/AUTH_SCRYPT_P non validi: N potenza di 2 maggiore di 1, r e p interi positivi.')
+}
+
+function getScryptParams(): ScryptParams {
+  return SCRYPT_PARAMS
+}
+
+// scrypt asincrono gira nel threadpool di libuv (UV_THREADPOOL_SIZE) e non blocca l'event loop
+function scryptAsync(password: string, salt: string, params: ScryptParams) {
+  return new Promise<Buffer>((resolve, reject) => {
+    scrypt(
+      password,
+      salt,
+      SCRYPT_KEY_LENGTH,
+      { ...params, maxmem: 256 * params.N * params.r },
+      (error, key) => (error ? reject(error) : resolve(key))
+    )
+  })
+}
+
+function parseStoredHash(storedHash: string) {
+  const parts = storedHash.split(':')
+  if (parts.length === 2) {
+    const [salt, key] = parts
+    return { params: LEGACY_SCRYPT, salt, key, legacy: true }
+  }
+  // Formato attuale: scrypt:N:r:p:salt:hash
+  if (parts.length === 6 && parts[0] === 'scrypt') {
+    const [, N, r, p, salt, key] = parts
+    const params = { N: Number(N), r: Number(r), p: Number(p) }
+    return isValidScryptParams(params) ? { params, salt, key, legacy: false } : null
+  }
+  return null
+}
+
+export async function hashPassword(password: string) {
+  const params = getScryptParams()
   const salt = randomBytes(16).toString('hex')
-  const hash = scryptSync(password, salt, 64)
-  return `${salt}:${hash.toString('hex')}`
+  const hash = await scryptAsync(password, salt, params)
+  return `scrypt:${params.N}:${params.r}:${params.p}:${salt}:${hash.toString('hex')}`
 }
 
-export function verifyPassword(password: string, storedHash: string) {
-  const [salt, key] = storedHash.split(':')
-  if (!salt || !key) return false
-  const expected = Buffer.from(key, 'hex')
-  const candidate = scryptSync(password, salt, 64)
+export async function verifyPassword(password: string, storedHash: string) {
+  const parsed = parseStoredHash(storedHash)
+  if (!parsed || !parsed.salt || !parsed.key) return false
+  const expected = Buffer.from(parsed.key, 'hex')
+  if (expected.length !== SCRYPT_KEY_LENGTH) return false
+  const candidate = await scryptAsync(password, parsed.salt, parsed.params)
   return timingSafeEqual(expected, candidate)
 }
 
+// true se l'hash va rigenerato con i parametri correnti (formato legacy o costo cambiato)
+export function passwordNeedsRehash(storedHash: string) {
+  const parsed = parseStoredHash(storedHash)
+  if (!parsed || parsed.legacy) return true
+  const current = getScryptParams()
+  return parsed.params.N !== current.N || parsed.params.r !== current.r || parsed.params.p !== current.p
+}
+
 export function signToken(payload: Omit<AuthTokenPayload, 'iat' | 'exp'>) {
   const now = Math.floor(Date.now() / 1000)
   const exp = now + getJwtExpiryHours() * 3600
@@ -94,6 +163,91 @@ export function tokenFromRequest(req: NextRequest) {
   return null
 }
 
+type AuthUser = {
+  id: string
+  email: string
+  role: UserRole
+  isActive: boolean
+}
+
+type UserCache = {
+  entries: Map<string, { user: AuthUser; expiresAt: number }>
+  hits: number
+  misses: number
+  invalidations: number
+  evictions: number
+}
+
+// Cache per processo degli utenti letti da requireAuth. PATCH/DELETE /api/users
+// la invalidano subito; il TTL limita il ritardo delle modifiche fatte da altre
+// istanze Next.js o direttamente sul database.
+const USER_CACHE_TTL_MS = Number(process.env.AUTH_USER_CACHE_TTL_MS ?? 30_000)
+const USER_CACHE_MAX_ENTRIES = Number(process.env.AUTH_USER_CACHE_MAX_ENTRIES ?? 500)
+
+const globalForAuth = globalThis as unknown as {
+  authUserCache: UserCache | undefined
+}
+
+const userCache: UserCache = globalForAuth.authUserCache ?? {
+  entries: new Map(),
+  hits: 0,
+  misses: 0,
+  invalidations: 0,
+  evictions: 0
+}
+globalForAuth.authUserCache = userCache
+
+async function findAuthUser(id: string): Promise<AuthUser | null> {
+  const cached = userCache.entries.get(id)
+  if (cached && cached.expiresAt > Date.now()) {
+    // Map mantiene l'ordine di inserimento: reinserire sposta in coda (LRU)
+    userCache.entries.delete(id)
+    userCache.entries.set(id, cached)
+    userCache.hits++
+    return cached.user
+  }
+
+  userCache.misses++
+  const user = await prisma.user.findUnique({
+    where: { id },
+    select: { id: true, email: true, role: true, isActive: true }
+  })
+  if (!user) {
+    userCache.entries.delete(id)
+    return null
+  }
+
+  const authUser = { ...user, role: user.role as UserRole }
+  if (USER_CACHE_TTL_MS > 0 && USER_CACHE_MAX_ENTRIES > 0) {
+    userCache.entries.delete(id)
+    userCache.entries.set(id, { user: authUser, expiresAt: Date.now() + USER_CACHE_TTL_MS })
+    while (userCache.entries.size > USER_CACHE_MAX_ENTRIES) {
+      const oldest = userCache.entries.keys().next().value as string
+      userCache.entries.delete(oldest)
+      userCache.evictions++
+    }
+  }
+  return authUser
+}
+
+export function invalidateAuthUser(id: string) {
+  if (userCache.entries.delete(id)) userCache.invalidations++
+}
+
+export function getAuthUserCacheStats() {
+  const lookups = userCache.hits + userCache.misses
+  return {
+    size: userCache.entries.size,
+    maxEntries: USER_CACHE_MAX_ENTRIES,
+    ttlMs: USER_CACHE_TTL_MS,
+    hits: userCache.hits,
+    misses: userCache.misses,
+    hitRate: lookups > 0 ? userCache.hits / lookups : 0,
+    invalidations: userCache.invalidations,
+    evictions: userCache.evictions
+  }
+}
+
 export async function requireAuth(req: NextRequest, roles?: UserRole[]) {
   const token = tokenFromRequest(req)
   if (!token) return { ok: false as const, status: 401, error: 'Non autenticato' }
@@ -101,7 +255,7 @@ export async function requireAuth(req: NextRequest, roles?: UserRole[]) {
   const payload = verifyToken(token)
   if (!payload) return { ok: false as const, status: 401, error: 'Token non valido o scaduto' }
 
-  const user = await prisma.user.findUnique({ where: { id: payload.sub } })
+  const user = await findAuthUser(payload.sub)
   if (!user || !user.isActive) return { ok: false as const, status: 403, error: 'Utente non attivo' }
 
   if (roles && roles.length > 0 && !roles.includes(user.role as UserRole)) {
@@ -128,7 +282,7 @@ export async function ensureInitialAdmin() {
   return prisma.user.create({
     data: {
       email,
-      passwordHash: hashPassword(password),
+      passwordHash: await hashPassword(password),
       role: 'ADMIN',
       isActive: true
     }
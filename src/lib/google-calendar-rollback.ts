@@ -1,4 +1,5 @@
 import prisma from '@/lib/prisma'
+import { ActorContext, writeDeleteTombstones } from '@/lib/audit'
 
 const PROXIMITY_MS = 10 * 60 * 1000
 
@@ -89,12 +90,13 @@ export async function getGoogleImportRollbackPreview() {
   }
 }
 
-export async function rollbackGoogleImport() {
+export async function rollbackGoogleImport(actor?: ActorContext) {
   const preview = await getGoogleImportRollbackPreview()
   const importIds = preview.candidateImportIds
   const eventIds = preview.candidateEventIds
   const appointmentIds = preview.candidateAppointmentIds
   const clientIds = preview.candidateClientIds
+  const removedClientIds: number[] = []
 
   await prisma.$transaction(async (tx) => {
     for (const ids of chunks(appointmentIds)) {
@@ -131,6 +133,7 @@ export async function rollbackGoogleImport() {
       })
       const orphanIds = stillOrphan.map((item) => item.id)
       if (orphanIds.length) {
+        removedClientIds.push(...orphanIds)
         await tx.interazioneCliente.deleteMany({ where: { clienteId: { in: orphanIds } } })
         await tx.cliente.deleteMany({ where: { id: { in: orphanIds } } })
       }
@@ -141,6 +144,11 @@ export async function rollbackGoogleImport() {
     })
   }, { timeout: 120000 })
 
+  const metadata = { reason: 'google_import_rollback' }
+  await writeDeleteTombstones('APPOINTMENT', appointmentIds, actor, metadata)
+  await writeDeleteTombstones('EVENT', eventIds, actor, metadata)
+  await writeDeleteTombstones('CLIENT', removedClientIds, actor, metadata)
+
   return {
     success: true,
     removed: {
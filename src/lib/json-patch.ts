@@ -0,0 +1,154 @@
+// JSON Patch (RFC 6902) e JSON Pointer (RFC 6901) per i campi JSON degli eventi.
+// Nessuna dipendenza dal server: createJsonPatch gira anche nel browser.
+
+export type JsonPatchOperation =
+  | { op: 'add' | 'replace' | 'test'; path: string; value: any }
+  | { op: 'remove'; path: string }
+  | { op: 'move' | 'copy'; from: string; path: string }
+
+const OPS = new Set(['add', 'remove', 'replace', 'move', 'copy', 'test'])
+const FORBIDDEN_TOKENS = new Set(['__proto__', 'constructor', 'prototype'])
+
+export function parsePointer(pointer: string): string[] | null {
+  if (pointer === '') return []
+  if (typeof pointer !== 'string' || !pointer.startsWith('/')) return null
+  const tokens = pointer.slice(1).split('/').map((token) => token.replace(/~1/g, '/').replace(/~0/g, '~'))
+  return tokens.some((token) => FORBIDDEN_TOKENS.has(token)) ? null : tokens
+}
+
+export function formatPointer(tokens: (string | number)[]) {
+  return tokens.map((token) => `/${String(token).replace(/~/g, '~0').replace(/\//g, '~1')}`).join('')
+}
+
+function isObject(value: any): value is Record<string, any> {
+  return value !== null && typeof value === 'object' && !Array.isArray(value)
+}
+
+function deepEqual(a: any, b: any): boolean {
+  if (a === b) return true
+  if (Array.isArray(a) && Array.isArray(b)) {
+    return a.length === b.length && a.every((item, i) => deepEqual(item, b[i]))
+  }
+  if (isObject(a) && isObject(b)) {
+    const keys = Object.keys(a)
+    return keys.length === Object.keys(b).length && keys.every((key) => Object.prototype.hasOwnProperty.call(b, key) && deepEqual(a[key], b[key]))
+  }
+  return false
+}
+
+function arrayIndex(container: any[], token: string, allowEnd: boolean) {
+  if (allowEnd && token === '-') return container.length
+  if (!/^(0|[1-9]\d*)$/.test(token)) throw new Error(`indice non valido "${token}"`)
+  const index = Number(token)
+  if (index > container.length || (!allowEnd && index === container.length)) throw new Error(`indice ${index} fuori intervallo`)
+  return index
+}
+
+function get(document: any, tokens: string[]) {
+  let current = document
+  for (const token of tokens) {
+    if (Array.isArray(current)) current = current[arrayIndex(current, token, false)]
+    else if (isObject(current) && Object.prototype.hasOwnProperty.call(current, token)) current = current[token]
+    else throw new Error(`percorso inesistente ${formatPointer(tokens)}`)
+  }
+  return current
+}
+
+function add(document: any, tokens: string[], value: any) {
+  if (tokens.length === 0) return value
+  const parent = get(document, tokens.slice(0, -1))
+  const key = tokens[tokens.length - 1]
+  if (Array.isArray(parent)) parent.splice(arrayIndex(parent, key, true), 0, value)
+  else if (isObject(parent)) parent[key] = value
+  else throw new Error(`il genitore di ${formatPointer(tokens)} non e' un oggetto ne' un array`)
+  return document
+}
+
+function remove(document: any, tokens: string[]) {
+  if (tokens.length === 0) throw new Error('impossibile rimuovere la radice')
+  const parent = get(document, tokens.slice(0, -1))
+  const key = tokens[tokens.length - 1]
+  if (Array.isArray(parent)) parent.splice(arrayIndex(parent, key, false), 1)
+  else if (isObject(parent) && Object.prototype.hasOwnProperty.call(parent, key)) delete parent[key]
+  else throw new Error(`percorso inesistente ${formatPointer(tokens)}`)
+  return document
+}
+
+function applyOperation(document: any, operation: any) {
+  if (!isObject(operation) || !OPS.has(operation.op)) throw new Error('operazione sconosciuta')
+  const path = parsePointer(operation.path)
+  if (!path) throw new Error(`path non valido "${operation.path}"`)
+
+  switch (operation.op) {
+    case 'add':
+      if (!('value' in operation)) throw new Error('value mancante')
+      return add(document, path, structuredClone(operation.value))
+    case 'remove':
+      return remove(document, path)
+    case 'replace':
+      if (!('value' in operation)) throw new Error('value mancante')
+      get(document, path)
+      return add(path.length ? remove(document, path) : document, path, structuredClone(operation.value))
+    case 'test':
+      if (!deepEqual(get(document, path), operation.value)) throw new Error(`test fallito su ${operation.path}`)
+      return document
+    default: {
+      const from = parsePointer(operation.from)
+      if (!from) throw new Error(`from non valido "${operation.from}"`)
+      const value = structuredClone(get(document, from))
+      if (operation.op === 'copy') return add(document, path, value)
+      if (from.length < path.length && from.every((token, i) => token === path[i])) {
+        throw new Error('impossibile spostare un valore dentro se stesso')
+      }
+      return add(remove(document, from), path, value)
+    }
+  }
+}
+
+/**
+ * Applica le operazioni a una copia del documento: o passano tutte o nessuna.
+ */
+export function applyJsonPatch(document: any, operations: any[]): { ok: true; value: any } | { ok: false; error: string } {
+  let value = structuredClone(document)
+  for (let i = 0; i < operations.length; i++) {
+    try {
+      value = applyOperation(value, operations[i])
+    } catch (error: any) {
+      return { ok: false, error: `Operazione ${i}: ${error.message}` }
+    }
+  }
+  return { ok: true, value }
+}
+
+/**
+ * Operazioni che trasformano before in after. Gli array si confrontano per
+ * posizione: accodare o togliere in fondo costa una operazione per elemento.
+ */
+export function createJsonPatch(before: any, after: any, tokens: (string | number)[] = []): JsonPatchOperation[] {
+  if (deepEqual(before, after)) return []
+  const path = formatPointer(tokens)
+
+  if (Array.isArray(before) && Array.isArray(after)) {
+    const ops: JsonPatchOperation[] = []
+    const common = Math.min(before.length, after.length)
+    for (let i = 0; i < common; i++) ops.push(...createJsonPatch(before[i], after[i], [...tokens, i]))
+    for (let i = common; i < after.length; i++) ops.push({ op: 'add', path: formatPointer([...tokens, i]), value: after[i] })
+    for (let i = before.length - 1; i >= after.length; i--) ops.push({ op: 'remove', path: formatPointer([...tokens, i]) })
+    return ops
+  }
+
+  if (isObject(before) && isObject(after)) {
+    const ops: JsonPatchOperation[] = []
+    Object.keys(before).forEach((key) => {
+      if (before[key] !== undefined && (!(key in after) || after[key] === undefined)) ops.push({ op: 'remove', path: formatPointer([...tokens, key]) })
+    })
+    Object.keys(after).forEach((key) => {
+      if (after[key] === undefined) return
+      if (key in before && before[key] !== undefined) ops.push(...createJsonPatch(before[key], after[key], [...tokens, key]))
+      else ops.push({ op: 'add', path: formatPointer([...tokens, key]), value: after[key] })
+    })
+    return ops
+  }
+
+  return [{ op: 'replace', path, value: after }]
+}
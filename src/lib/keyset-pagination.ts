@@ -0,0 +1,54 @@
+// Paginazione a cursore (keyset) sulle liste Prisma: ordine stabile su un
+// campo piu' id, null sempre in fondo, cursore opaco per il client.
+
+export type KeysetSort = {
+  field: string
+  direction: 'asc' | 'desc'
+  nullable?: boolean
+  date?: boolean
+}
+
+type KeysetCursor = [string | number | null, number]
+
+export const PAGE_SIZE_DEFAULT = 50
+export const PAGE_SIZE_MAX = 200
+
+export function pageSize(value: string | null) {
+  return Math.min(Math.max(Number(value) || PAGE_SIZE_DEFAULT, 1), PAGE_SIZE_MAX)
+}
+
+export function keysetOrderBy(sort: KeysetSort): any[] {
+  const order = sort.nullable ? { sort: sort.direction, nulls: 'last' } : sort.direction
+  return [{ [sort.field]: order }, { id: sort.direction }]
+}
+
+// Valore del campo di ordinamento e id dell'ultima riga della pagina
+export function encodeCursor(sort: KeysetSort, row: any) {
+  const value = row[sort.field]
+  const cursor: KeysetCursor = [value instanceof Date ? value.toISOString() : value ?? null, row.id]
+  return Buffer.from(JSON.stringify(cursor)).toString('base64url')
+}
+
+export function decodeCursor(raw: string): KeysetCursor | null {
+  try {
+    const cursor = JSON.parse(Buffer.from(raw, 'base64url').toString('utf8'))
+    if (!Array.isArray(cursor) || cursor.length !== 2 || !Number.isInteger(cursor[1])) return null
+    return cursor as KeysetCursor
+  } catch {
+    return null
+  }
+}
+
+// Righe successive al cursore nello stesso ordine di keysetOrderBy
+export function afterCursor(sort: KeysetSort, [raw, id]: KeysetCursor): any {
+  const op = sort.direction === 'asc' ? 'gt' : 'lt'
+  if (raw === null) return { [sort.field]: null, id: { [op]: id } }
+  const value = sort.date ? new Date(raw) : raw
+  return {
+    OR: [
+      { [sort.field]: { [op]: value } },
+      { [sort.field]: value, id: { [op]: id } },
+      ...(sort.nullable ? [{ [sort.field]: null }] : [])
+    ]
+  }
+}
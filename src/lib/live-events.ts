@@ -0,0 +1,213 @@
+import { EventEmitter } from 'events'
+import prisma from '@/lib/prisma'
+import type { UserRole } from '@/lib/auth'
+import { invalidateReportCache } from '@/lib/report/cache'
+
+export type LiveEntity = 'eventi' | 'appuntamenti' | 'clienti' | 'presenze'
+
+export interface LiveEvent {
+  // Cursore `${createdAt in ms}-${id audit}`; manca se la scrittura audit e' fallita
+  id?: string
+  entity: LiveEntity
+  entityId: string
+  action: string
+  at: string
+  actorRole?: string
+  actorEmail?: string
+}
+
+type AuditEntry = {
+  id?: string
+  entityType: string
+  entityId: string
+  action: string
+  createdAt: Date
+  actorRole?: string | null
+  actorEmail?: string | null
+}
+
+const LIVE_ENTITIES: Record<string, LiveEntity> = {
+  EVENT: 'eventi',
+  APPOINTMENT: 'appuntamenti',
+  CLIENT: 'clienti',
+  PRESENZA_VILLA: 'presenze'
+}
+
+// Tutti i ruoli leggono le quattro entita' (il middleware lo consente a WORKER e
+// REPORT): per ruolo cambia solo chi vede l'autore della modifica, l'audit e'
+// riservato ad ADMIN e REPORT
+const ROLES_WITH_ACTOR: UserRole[] = ['ADMIN', 'REPORT']
+
+// Entita' lette dal report operativo: una loro riga audit scritta da un'altra
+// istanza svuota la cache report di questo processo
+const REPORT_ENTITIES = new Set(['CLIENT', 'APPOINTMENT', 'EVENT', 'USER'])
+const TAIL_ENTITIES = Array.from(new Set([...Object.keys(LIVE_ENTITIES), ...REPORT_ENTITIES]))
+
+export const LIVE_REPLAY_MAX = Number(process.env.LIVE_REPLAY_MAX ?? 500)
+// Le scritture fatte da altre istanze Next.js si leggono dall'audit log
+const LIVE_AUDIT_POLL_MS = Number(process.env.LIVE_AUDIT_POLL_MS ?? 2_000)
+// Finestra riletta a ogni giro: copre commit lenti e orologi diversi, gli id gia' emessi si scartano
+const LIVE_AUDIT_WINDOW_MS = 30_000
+
+type AuditTail = {
+  timer: ReturnType<typeof setInterval> | null
+  running: boolean
+  // Prima lettura (solo marcatura) del giro di polling in corso
+  started: Promise<void> | null
+  // La cache report chiede la lettura fino a questo istante anche senza client SSE
+  keepUntil: number
+  // id audit gia' emessi -> createdAt in ms
+  seen: Map<string, number>
+}
+
+const globalForLive = globalThis as unknown as {
+  liveEvents: EventEmitter | undefined
+  liveAuditTail: AuditTail | undefined
+}
+
+// Un solo emitter per processo, anche con l'hot reload di next dev
+const emitter = globalForLive.liveEvents ?? new EventEmitter().setMaxListeners(0)
+globalForLive.liveEvents = emitter
+
+const tail: AuditTail = globalForLive.liveAuditTail ?? { timer: null, running: false, started: null, keepUntil: 0, seen: new Map() }
+globalForLive.liveAuditTail = tail
+
+export function formatCursor(createdAt: Date, auditId = '') {
+  return `${createdAt.getTime()}-${auditId}`
+}
+
+function parseCursor(cursor: string) {
+  const match = /^(\d{1,15})-([A-Za-z0-9]*)$/.exec(cursor)
+  if (!match) return null
+  return { createdAt: new Date(Number(match[1])), auditId: match[2] }
+}
+
+function toLiveEvent(entry: AuditEntry): LiveEvent | null {
+  const entity = LIVE_ENTITIES[entry.entityType]
+  if (!entity) return null
+  return {
+    id: entry.id ? formatCursor(entry.createdAt, entry.id) : undefined,
+    entity,
+    entityId: entry.entityId,
+    action: entry.action,
+    at: entry.createdAt.toISOString(),
+    actorRole: entry.actorRole || undefined,
+    actorEmail: entry.actorEmail || undefined
+  }
+}
+
+export function visibleTo(role: UserRole, event: LiveEvent): LiveEvent | null {
+  if (ROLES_WITH_ACTOR.includes(role)) return event
+  const { actorEmail, ...rest } = event
+  return rest
+}
+
+export function publishLiveEvent(entry: AuditEntry) {
+  if (entry.id) {
+    // Gia' emesso dalla lettura dell'audit log
+    if (tail.seen.has(entry.id)) return
+    tail.seen.set(entry.id, entry.createdAt.getTime())
+  }
+  const event = toLiveEvent(entry)
+  if (event) emitter.emit('change', event)
+}
+
+const AUDIT_SELECT = { id: true, entityType: true, entityId: true, action: true, createdAt: true, actorRole: true, actorEmail: true } as const
+
+// Righe audit recenti non ancora emesse da questo processo; al primo giro si
+// segnano soltanto, i client appena collegati le hanno gia' avute dal replay e
+// la cache report e' vuota o calcolata dopo
+async function readAuditTail(emit: boolean) {
+  if (tail.running) return
+  tail.running = true
+  try {
+    const windowStart = Date.now() - LIVE_AUDIT_WINDOW_MS
+    const rows = await prisma.auditLog.findMany({
+      where: { createdAt: { gte: new Date(windowStart) }, entityType: { in: TAIL_ENTITIES } },
+      orderBy: { createdAt: 'asc' },
+      take: LIVE_REPLAY_MAX,
+      select: AUDIT_SELECT
+    })
+    // Le scritture di questo processo sono gia' in seen: restano quelle delle altre istanze
+    if (emit && rows.some((row) => !tail.seen.has(row.id) && REPORT_ENTITIES.has(row.entityType))) invalidateReportCache()
+    rows.forEach((row) => {
+      if (emit) publishLiveEvent(row)
+      else tail.seen.set(row.id, row.createdAt.getTime())
+    })
+    tail.seen.forEach((createdAt, id) => {
+      if (createdAt < windowStart - LIVE_AUDIT_WINDOW_MS) tail.seen.delete(id)
+    })
+  } catch (error) {
+    console.error('[Live] lettura audit log fallita', error)
+  } finally {
+    tail.running = false
+  }
+}
+
+function startAuditTail() {
+  if (tail.timer || LIVE_AUDIT_POLL_MS <= 0) return tail.started ?? undefined
+  tail.started = readAuditTail(false)
+  tail.timer = setInterval(() => {
+    if (emitter.listenerCount('change') === 0 && Date.now() > tail.keepUntil) stopAuditTail()
+    else readAuditTail(true)
+  }, LIVE_AUDIT_POLL_MS)
+  tail.timer.unref?.()
+  return tail.started
+}
+
+function stopAuditTail() {
+  if (!tail.timer) return
+  clearInterval(tail.timer)
+  tail.timer = null
+  tail.started = null
+}
+
+/**
+ * Tiene attiva la lettura dell'audit log per durationMs anche senza client SSE,
+ * cosi' le scritture delle altre istanze svuotano la cache report. Da attendere
+ * prima del calcolo: le righe gia' presenti alla prima lettura sono nel report.
+ */
+export async function followAuditLog(durationMs: number) {
+  if (durationMs <= 0) return
+  tail.keepUntil = Math.max(tail.keepUntil, Date.now() + durationMs)
+  await startAuditTail()
+}
+
+export function subscribeLiveEvents(listener: (event: LiveEvent) => void) {
+  emitter.on('change', listener)
+  startAuditTail()
+  return () => {
+    emitter.off('change', listener)
+    if (emitter.listenerCount('change') === 0 && Date.now() > tail.keepUntil) stopAuditTail()
+  }
+}
+
+export function liveSubscriberCount() {
+  return emitter.listenerCount('change')
+}
+
+/**
+ * Eventi successivi al cursore, letti dall'audit log.
+ * Restituisce null se il cursore non e' valido o se gli eventi persi sono
+ * piu' di LIVE_REPLAY_MAX: il client deve allora ricaricare tutto.
+ */
+export async function replayLiveEvents(cursor: string, role: UserRole): Promise<LiveEvent[] | null> {
+  const parsed = parseCursor(cursor)
+  if (!parsed || Number.isNaN(parsed.createdAt.getTime())) return null
+
+  const rows = await prisma.auditLog.findMany({
+    // >= perche' piu' righe possono condividere il millisecondo del cursore
+    where: { createdAt: { gte: parsed.createdAt }, entityType: { in: Object.keys(LIVE_ENTITIES) } },
+    orderBy: { createdAt: 'asc' },
+    take: LIVE_REPLAY_MAX + 1,
+    select: AUDIT_SELECT
+  })
+  if (rows.length > LIVE_REPLAY_MAX) return null
+
+  return rows
+    .filter((row) => row.id !== parsed.auditId)
+    .map((row) => toLiveEvent(row))
+    .filter((event): event is LiveEvent => event !== null)
+    .map((event) => visibleTo(role, event))
+    .filter((event): event is LiveEvent => event !== null)
+}
@@ -1,10 +1,22 @@
 import { PrismaClient } from '@prisma/client'
+import { runAfterCommit } from '@/lib/after-commit'
+import { reportCacheInvalidation } from '@/lib/report/cache'
+import { trackReportWrites } from '@/lib/report/rollup'
+
+// Le scritture passano dalle estensioni che tengono aggiornati rollup e cache del report;
+// runAfterCommit sta per ultima, cosi' il client della transazione ha gia' le altre due
+function createPrismaClient() {
+  const client = new PrismaClient()
+  return client.$extends(trackReportWrites(client)).$extends(reportCacheInvalidation).$extends(runAfterCommit)
+}
+
+type ExtendedPrismaClient = ReturnType<typeof createPrismaClient>
 
 const globalForPrisma = globalThis as unknown as {
-  prisma: PrismaClient | undefined
+  prisma: ExtendedPrismaClient | undefined
 }
 
-export const prisma = globalForPrisma.prisma ?? new PrismaClient()
+export const prisma = globalForPrisma.prisma ?? createPrismaClient()
 
 if (process.env.NODE_ENV !== 'production') {
   globalForPrisma.prisma = prisma
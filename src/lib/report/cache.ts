@@ -0,0 +1,165 @@
+import { Prisma } from '@prisma/client'
+import { afterCommit } from '@/lib/after-commit'
+
+// Cache per processo dei report operativi, condivisa da /api/report/stats e
+// dall'export xlsx. Qualsiasi scrittura Prisma sulle entita' lette dal report la
+// svuota (dentro una transazione dopo il commit); le scritture delle altre istanze
+// Next.js la svuotano quando compaiono nell'audit log (followAuditLog in
+// live-events). Il TTL limita il ritardo di quelle senza audit o fatte
+// direttamente sul database.
+export const REPORT_CACHE_TTL_MS = Number(process.env.REPORT_CACHE_TTL_MS ?? 60_000)
+const REPORT_CACHE_MAX_ENTRIES = Number(process.env.REPORT_CACHE_MAX_ENTRIES ?? 50)
+
+// Modelli letti dal report; per User contano solo i campi mostrati o filtrati
+// (il rehash della password al login non deve svuotare la cache)
+const REPORT_FIELDS: Record<string, string[] | null> = {
+  Cliente: null,
+  Appuntamento: null,
+  AppuntamentoCliente: null,
+  InterazioneCliente: null,
+  Evento: null,
+  EventoCliente: null,
+  User: ['email', 'role', 'isActive']
+}
+const WRITE_OPERATIONS = new Set([
+  'create',
+  'createMany',
+  'createManyAndReturn',
+  'update',
+  'updateMany',
+  'updateManyAndReturn',
+  'upsert',
+  'delete',
+  'deleteMany'
+])
+
+type ReportCache = {
+  entries: Map<string, { value: Promise<any>; expiresAt: number; computeMs: number | null }>
+  hits: number
+  misses: number
+  invalidations: number
+  evictions: number
+  computed: number
+  computeMsTotal: number
+  lastComputeMs: number | null
+  // Cresce a ogni invalidazione: un calcolo iniziato prima non resta in cache
+  generation: number
+}
+
+const globalForReportCache = globalThis as unknown as {
+  reportCache: ReportCache | undefined
+}
+
+const reportCache: ReportCache = globalForReportCache.reportCache ?? {
+  entries: new Map(),
+  hits: 0,
+  misses: 0,
+  invalidations: 0,
+  evictions: 0,
+  computed: 0,
+  computeMsTotal: 0,
+  lastComputeMs: null,
+  generation: 0
+}
+globalForReportCache.reportCache = reportCache
+
+/**
+ * Valore in cache per key, altrimenti calcolato con compute. Le richieste
+ * contemporanee sulla stessa chiave attendono lo stesso calcolo.
+ */
+export async function cachedReport<T>(key: string, compute: () => Promise<T>): Promise<{ value: T; hit: boolean; computeMs: number }> {
+  const cached = reportCache.entries.get(key)
+  if (cached && cached.expiresAt > Date.now()) {
+    // Map mantiene l'ordine di inserimento: reinserire sposta in coda (LRU)
+    reportCache.entries.delete(key)
+    reportCache.entries.set(key, cached)
+    reportCache.hits++
+    const value = await cached.value
+    return { value, hit: true, computeMs: cached.computeMs ?? 0 }
+  }
+
+  reportCache.misses++
+  const generation = reportCache.generation
+  const startedAt = Date.now()
+  const entry = { value: compute(), expiresAt: Date.now() + REPORT_CACHE_TTL_MS, computeMs: null as number | null }
+  if (REPORT_CACHE_TTL_MS > 0 && REPORT_CACHE_MAX_ENTRIES > 0) {
+    reportCache.entries.delete(key)
+    reportCache.entries.set(key, entry)
+    while (reportCache.entries.size > REPORT_CACHE_MAX_ENTRIES) {
+      const oldest = reportCache.entries.keys().next().value as string
+      reportCache.entries.delete(oldest)
+      reportCache.evictions++
+    }
+  }
+
+  try {
+    const value = await entry.value
+    entry.computeMs = Date.now() - startedAt
+    reportCache.computed++
+    reportCache.computeMsTotal += entry.computeMs
+    reportCache.lastComputeMs = entry.computeMs
+    // Una scrittura durante il calcolo: il risultato puo' averla persa
+    if (reportCache.generation !== generation && reportCache.entries.get(key) === entry) reportCache.entries.delete(key)
+    return { value, hit: false, computeMs: entry.computeMs }
+  } catch (error) {
+    // Un calcolo fallito non resta in cache
+    if (reportCache.entries.get(key) === entry) reportCache.entries.delete(key)
+    throw error
+  }
+}
+
+export function invalidateReportCache() {
+  reportCache.generation++
+  if (!reportCache.entries.size) return
+  reportCache.entries.clear()
+  reportCache.invalidations++
+}
+
+export function getReportCacheStats() {
+  const lookups = reportCache.hits + reportCache.misses
+  return {
+    size: reportCache.entries.size,
+    maxEntries: REPORT_CACHE_MAX_ENTRIES,
+    ttlMs: REPORT_CACHE_TTL_MS,
+    hits: reportCache.hits,
+    misses: reportCache.misses,
+    hitRate: lookups > 0 ? reportCache.hits / lookups : 0,
+    invalidations: reportCache.invalidations,
+    evictions: reportCache.evictions,
+    computed: reportCache.computed,
+    averageComputeMs: reportCache.computed > 0 ? Math.round(reportCache.computeMsTotal / reportCache.computed) : 0,
+    lastComputeMs: reportCache.lastComputeMs
+  }
+}
+
+// Header di risposta: esito della cache e tempo di calcolo del report (anche se servito dalla cache)
+export function reportCacheHeaders(hit: boolean, computeMs: number) {
+  return {
+    'X-Report-Cache': hit ? 'HIT' : 'MISS',
+    'Server-Timing': `report;desc="${hit ? 'HIT' : 'MISS'}";dur=${computeMs}`
+  }
+}
+
+function touchesReport(model: string, operation: string, args: any) {
+  const fields = REPORT_FIELDS[model]
+  if (!fields || !operation.startsWith('update')) return true
+  return Object.keys(args?.data || {}).some((key) => fields.includes(key))
+}
+
+/** Estensione del client Prisma: ogni scrittura sulle entita' del report svuota la cache. */
+export const reportCacheInvalidation = Prisma.defineExtension({
+  name: 'report-cache',
+  query: {
+    $allModels: {
+      async $allOperations({ model, operation, args, query }) {
+        if (!(model in REPORT_FIELDS) || !WRITE_OPERATIONS.has(operation) || !touchesReport(model, operation, args)) return query(args)
+        try {
+          return await query(args)
+        } finally {
+          // Dopo il commit: un report calcolato nel frattempo ha letto i dati vecchi
+          await afterCommit(invalidateReportCache)
+        }
+      }
+    }
+  }
+})
@@ -1,4 +1,9 @@
+import { Prisma } from '@prisma/client'
 import prisma from '@/lib/prisma'
+import { isSqliteDb } from '@/lib/db-json'
+import { followAuditLog } from '@/lib/live-events'
+import { cachedReport, REPORT_CACHE_TTL_MS } from '@/lib/report/cache'
+import { loadRollupDays } from '@/lib/report/rollup'
 import {
   OperationalReportResponse,
   REPORT_SPAM_OPTIONS,
@@ -9,22 +14,34 @@ import {
   ReportPeriod,
   ReportQueryFilters,
   ReportTrendPoint,
-  SpamMode
+  SpamMode,
+  isCompletedOutcome,
+  sourceLabel
 } from '@/lib/report/types'
+const UNASSIGNED_OPERATOR = 'unassigned'
+const RECENT_ACTIVITIES_LIMIT = 120
+// Clienti per query di dettaglio: liste IN corte anche su SQLite
+const CLIENT_DETAIL_CHUNK = 500
 
-const COMPLETED_OUTCOMES = new Set(['svolto', 'positivo', 'negativo'])
+export const REPORT_CLIENTS_PAGE_SIZE = 100
+export const REPORT_CLIENTS_PAGE_MAX = 500
 
 type EffectiveSpamMode = 'include' | 'exclude'
 
 type ClientAccumulator = {
   clientId: number
   client: any
-  contactInPeriod: boolean
   appointments: any[]
   interactions: any[]
   events: any[]
 }
 
+export interface OperationalReportOptions {
+  clientsOffset?: number
+  // Infinity per l'export completo
+  clientsLimit?: number
+}
+
 function parseDateInput(value?: string | null) {
   const date = value ? new Date(value) : new Date()
   if (Number.isNaN(date.getTime())) return new Date()
@@ -62,10 +79,6 @@ function operatorLabel(operator: any) {
   return safeText(operator?.email) || 'Non assegnato'
 }
 
-function sourceLabel(source?: string | null) {
-  return safeText(source) || 'Non specificata'
-}
-
 function formatPeriodLabel(period: ReportPeriod, start: Date, end: Date) {
   if (period === 'week') {
     return `Settimana ${start.toLocaleDateString('it-IT')} → ${end.toLocaleDateString('it-IT')}`
@@ -126,26 +139,33 @@ export function parseReportFilters(searchParams: URLSearchParams): ReportQueryFi
   }
 }
 
+export function parseClientPage(searchParams: URLSearchParams): OperationalReportOptions {
+  const offset = Number(searchParams.get('clientsOffset'))
+  const limit = searchParams.has('clientsLimit') ? Number(searchParams.get('clientsLimit')) : REPORT_CLIENTS_PAGE_SIZE
+  return {
+    clientsOffset: Number.isInteger(offset) && offset > 0 ? offset : 0,
+    clientsLimit: Number.isInteger(limit) ? Math.min(Math.max(limit, 0), REPORT_CLIENTS_PAGE_MAX) : REPORT_CLIENTS_PAGE_SIZE
+  }
+}
+
 function isCompletedAppointment(app: any) {
-  return COMPLETED_OUTCOMES.has(safeText(app?.esito).toLowerCase())
+  return isCompletedOutcome(app?.esito)
 }
 
 function shouldCountInteraction(interaction: any) {
   return safeText(interaction?.tipo).toLowerCase() !== 'appuntamento'
 }
 
-function matchesStatus(item: any, status: string) {
-  if (!status) return true
-  return [safeText(item?.esito), safeText(item?.statoFunnel), safeText(item?.stato)]
-    .filter(Boolean)
-    .some((value) => value === status)
-}
-
 function pushUnique(items: any[], candidate: any) {
   if (!candidate || items.some((item) => item.id === candidate.id)) return
   items.push(candidate)
 }
 
+// Giorno locale YYYY-MM-DD: chiave dei punti giornalieri del trend, come i giorni del rollup
+function localDateKey(date: Date) {
+  return `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}-${String(date.getDate()).padStart(2, '0')}`
+}
+
 function createTrendSkeleton(period: ReportPeriod, start: Date, end: Date) {
   const points: ReportTrendPoint[] = []
 
@@ -168,7 +188,7 @@ function createTrendSkeleton(period: ReportPeriod, start: Date, end: Date) {
   const cursor = new Date(start)
   while (cursor <= end) {
     points.push({
-      key: cursor.toISOString().slice(0, 10),
+      key: localDateKey(cursor),
       label: period === 'week'
         ? cursor.toLocaleDateString('it-IT', { weekday: 'short' })
         : cursor.toLocaleDateString('it-IT', { day: '2-digit' }),
@@ -184,14 +204,11 @@ function createTrendSkeleton(period: ReportPeriod, start: Date, end: Date) {
   return points
 }
 
-function trendKeyForDate(period: ReportPeriod, value?: string | Date | null) {
-  if (!value) return null
-  const date = value instanceof Date ? value : new Date(value)
-  if (Number.isNaN(date.getTime())) return null
-  if (period === 'year') {
-    return `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}`
-  }
-  return date.toISOString().slice(0, 10)
+// Intervallo coperto da un punto del trend: mese locale per l'annuale, giorno locale altrimenti
+function trendBucketRange(period: ReportPeriod, key: string) {
+  const [year, month, day] = key.split('-').map(Number)
+  if (period === 'year') return { gte: new Date(year, month - 1, 1), lt: new Date(year, month, 1) }
+  return { gte: new Date(year, month - 1, day), lt: new Date(year, month - 1, day + 1) }
 }
 
 function buildSummaryText(values: string[]) {
@@ -206,363 +223,487 @@ function buildActivityLabels(activities: ReportActivityRow[]) {
     .map((activity) => `${new Date(activity.date).toLocaleDateString('it-IT')}: ${activity.type}${activity.summary ? ` — ${activity.summary}` : ''}`)
 }
 
-export async function getOperationalReport(filters: ReportQueryFilters): Promise<OperationalReportResponse> {
-  const range = resolveRange(filters.period, filters.referenceDate)
-  const effectiveSpamMode = normalizeSpamMode(filters.period, filters.spamMode)
+// ---------------------------------------------------------------------------
+// Filtri Prisma: le stesse regole di visibilita' del report applicate dal database
+// ---------------------------------------------------------------------------
 
-  const [contacts, appointments, interactions, events, users] = await Promise.all([
-    prisma.cliente.findMany({
-      where: {
-        dataPrimoContatto: {
-          gte: range.start,
-          lte: range.end
-        }
-      }
-    }),
-    prisma.appuntamento.findMany({
-      where: {
-        dataAppuntamento: {
-          gte: range.start,
-          lte: range.end
+type DateRange = { gte: Date; lte: Date }
+// statuses: valori salvati dello stato filtrato (storedStatusValues)
+type ActivityFilter = { operatorId?: string; statuses?: string[] }
+
+// Il filtro fonte e' un'etichetta del menu (sourceLabel: spazi tolti, vuota =
+// 'Non specificata'): si confronta con i valori salvati che danno quell'etichetta
+async function storedSourceValues(source: string) {
+  const groups = await prisma.cliente.groupBy({ by: ['canalePrimoContatto'] })
+  return groups.map((group) => group.canalePrimoContatto).filter((value) => sourceLabel(value) === source)
+}
+
+// Come per la fonte: esiti, stati funnel e stati evento salvati che senza spazi danno lo stato filtrato
+async function storedStatusValues(status: string) {
+  const [appointments, events] = await Promise.all([
+    prisma.appuntamento.groupBy({ by: ['esito', 'statoFunnel'] }),
+    prisma.evento.groupBy({ by: ['stato'] })
+  ])
+  const values = new Set<string>()
+  appointments.forEach((group) => [group.esito, group.statoFunnel].forEach((value) => {
+    if (value && safeText(value) === status) values.add(value)
+  }))
+  events.forEach((group) => {
+    if (safeText(group.stato) === status) values.add(group.stato)
+  })
+  return Array.from(values)
+}
+
+function sourceWhere(values: (string | null)[] | null): any {
+  if (!values) return {}
+  const stored = values.filter((value): value is string => value !== null)
+  return { OR: [{ canalePrimoContatto: { in: stored } }, ...(values.includes(null) ? [{ canalePrimoContatto: null }] : [])] }
+}
+
+function appointmentWhere(range: DateRange, filter: ActivityFilter): any {
+  return {
+    dataAppuntamento: range,
+    ...(filter.operatorId ? { operatoreId: filter.operatorId } : {}),
+    ...(filter.statuses ? { OR: [{ esito: { in: filter.statuses } }, { statoFunnel: { in: filter.statuses } }] } : {})
+  }
+}
+
+// Tutte le interazioni (anche quelle auto-generate): contano per la visibilita' del cliente
+function interactionWhere(range: DateRange, filter: ActivityFilter): any {
+  return {
+    dataInterazione: range,
+    ...(filter.operatorId ? { operatoreId: filter.operatorId } : {}),
+    ...(filter.statuses ? { appuntamento: { OR: [{ esito: { in: filter.statuses } }, { statoFunnel: { in: filter.statuses } }] } } : {})
+  }
+}
+
+function eventWhere(range: DateRange, filter: ActivityFilter): any {
+  return {
+    tipo: { not: 'Appuntamento' },
+    stato: filter.statuses ? { in: filter.statuses, not: 'annullato' } : { not: 'annullato' },
+    dataConfermata: range,
+    ...(filter.operatorId ? { appuntamentoOrigine: { operatoreId: filter.operatorId } } : {})
+  }
+}
+
+// Clienti con almeno un'attivita' nel periodo; gli eventi senza clienti passano dal cliente dell'appuntamento d'origine
+function clientActivityConditions(range: DateRange, filter: ActivityFilter): any[] {
+  const events = eventWhere(range, filter)
+  return [
+    { appuntamentiPrincipali: { some: appointmentWhere(range, filter) } },
+    { appuntamenti: { some: { appuntamento: appointmentWhere(range, filter) } } },
+    { interazioni: { some: interactionWhere(range, filter) } },
+    { eventi: { some: { evento: events } } },
+    { appuntamentiPrincipali: { some: { eventi: { some: { AND: [events, { clienti: { none: {} } }] } } } } }
+  ]
+}
+
+// sourceValues/statusValues: valori salvati di fonte e stato filtrati, null senza filtro
+function buildReportScope(
+  filters: ReportQueryFilters,
+  range: DateRange,
+  effectiveSpamMode: EffectiveSpamMode,
+  sourceValues: (string | null)[] | null,
+  statusValues: string[] | null
+) {
+  const statuses = statusValues ?? undefined
+  const activity: ActivityFilter = { operatorId: filters.operatorId, statuses }
+  const filtered = Boolean(filters.operatorId || filters.status)
+  const client = { ...sourceWhere(sourceValues), ...(effectiveSpamMode === 'exclude' ? { isSpam: false } : {}) }
+  // Con filtro operatore/esito un cliente e' visibile solo se ha attivita' che lo rispettano
+  const involved = filtered
+    ? { OR: clientActivityConditions(range, activity) }
+    : { OR: [{ dataPrimoContatto: range }, ...clientActivityConditions(range, {})] }
+
+  return {
+    range,
+    activity,
+    filtered,
+    sourceValues,
+    excludeSpam: effectiveSpamMode === 'exclude',
+    isClientVisible: (row: any) => (effectiveSpamMode !== 'exclude' || !row?.isSpam)
+      && (!filters.source || sourceLabel(row?.canalePrimoContatto) === filters.source),
+    clients: { AND: [client, involved] },
+    contacts: { AND: [client, { dataPrimoContatto: range }, ...(filtered ? [involved] : [])] },
+    universe: { OR: [{ dataPrimoContatto: range }, ...clientActivityConditions(range, {})] },
+    // Attivita' conteggiate: rispettano i filtri e hanno almeno un cliente visibile
+    appointments: {
+      AND: [appointmentWhere(range, activity), { OR: [{ clientePrincipale: client }, { clienti: { some: { cliente: client } } }] }]
+    },
+    interactions: {
+      AND: [interactionWhere(range, activity), { cliente: client, NOT: { tipo: 'appuntamento' } }]
+    },
+    events: {
+      AND: [
+        eventWhere(range, activity),
+        {
+          OR: [
+            { clienti: { some: { cliente: client } } },
+            { clienti: { none: {} }, appuntamentoOrigineId: { not: null }, appuntamentoOrigine: { clientePrincipale: client } }
+          ]
         }
-      },
-      include: {
-        clientePrincipale: true,
-        clienti: { include: { cliente: true } },
-        interazioni: true,
-        operatore: true,
-        eventi: {
-          select: {
-            id: true,
-            titolo: true,
-            stato: true,
-            dataConfermata: true
-          }
+      ]
+    },
+    hiddenSpam: effectiveSpamMode === 'exclude'
+      ? {
+          AND: [
+            { isSpam: true },
+            sourceWhere(sourceValues),
+            { OR: [{ dataPrimoContatto: range }, ...clientActivityConditions(range, {})] },
+            ...(filters.operatorId ? [{ OR: clientActivityConditions(range, { operatorId: filters.operatorId }) }] : []),
+            ...(statuses ? [{ OR: clientActivityConditions(range, { statuses }) }] : [])
+          ]
         }
-      },
-      orderBy: { dataAppuntamento: 'desc' }
+      : null
+  }
+}
+
+type ReportScope = ReturnType<typeof buildReportScope>
+
+// ---------------------------------------------------------------------------
+// Righe di dettaglio (clienti e attivita'): materializzate solo per la pagina richiesta
+// ---------------------------------------------------------------------------
+
+function appointmentActivity(client: any, appointment: any): ReportActivityRow {
+  return {
+    id: `appointment-${appointment.id}`,
+    clientId: client.id,
+    clientName: fullName(client),
+    date: toIso(appointment.dataAppuntamento) || new Date().toISOString(),
+    type: 'Appuntamento',
+    summary: buildSummaryText([appointment.riassuntoColloquio, appointment.noteColloquio]),
+    operator: operatorLabel(appointment.operatore),
+    outcome: safeText(appointment.esito) || safeText(appointment.statoFunnel) || '—',
+    durationMinutes: appointment.durataMinuti || 0,
+    isSpam: Boolean(client?.isSpam)
+  }
+}
+
+function interactionActivity(client: any, interaction: any): ReportActivityRow {
+  return {
+    id: `interaction-${interaction.id}`,
+    clientId: client.id,
+    clientName: fullName(client),
+    date: toIso(interaction.dataInterazione) || new Date().toISOString(),
+    type: `Interazione ${safeText(interaction.tipo) || 'cliente'}`,
+    summary: safeText(interaction.sintesi) || 'Interazione registrata',
+    operator: operatorLabel(interaction.operatore),
+    outcome: safeText(interaction.appuntamento?.esito) || safeText(interaction.appuntamento?.statoFunnel) || '—',
+    durationMinutes: interaction.durataMinuti || 0,
+    isSpam: Boolean(client?.isSpam)
+  }
+}
+
+function eventActivity(client: any, event: any): ReportActivityRow {
+  return {
+    id: `event-${event.id}`,
+    clientId: client.id,
+    clientName: fullName(client),
+    date: toIso(event.dataConfermata) || new Date().toISOString(),
+    type: 'Evento confermato',
+    summary: safeText(event.titolo) || 'Evento confermato',
+    operator: operatorLabel(event.appuntamentoOrigine?.operatore),
+    outcome: safeText(event.stato) || 'confermato',
+    durationMinutes: 0,
+    isSpam: Boolean(client?.isSpam)
+  }
+}
+
+function buildClientRow(entry: ClientAccumulator): ReportClientRow {
+  const manualInteractions = entry.interactions.filter(shouldCountInteraction)
+  const totalTimeMinutes = entry.appointments.reduce((sum, appointment) => sum + (appointment.durataMinuti || 0), 0)
+    + manualInteractions.reduce((sum, interaction) => sum + (interaction.durataMinuti || 0), 0)
+
+  const clientActivityRows: ReportActivityRow[] = [
+    ...entry.appointments.map((appointment) => appointmentActivity(entry.client, appointment)),
+    ...manualInteractions.map((interaction) => interactionActivity(entry.client, interaction)),
+    ...entry.events.map((event) => eventActivity(entry.client, event))
+  ].sort((a, b) => new Date(b.date).getTime() - new Date(a.date).getTime())
+
+  return {
+    clientId: entry.clientId,
+    fullName: fullName(entry.client),
+    source: sourceLabel(entry.client?.canalePrimoContatto),
+    firstContactAt: toIso(entry.client?.dataPrimoContatto),
+    isSpam: Boolean(entry.client?.isSpam),
+    spamReason: safeText(entry.client?.spamReason) || null,
+    appointmentsScheduled: entry.appointments.length,
+    appointmentsCompleted: entry.appointments.filter(isCompletedAppointment).length,
+    interactionsCount: manualInteractions.length,
+    totalTimeMinutes,
+    confirmedEvents: entry.events.length,
+    summary: buildSummaryText([
+      ...entry.appointments.flatMap((appointment) => [appointment.riassuntoColloquio, appointment.noteColloquio]),
+      ...manualInteractions.map((interaction) => interaction.sintesi)
+    ]),
+    activities: buildActivityLabels(clientActivityRows),
+    operators: Array.from(new Set(clientActivityRows.map((activity) => activity.operator).filter(Boolean))),
+    outcomes: Array.from(new Set(entry.appointments.map((appointment) => safeText(appointment.esito)).filter(Boolean))),
+    funnels: Array.from(new Set(entry.appointments.map((appointment) => safeText(appointment.statoFunnel)).filter(Boolean))),
+    latestActivityAt: clientActivityRows[0]?.date || toIso(entry.client?.dataPrimoContatto)
+  }
+}
+
+async function loadClientRows(scope: ReportScope, clientIds: number[]) {
+  const rows: ReportClientRow[] = []
+  const { range, activity } = scope
+
+  for (let index = 0; index < clientIds.length; index += CLIENT_DETAIL_CHUNK) {
+    const ids = clientIds.slice(index, index + CLIENT_DETAIL_CHUNK)
+    const [clients, appointments, interactions, events] = await Promise.all([
+      prisma.cliente.findMany({ where: { id: { in: ids } } }),
+      prisma.appuntamento.findMany({
+        where: {
+          AND: [appointmentWhere(range, activity), { OR: [{ clientePrincipaleId: { in: ids } }, { clienti: { some: { clienteId: { in: ids } } } }] }]
+        },
+        include: { clienti: { select: { clienteId: true } }, operatore: true },
+        orderBy: { dataAppuntamento: 'desc' }
+      }),
+      prisma.interazioneCliente.findMany({
+        where: { AND: [interactionWhere(range, activity), { clienteId: { in: ids } }] },
+        include: {
+          operatore: true,
+          appuntamento: { select: { id: true, esito: true, statoFunnel: true, operatoreId: true } }
+        },
+        orderBy: { dataInterazione: 'desc' }
+      }),
+      prisma.evento.findMany({
+        where: {
+          AND: [
+            eventWhere(range, activity),
+            { OR: [{ clienti: { some: { clienteId: { in: ids } } } }, { clienti: { none: {} }, appuntamentoOrigine: { clientePrincipaleId: { in: ids } } }] }
+          ]
+        },
+        include: { clienti: { select: { clienteId: true } }, appuntamentoOrigine: { include: { operatore: true } } },
+        orderBy: { dataConfermata: 'desc' }
+      })
+    ])
+
+    const accumulators = new Map<number, ClientAccumulator>(
+      clients.map((client) => [client.id, { clientId: client.id, client, appointments: [], interactions: [], events: [] }])
+    )
+    appointments.forEach((appointment) => {
+      new Set([appointment.clientePrincipaleId, ...appointment.clienti.map((entry) => entry.clienteId)]).forEach((clientId) => {
+        const acc = accumulators.get(clientId)
+        if (acc) pushUnique(acc.appointments, appointment)
+      })
+    })
+    interactions.forEach((interaction) => {
+      const acc = accumulators.get(interaction.clienteId)
+      if (acc) pushUnique(acc.interactions, interaction)
+    })
+    events.forEach((event) => {
+      const clientIdsForEvent = event.clienti.length
+        ? event.clienti.map((entry) => entry.clienteId)
+        : [event.appuntamentoOrigine?.clientePrincipaleId]
+      clientIdsForEvent.forEach((clientId) => {
+        const acc = clientId ? accumulators.get(clientId) : undefined
+        if (acc) pushUnique(acc.events, event)
+      })
+    })
+
+    ids.forEach((clientId) => {
+      const acc = accumulators.get(clientId)
+      if (acc) rows.push(buildClientRow(acc))
+    })
+  }
+
+  return rows
+}
+
+// Indice clienti in SQL: stessi filtri di scope.clients, gia' ordinato e paginato dal database.
+// Su SQLite Prisma salva i DateTime come millisecondi.
+function sqlDate(value: Date) {
+  return isSqliteDb() ? Prisma.sql`${value.getTime()}` : Prisma.sql`CAST(${value.toISOString()} AS TIMESTAMP(3))`
+}
+
+function sqlRange(column: Prisma.Sql, range: DateRange) {
+  return Prisma.sql`${column} >= ${sqlDate(range.gte)} AND ${column} <= ${sqlDate(range.lte)}`
+}
+
+function sqlIn(column: Prisma.Sql, values: string[]) {
+  return values.length ? Prisma.sql`${column} IN (${Prisma.join(values)})` : Prisma.sql`1 = 0`
+}
+
+// GREATEST ignora i NULL; MAX scalare di SQLite no
+function sqlGreatest(values: Prisma.Sql[]) {
+  return isSqliteDb()
+    ? Prisma.sql`NULLIF(MAX(${Prisma.join(values.map((value) => Prisma.sql`COALESCE(${value}, 0)`))}), 0)`
+    : Prisma.sql`GREATEST(${Prisma.join(values)})`
+}
+
+function appointmentSql(range: DateRange, filter: ActivityFilter) {
+  return Prisma.join([
+    sqlRange(Prisma.sql`a."dataAppuntamento"`, range),
+    ...(filter.operatorId ? [Prisma.sql`a."operatoreId" = ${filter.operatorId}`] : []),
+    ...(filter.statuses ? [Prisma.sql`(${sqlIn(Prisma.sql`a."esito"`, filter.statuses)} OR ${sqlIn(Prisma.sql`a."statoFunnel"`, filter.statuses)})`] : [])
+  ], ' AND ')
+}
+
+function interactionSql(range: DateRange, filter: ActivityFilter) {
+  return Prisma.join([
+    sqlRange(Prisma.sql`i."dataInterazione"`, range),
+    ...(filter.operatorId ? [Prisma.sql`i."operatoreId" = ${filter.operatorId}`] : []),
+    ...(filter.statuses
+      ? [Prisma.sql`EXISTS (SELECT 1 FROM "Appuntamento" ia WHERE ia."id" = i."appuntamentoId" AND (${sqlIn(Prisma.sql`ia."esito"`, filter.statuses)} OR ${sqlIn(Prisma.sql`ia."statoFunnel"`, filter.statuses)}))`]
+      : [])
+  ], ' AND ')
+}
+
+function eventSql(range: DateRange, filter: ActivityFilter) {
+  return Prisma.join([
+    Prisma.sql`e."tipo" <> 'Appuntamento' AND e."stato" <> 'annullato'`,
+    ...(filter.statuses ? [sqlIn(Prisma.sql`e."stato"`, filter.statuses)] : []),
+    sqlRange(Prisma.sql`e."dataConfermata"`, range),
+    ...(filter.operatorId
+      ? [Prisma.sql`EXISTS (SELECT 1 FROM "Appuntamento" eo WHERE eo."id" = e."appuntamentoOrigineId" AND eo."operatoreId" = ${filter.operatorId})`]
+      : [])
+  ], ' AND ')
+}
+
+function clientSql(scope: ReportScope) {
+  const conditions: Prisma.Sql[] = []
+  if (scope.sourceValues) {
+    const stored = scope.sourceValues.filter((value): value is string => value !== null)
+    conditions.push(scope.sourceValues.includes(null)
+      ? Prisma.sql`(${sqlIn(Prisma.sql`c."canalePrimoContatto"`, stored)} OR c."canalePrimoContatto" IS NULL)`
+      : sqlIn(Prisma.sql`c."canalePrimoContatto"`, stored))
+  }
+  if (scope.excludeSpam) conditions.push(Prisma.sql`NOT c."isSpam"`)
+  return conditions.length ? Prisma.join(conditions, ' AND ') : Prisma.sql`1 = 1`
+}
+
+// Id dei clienti nell'ordine della tabella (ultima attivita' visibile, poi nome).
+// Le interazioni 'appuntamento' rendono visibile il cliente ma non contano come attivita'.
+async function loadClientIds(scope: ReportScope, options: { offset?: number; limit?: number; spamOnly?: boolean } = {}) {
+  const { range, activity } = scope
+  const appointments = appointmentSql(range, activity)
+  const events = eventSql(range, activity)
+  const latest = sqlGreatest([
+    Prisma.sql`(SELECT MAX(a."dataAppuntamento") FROM "Appuntamento" a WHERE a."clientePrincipaleId" = c."id" AND ${appointments})`,
+    Prisma.sql`(SELECT MAX(a."dataAppuntamento") FROM "AppuntamentoCliente" ac JOIN "Appuntamento" a ON a."id" = ac."appuntamentoId" WHERE ac."clienteId" = c."id" AND ${appointments})`,
+    Prisma.sql`(SELECT MAX(i."dataInterazione") FROM "InterazioneCliente" i WHERE i."clienteId" = c."id" AND i."tipo" <> 'appuntamento' AND ${interactionSql(range, activity)})`,
+    Prisma.sql`(SELECT MAX(e."dataConfermata") FROM "EventoCliente" ec JOIN "Evento" e ON e."id" = ec."eventoId" WHERE ec."clienteId" = c."id" AND ${events})`,
+    Prisma.sql`(SELECT MAX(e."dataConfermata") FROM "Evento" e JOIN "Appuntamento" o ON o."id" = e."appuntamentoOrigineId"
+      WHERE o."clientePrincipaleId" = c."id" AND NOT EXISTS (SELECT 1 FROM "EventoCliente" ec WHERE ec."eventoId" = e."id") AND ${events})`
+  ])
+  const involved = Prisma.sql`(t."ultimaAttivita" IS NOT NULL OR t."interazione"${
+    scope.filtered ? Prisma.empty : Prisma.sql` OR (${sqlRange(Prisma.sql`t."dataPrimoContatto"`, range)})`
+  })`
+  // Export completo (limite Infinity): niente LIMIT, l'offset si applica dopo
+  const paged = options.limit !== undefined && Number.isFinite(options.limit)
+
+  const rows = await prisma.$queryRaw<{ id: number }[]>(Prisma.sql`
+    SELECT t."id" AS id
+    FROM (
+      SELECT
+        c."id",
+        c."dataPrimoContatto",
+        COALESCE(NULLIF(TRIM(TRIM(c."nome") || ' ' || COALESCE(TRIM(c."cognome"), '')), ''), 'Cliente senza nome') AS "nomeCompleto",
+        ${latest} AS "ultimaAttivita",
+        EXISTS (SELECT 1 FROM "InterazioneCliente" i WHERE i."clienteId" = c."id" AND ${interactionSql(range, activity)}) AS "interazione"
+      FROM "Cliente" c
+      WHERE ${clientSql(scope)}${options.spamOnly ? Prisma.sql` AND c."isSpam"` : Prisma.empty}
+    ) t
+    WHERE ${involved}
+    ORDER BY COALESCE(t."ultimaAttivita", t."dataPrimoContatto") DESC NULLS LAST, LOWER(t."nomeCompleto"), t."id"
+    ${paged ? Prisma.sql`LIMIT ${options.limit} OFFSET ${options.offset ?? 0}` : Prisma.empty}`)
+  const ids = rows.map((row) => Number(row.id))
+  return !paged && options.offset ? ids.slice(options.offset) : ids
+}
+
+// Le ultime attivita': a ogni riga basta l'attivita' piu' recente per tipo, poi si espande sui clienti visibili
+async function loadRecentActivities(scope: ReportScope) {
+  const [appointments, interactions, events] = await Promise.all([
+    prisma.appuntamento.findMany({
+      where: scope.appointments,
+      include: { clientePrincipale: true, clienti: { include: { cliente: true } }, operatore: true },
+      orderBy: { dataAppuntamento: 'desc' },
+      take: RECENT_ACTIVITIES_LIMIT
     }),
     prisma.interazioneCliente.findMany({
-      where: {
-        dataInterazione: {
-          gte: range.start,
-          lte: range.end
-        }
-      },
+      where: scope.interactions,
       include: {
         cliente: true,
         operatore: true,
-        appuntamento: {
-          select: {
-            id: true,
-            esito: true,
-            statoFunnel: true,
-            operatoreId: true
-          }
-        }
+        appuntamento: { select: { id: true, esito: true, statoFunnel: true, operatoreId: true } }
       },
-      orderBy: { dataInterazione: 'desc' }
+      orderBy: { dataInterazione: 'desc' },
+      take: RECENT_ACTIVITIES_LIMIT
     }),
     prisma.evento.findMany({
-      where: {
-        tipo: { not: 'Appuntamento' },
-        stato: { not: 'annullato' },
-        dataConfermata: {
-          gte: range.start,
-          lte: range.end
-        }
-      },
+      where: scope.events,
       include: {
         clienti: { include: { cliente: true } },
-        appuntamentoOrigine: {
-          include: {
-            operatore: true,
-            clientePrincipale: true
-          }
-        }
+        appuntamentoOrigine: { include: { operatore: true, clientePrincipale: true } }
       },
-      orderBy: { dataConfermata: 'desc' }
-    }),
-    prisma.user.findMany({
-      where: { isActive: true },
-      orderBy: { email: 'asc' }
+      orderBy: { dataConfermata: 'desc' },
+      take: RECENT_ACTIVITIES_LIMIT
     })
   ])
 
-  const clientsMap = new Map<number, ClientAccumulator>()
-  const ensureClient = (client: any) => {
-    if (!client?.id) return null
-    const existing = clientsMap.get(client.id)
-    const contactInPeriod = !!client.dataPrimoContatto && new Date(client.dataPrimoContatto) >= range.start && new Date(client.dataPrimoContatto) <= range.end
-    if (existing) {
-      existing.client = { ...existing.client, ...client }
-      existing.contactInPeriod = existing.contactInPeriod || contactInPeriod
-      return existing
-    }
-    const created: ClientAccumulator = {
-      clientId: client.id,
-      client,
-      contactInPeriod,
-      appointments: [],
-      interactions: [],
-      events: []
-    }
-    clientsMap.set(client.id, created)
-    return created
-  }
-
-  contacts.forEach((client) => {
-    ensureClient(client)
-  })
-
+  const rows: ReportActivityRow[] = []
   appointments.forEach((appointment) => {
-    const clientIds = new Set<number>()
-    clientIds.add(appointment.clientePrincipaleId)
-    appointment.clienti.forEach((entry: any) => {
-      if (entry?.cliente?.id) clientIds.add(entry.cliente.id)
-      if (entry?.cliente) ensureClient(entry.cliente)
-    })
-    ensureClient(appointment.clientePrincipale)
-    clientIds.forEach((clientId) => {
-      const acc = clientsMap.get(clientId)
-      if (!acc) return
-      pushUnique(acc.appointments, appointment)
+    const clients = new Map<number, any>([[appointment.clientePrincipale.id, appointment.clientePrincipale]])
+    appointment.clienti.forEach((entry) => clients.set(entry.cliente.id, entry.cliente))
+    clients.forEach((client) => {
+      if (scope.isClientVisible(client)) rows.push(appointmentActivity(client, appointment))
     })
   })
-
-  interactions.forEach((interaction) => {
-    const acc = ensureClient(interaction.cliente)
-    if (!acc) return
-    pushUnique(acc.interactions, interaction)
-  })
-
+  interactions.forEach((interaction) => rows.push(interactionActivity(interaction.cliente, interaction)))
   events.forEach((event) => {
-    event.clienti.forEach((entry: any) => {
-      const acc = ensureClient(entry.cliente)
-      if (!acc) return
-      pushUnique(acc.events, event)
+    const clients = event.clienti.length
+      ? event.clienti.map((entry) => entry.cliente)
+      : [event.appuntamentoOrigine?.clientePrincipale].filter(Boolean)
+    clients.forEach((client) => {
+      if (scope.isClientVisible(client)) rows.push(eventActivity(client, event))
     })
-    if (!event.clienti.length && event.appuntamentoOrigine?.clientePrincipale) {
-      const acc = ensureClient(event.appuntamentoOrigine.clientePrincipale)
-      if (acc) pushUnique(acc.events, event)
-    }
   })
 
-  const rawClientAccumulators = Array.from(clientsMap.values())
-  const sourceOptions = Array.from(
-    new Set(rawClientAccumulators.map((entry) => sourceLabel(entry.client?.canalePrimoContatto)).filter(Boolean))
-  )
-
-  const visibleClients = rawClientAccumulators
-    .map((entry) => {
-      const filteredAppointments = entry.appointments.filter((appointment) => {
-        if (filters.operatorId && safeText(appointment.operatoreId) !== filters.operatorId) return false
-        return matchesStatus(appointment, filters.status)
-      })
-
-      const filteredInteractions = entry.interactions.filter((interaction) => {
-        if (filters.operatorId && safeText(interaction.operatoreId) !== filters.operatorId) return false
-        if (!filters.status) return true
-        return matchesStatus(interaction.appuntamento, filters.status)
-      })
-
-      const filteredEvents = entry.events.filter((event) => {
-        if (filters.operatorId && safeText(event.appuntamentoOrigine?.operatoreId) !== filters.operatorId) return false
-        return matchesStatus(event, filters.status)
-      })
-
-      const hasVisibleActivities = filteredAppointments.length > 0 || filteredInteractions.length > 0 || filteredEvents.length > 0
-      if (filters.status && !hasVisibleActivities) {
-        return null
-      }
-
-      if (filters.operatorId && !hasVisibleActivities) {
-        return null
-      }
-
-      if (filters.source && sourceLabel(entry.client?.canalePrimoContatto) !== filters.source) {
-        return null
-      }
-
-      if (effectiveSpamMode === 'exclude' && entry.client?.isSpam) {
-        return null
-      }
-
-      if (!entry.contactInPeriod && !hasVisibleActivities) {
-        return null
-      }
-
-      return {
-        ...entry,
-        appointments: filteredAppointments,
-        interactions: filteredInteractions,
-        events: filteredEvents
-      }
-    })
-    .filter(Boolean) as ClientAccumulator[]
-
-  const hiddenSpamCount = rawClientAccumulators.filter((entry) => {
-    if (!entry.client?.isSpam) return false
-    if (!entry.contactInPeriod && !entry.appointments.length && !entry.interactions.length && !entry.events.length) return false
-    if (filters.source && sourceLabel(entry.client?.canalePrimoContatto) !== filters.source) return false
-    if (filters.operatorId) {
-      const hasMatchingOperator = entry.appointments.some((appointment) => safeText(appointment.operatoreId) === filters.operatorId)
-        || entry.interactions.some((interaction) => safeText(interaction.operatoreId) === filters.operatorId)
-        || entry.events.some((event) => safeText(event.appuntamentoOrigine?.operatoreId) === filters.operatorId)
-      if (!hasMatchingOperator) return false
-    }
-    if (filters.status) {
-      const hasMatchingStatus = entry.appointments.some((appointment) => matchesStatus(appointment, filters.status))
-        || entry.interactions.some((interaction) => matchesStatus(interaction.appuntamento, filters.status))
-        || entry.events.some((event) => matchesStatus(event, filters.status))
-      if (!hasMatchingStatus) return false
-    }
-    return true
-  }).length
-
-  const clientRows: ReportClientRow[] = []
-  const activityRows: ReportActivityRow[] = []
-  const uniqueAppointments = new Map<number, any>()
-  const uniqueManualInteractions = new Map<number, any>()
-  const uniqueEvents = new Map<number, any>()
-  const trend = createTrendSkeleton(filters.period, range.start, range.end)
-  const trendMap = new Map(trend.map((point) => [point.key, point]))
-
-  visibleClients.forEach((entry) => {
-    if (entry.contactInPeriod) {
-      const trendPoint = trendMap.get(trendKeyForDate(filters.period, entry.client?.dataPrimoContatto) || '')
-      if (trendPoint) trendPoint.contacts += 1
-    }
-
-    entry.appointments.forEach((appointment) => {
-      if (!uniqueAppointments.has(appointment.id)) {
-        uniqueAppointments.set(appointment.id, appointment)
-        const trendPoint = trendMap.get(trendKeyForDate(filters.period, appointment.dataAppuntamento) || '')
-        if (trendPoint) {
-          trendPoint.appointments += 1
-          if (isCompletedAppointment(appointment)) trendPoint.completedAppointments += 1
-        }
-      }
-    })
+  return rows
+    .sort((a, b) => new Date(b.date).getTime() - new Date(a.date).getTime())
+    .slice(0, RECENT_ACTIVITIES_LIMIT)
+}
 
-    entry.interactions.forEach((interaction) => {
-      if (!shouldCountInteraction(interaction)) return
-      if (uniqueManualInteractions.has(interaction.id)) return
-      uniqueManualInteractions.set(interaction.id, interaction)
-      const trendPoint = trendMap.get(trendKeyForDate(filters.period, interaction.dataInterazione) || '')
-      if (trendPoint) trendPoint.interactions += 1
-    })
+// ---------------------------------------------------------------------------
+// Aggregati: conteggi, somme e raggruppamenti calcolati dal database
+// ---------------------------------------------------------------------------
 
-    entry.events.forEach((event) => {
-      if (uniqueEvents.has(event.id)) return
-      uniqueEvents.set(event.id, event)
-      const trendPoint = trendMap.get(trendKeyForDate(filters.period, event.dataConfermata) || '')
-      if (trendPoint) trendPoint.confirmedEvents += 1
-    })
+function sumCounts(groups: { _count: { _all: number } }[]) {
+  return groups.reduce((sum, group) => sum + group._count._all, 0)
+}
 
-    const manualInteractions = entry.interactions.filter(shouldCountInteraction)
-    const totalTimeMinutes = entry.appointments.reduce((sum, appointment) => sum + (appointment.durataMinuti || 0), 0)
-      + manualInteractions.reduce((sum, interaction) => sum + (interaction.durataMinuti || 0), 0)
-
-    const clientActivityRows: ReportActivityRow[] = [
-      ...entry.appointments.map((appointment) => ({
-        id: `appointment-${appointment.id}`,
-        clientId: entry.clientId,
-        clientName: fullName(entry.client),
-        date: toIso(appointment.dataAppuntamento) || new Date().toISOString(),
-        type: 'Appuntamento',
-        summary: buildSummaryText([appointment.riassuntoColloquio, appointment.noteColloquio]),
-        operator: operatorLabel(appointment.operatore),
-        outcome: safeText(appointment.esito) || safeText(appointment.statoFunnel) || '—',
-        durationMinutes: appointment.durataMinuti || 0,
-        isSpam: Boolean(entry.client?.isSpam)
-      })),
-      ...manualInteractions.map((interaction) => ({
-        id: `interaction-${interaction.id}`,
-        clientId: entry.clientId,
-        clientName: fullName(entry.client),
-        date: toIso(interaction.dataInterazione) || new Date().toISOString(),
-        type: `Interazione ${safeText(interaction.tipo) || 'cliente'}`,
-        summary: safeText(interaction.sintesi) || 'Interazione registrata',
-        operator: operatorLabel(interaction.operatore),
-        outcome: safeText(interaction.appuntamento?.esito) || safeText(interaction.appuntamento?.statoFunnel) || '—',
-        durationMinutes: interaction.durataMinuti || 0,
-        isSpam: Boolean(entry.client?.isSpam)
-      })),
-      ...entry.events.map((event) => ({
-        id: `event-${event.id}`,
-        clientId: entry.clientId,
-        clientName: fullName(entry.client),
-        date: toIso(event.dataConfermata) || new Date().toISOString(),
-        type: 'Evento confermato',
-        summary: safeText(event.titolo) || 'Evento confermato',
-        operator: operatorLabel(event.appuntamentoOrigine?.operatore),
-        outcome: safeText(event.stato) || 'confermato',
-        durationMinutes: 0,
-        isSpam: Boolean(entry.client?.isSpam)
-      }))
-    ].sort((a, b) => new Date(b.date).getTime() - new Date(a.date).getTime())
-
-    clientActivityRows.forEach((activity) => activityRows.push(activity))
-
-    const operators = Array.from(new Set(clientActivityRows.map((activity) => activity.operator).filter(Boolean)))
-    const outcomes = Array.from(new Set(entry.appointments.map((appointment) => safeText(appointment.esito)).filter(Boolean)))
-    const funnels = Array.from(new Set(entry.appointments.map((appointment) => safeText(appointment.statoFunnel)).filter(Boolean)))
-
-    clientRows.push({
-      clientId: entry.clientId,
-      fullName: fullName(entry.client),
-      source: sourceLabel(entry.client?.canalePrimoContatto),
-      firstContactAt: toIso(entry.client?.dataPrimoContatto),
-      isSpam: Boolean(entry.client?.isSpam),
-      spamReason: safeText(entry.client?.spamReason) || null,
-      appointmentsScheduled: entry.appointments.length,
-      appointmentsCompleted: entry.appointments.filter(isCompletedAppointment).length,
-      interactionsCount: manualInteractions.length,
-      totalTimeMinutes,
-      confirmedEvents: entry.events.length,
-      summary: buildSummaryText([
-        ...entry.appointments.flatMap((appointment) => [appointment.riassuntoColloquio, appointment.noteColloquio]),
-        ...manualInteractions.map((interaction) => interaction.sintesi)
-      ]),
-      activities: buildActivityLabels(clientActivityRows),
-      operators,
-      outcomes,
-      funnels,
-      latestActivityAt: clientActivityRows[0]?.date || toIso(entry.client?.dataPrimoContatto)
-    })
+function breakdown(groups: any[], field: string) {
+  const counts = new Map<string, number>()
+  groups.forEach((group) => {
+    const value = safeText(group[field])
+    if (value) counts.set(value, (counts.get(value) || 0) + group._count._all)
   })
+  return Array.from(counts.entries())
+    .map(([key, count]) => ({ key, label: key, count }))
+    .sort((a, b) => b.count - a.count)
+}
 
-  const isContactInRange = (value?: string | null) => {
-    if (!value) return false
-    const firstContact = new Date(value)
-    return firstContact >= range.start && firstContact <= range.end
+function operatorClientsWhere(scope: ReportScope, operatorId: string | null): any {
+  const eventOperator = operatorId
+    ? { appuntamentoOrigine: { operatoreId: operatorId } }
+    : { OR: [{ appuntamentoOrigineId: null }, { appuntamentoOrigine: { operatoreId: null } }] }
+  return {
+    OR: [
+      { appuntamentiPrincipali: { some: { AND: [scope.appointments, { operatoreId: operatorId }] } } },
+      { interazioni: { some: { AND: [scope.interactions, { operatoreId: operatorId }] } } },
+      { eventi: { some: { evento: { AND: [scope.events, eventOperator] } } } }
+    ]
   }
+}
 
-  const contactsTotal = clientRows.filter((client) => {
-    if (!client.firstContactAt) return false
-    return isContactInRange(client.firstContactAt)
-  }).length
-  const contactsSpam = clientRows.filter((client) => client.isSpam && isContactInRange(client.firstContactAt)).length
-  const contactsValid = clientRows.filter((client) => !client.isSpam && isContactInRange(client.firstContactAt)).length
-
-  const sourcesMap = new Map<string, { total: number; valid: number; spam: number }>()
-  clientRows.forEach((client) => {
-    if (!isContactInRange(client.firstContactAt)) return
-    const bucket = sourcesMap.get(client.source) || { total: 0, valid: 0, spam: 0 }
-    bucket.total += 1
-    if (client.isSpam) bucket.spam += 1
-    else bucket.valid += 1
-    sourcesMap.set(client.source, bucket)
-  })
-
-  const operatorsMap = new Map<string, ReportOperatorRow>()
-  const operatorClients = new Map<string, Set<number>>()
-  Array.from(uniqueAppointments.values()).forEach((appointment) => {
-    const key = safeText(appointment.operatoreId) || 'unassigned'
-    const row = operatorsMap.get(key) || {
+async function loadOperatorRows(scope: ReportScope, appointmentGroups: any[], interactionGroups: any[], eventGroups: any[]) {
+  const rows = new Map<string, ReportOperatorRow>()
+  const rowFor = (operatorId: string | null) => {
+    const key = safeText(operatorId) || UNASSIGNED_OPERATOR
+    const row = rows.get(key) || {
       operatorId: key,
-      operatorName: operatorLabel(appointment.operatore),
+      operatorName: operatorLabel(null),
       clientsCount: 0,
       appointmentsScheduled: 0,
       appointmentsCompleted: 0,
@@ -570,84 +711,248 @@ export async function getOperationalReport(filters: ReportQueryFilters): Promise
       totalTimeMinutes: 0,
       confirmedEvents: 0
     }
-    row.appointmentsScheduled += 1
-    row.totalTimeMinutes += appointment.durataMinuti || 0
-    if (isCompletedAppointment(appointment)) row.appointmentsCompleted += 1
-    operatorsMap.set(key, row)
-    if (!operatorClients.has(key)) operatorClients.set(key, new Set())
-    operatorClients.get(key)?.add(appointment.clientePrincipaleId)
+    rows.set(key, row)
+    return row
+  }
+
+  appointmentGroups.forEach((group) => {
+    const row = rowFor(group.operatoreId)
+    row.appointmentsScheduled += group._count._all
+    row.totalTimeMinutes += group._sum.durataMinuti || 0
+    if (isCompletedAppointment(group)) row.appointmentsCompleted += group._count._all
+  })
+  interactionGroups.forEach((group) => {
+    const row = rowFor(group.operatoreId)
+    row.interactionsCount += group._count._all
+    row.totalTimeMinutes += group._sum.durataMinuti || 0
   })
 
-  Array.from(uniqueManualInteractions.values()).forEach((interaction) => {
-    const key = safeText(interaction.operatoreId) || 'unassigned'
-    const row = operatorsMap.get(key) || {
-      operatorId: key,
-      operatorName: operatorLabel(interaction.operatore),
-      clientsCount: 0,
-      appointmentsScheduled: 0,
-      appointmentsCompleted: 0,
-      interactionsCount: 0,
-      totalTimeMinutes: 0,
-      confirmedEvents: 0
-    }
-    row.interactionsCount += 1
-    row.totalTimeMinutes += interaction.durataMinuti || 0
-    operatorsMap.set(key, row)
-    if (!operatorClients.has(key)) operatorClients.set(key, new Set())
-    operatorClients.get(key)?.add(interaction.clienteId)
+  // L'operatore di un evento e' quello del suo appuntamento d'origine
+  const originIds = eventGroups.map((group) => group.appuntamentoOrigineId).filter(Boolean)
+  const origins = originIds.length
+    ? await prisma.appuntamento.findMany({ where: { id: { in: originIds } }, select: { id: true, operatoreId: true } })
+    : []
+  const originOperator = new Map(origins.map((origin) => [origin.id, origin.operatoreId]))
+  eventGroups.forEach((group) => {
+    rowFor(originOperator.get(group.appuntamentoOrigineId) ?? null).confirmedEvents += group._count._all
   })
 
-  Array.from(uniqueEvents.values()).forEach((event) => {
-    const key = safeText(event.appuntamentoOrigine?.operatoreId) || 'unassigned'
-    const row = operatorsMap.get(key) || {
-      operatorId: key,
-      operatorName: operatorLabel(event.appuntamentoOrigine?.operatore),
-      clientsCount: 0,
-      appointmentsScheduled: 0,
-      appointmentsCompleted: 0,
-      interactionsCount: 0,
-      totalTimeMinutes: 0,
-      confirmedEvents: 0
-    }
-    row.confirmedEvents += 1
-    operatorsMap.set(key, row)
-    if (!operatorClients.has(key)) operatorClients.set(key, new Set())
-    event.clienti.forEach((entry: any) => operatorClients.get(key)?.add(entry.clienteId))
+  const operatorIds = Array.from(rows.keys()).filter((key) => key !== UNASSIGNED_OPERATOR)
+  const [users, clientCounts] = await Promise.all([
+    operatorIds.length ? prisma.user.findMany({ where: { id: { in: operatorIds } }, select: { id: true, email: true } }) : [],
+    Promise.all(Array.from(rows.keys()).map((key) => (
+      prisma.cliente.count({ where: operatorClientsWhere(scope, key === UNASSIGNED_OPERATOR ? null : key) })
+    )))
+  ])
+  const emails = new Map(users.map((user) => [user.id, user]))
+  Array.from(rows.values()).forEach((row, index) => {
+    row.operatorName = operatorLabel(emails.get(row.operatorId))
+    row.clientsCount = clientCounts[index]
   })
 
-  operatorsMap.forEach((row, key) => {
-    row.clientsCount = operatorClients.get(key)?.size || 0
+  return Array.from(rows.values()).sort((a, b) => b.totalTimeMinutes - a.totalTimeMinutes || b.appointmentsScheduled - a.appointmentsScheduled)
+}
+
+function trendKeyForDay(period: ReportPeriod, day: Date) {
+  if (period === 'year') return `${day.getFullYear()}-${String(day.getMonth() + 1).padStart(2, '0')}`
+  return localDateKey(day)
+}
+
+// Il trend legge il rollup giornaliero (una riga per giorno). Con filtro
+// operatore/esito i contatti dipendono dalle attivita' del cliente e restano un conteggio per punto.
+async function loadTrend(scope: ReportScope, filters: ReportQueryFilters, effectiveSpamMode: EffectiveSpamMode, contactsTotal: number) {
+  const trend = createTrendSkeleton(filters.period, scope.range.gte, scope.range.lte)
+  const points = new Map(trend.map((point) => [point.key, point]))
+  // Righe per giorno locale: i confini del periodo e dei mesi coincidono con quelli delle righe
+  const days = await loadRollupDays(scope.range.gte, scope.range.lte, {
+    source: filters.source,
+    excludeSpam: effectiveSpamMode === 'exclude',
+    operatorId: filters.operatorId,
+    status: filters.status
   })
 
-  const outcomesMap = new Map<string, number>()
-  Array.from(uniqueAppointments.values()).forEach((appointment) => {
-    const value = safeText(appointment.esito)
-    if (!value) return
-    outcomesMap.set(value, (outcomesMap.get(value) || 0) + 1)
+  days.forEach((day) => {
+    const point = points.get(trendKeyForDay(filters.period, day.giorno))
+    if (!point) return
+    point.contacts += day.contatti
+    point.appointments += day.appuntamenti
+    point.completedAppointments += day.appuntamentiSvolti
+    point.interactions += day.interazioni
+    point.confirmedEvents += day.eventiConfermati
   })
 
-  const funnelsMap = new Map<string, number>()
-  Array.from(uniqueAppointments.values()).forEach((appointment) => {
-    const value = safeText(appointment.statoFunnel)
-    if (!value) return
-    funnelsMap.set(value, (funnelsMap.get(value) || 0) + 1)
+  if ((filters.operatorId || filters.status) && contactsTotal > 0) {
+    await Promise.all(trend.map(async (point) => {
+      const bucket = trendBucketRange(filters.period, point.key)
+      point.contacts = await prisma.cliente.count({ where: { AND: [scope.contacts, { dataPrimoContatto: bucket }] } })
+    }))
+  }
+
+  return trend
+}
+
+// Fonti del menu filtri nell'ordine in cui compaiono nel periodo: prima i
+// contatti (per id cliente), poi i clienti degli appuntamenti, delle interazioni
+// e degli eventi, dal piu' recente
+async function orderSourceOptions(range: DateRange, storedValues: (string | null)[]) {
+  const valuesByLabel = new Map<string, (string | null)[]>()
+  storedValues.forEach((value) => {
+    const label = sourceLabel(value)
+    valuesByLabel.set(label, [...(valuesByLabel.get(label) || []), value])
   })
 
-  const appointmentsScheduled = uniqueAppointments.size
-  const appointmentsCompleted = Array.from(uniqueAppointments.values()).filter(isCompletedAppointment).length
-  const interactionsCount = uniqueManualInteractions.size
-  const totalTimeMinutes = Array.from(uniqueAppointments.values()).reduce((sum, appointment) => sum + (appointment.durataMinuti || 0), 0)
-    + Array.from(uniqueManualInteractions.values()).reduce((sum, interaction) => sum + (interaction.durataMinuti || 0), 0)
+  const rank = new Map<string, [number, number]>()
+  const contactGroups = await prisma.cliente.groupBy({ by: ['canalePrimoContatto'], where: { dataPrimoContatto: range }, _min: { id: true } })
+  contactGroups.forEach((group) => {
+    const label = sourceLabel(group.canalePrimoContatto)
+    const firstId = group._min.id ?? Infinity
+    if (valuesByLabel.has(label) && firstId < (rank.get(label)?.[1] ?? Infinity)) rank.set(label, [0, firstId])
+  })
+
+  await Promise.all(Array.from(valuesByLabel.keys()).filter((label) => !rank.has(label)).map(async (label) => {
+    const client = sourceWhere(valuesByLabel.get(label) || [])
+    const appointment = await prisma.appuntamento.findFirst({
+      where: { AND: [appointmentWhere(range, {}), { OR: [{ clientePrincipale: client }, { clienti: { some: { cliente: client } } }] }] },
+      orderBy: { dataAppuntamento: 'desc' },
+      select: { dataAppuntamento: true }
+    })
+    if (appointment) return rank.set(label, [1, -appointment.dataAppuntamento.getTime()])
+    const interaction = await prisma.interazioneCliente.findFirst({
+      where: { AND: [interactionWhere(range, {}), { cliente: client }] },
+      orderBy: { dataInterazione: 'desc' },
+      select: { dataInterazione: true }
+    })
+    if (interaction) return rank.set(label, [2, -interaction.dataInterazione.getTime()])
+    const event = await prisma.evento.findFirst({
+      where: {
+        AND: [
+          eventWhere(range, {}),
+          { OR: [{ clienti: { some: { cliente: client } } }, { clienti: { none: {} }, appuntamentoOrigine: { clientePrincipale: client } }] }
+        ]
+      },
+      orderBy: { dataConfermata: 'desc' },
+      select: { dataConfermata: true }
+    })
+    rank.set(label, [3, -(event?.dataConfermata?.getTime() ?? 0)])
+  }))
 
-  const sortedClients = clientRows.sort((a, b) => {
-    const dateA = a.latestActivityAt ? new Date(a.latestActivityAt).getTime() : 0
-    const dateB = b.latestActivityAt ? new Date(b.latestActivityAt).getTime() : 0
-    return dateB - dateA || a.fullName.localeCompare(b.fullName, 'it')
+  return Array.from(valuesByLabel.keys()).sort((a, b) => {
+    const [phaseA, orderA] = rank.get(a) || [4, 0]
+    const [phaseB, orderB] = rank.get(b) || [4, 0]
+    return phaseA - phaseB || orderA - orderB
   })
-  const sortedActivities = activityRows.sort((a, b) => new Date(b.date).getTime() - new Date(a.date).getTime())
-  const spamClients = sortedClients.filter((client) => client.isSpam)
+}
 
-  return {
+// Parte del report che dipende solo dai filtri: in cache una volta per combinazione.
+// Le pagine di clienti si calcolano a richiesta e restano nella stessa voce.
+type ReportBase = {
+  report: Omit<OperationalReportResponse, 'appliedFilters' | 'clients' | 'clientsPage'>
+  clientsPage: (offset: number, limit: number) => Promise<ReportClientRow[]>
+}
+
+const REPORT_BASE_MAX_PAGES = 20
+
+// Date diverse nello stesso periodo danno lo stesso report: la chiave usa l'intervallo risolto
+function reportCacheKey(filters: ReportQueryFilters) {
+  const range = resolveRange(filters.period, filters.referenceDate)
+  return JSON.stringify([
+    filters.period,
+    range.start.toISOString(),
+    normalizeSpamMode(filters.period, filters.spamMode),
+    filters.operatorId,
+    filters.source,
+    filters.status
+  ])
+}
+
+async function computeReportBase(filters: ReportQueryFilters): Promise<ReportBase> {
+  const range = resolveRange(filters.period, filters.referenceDate)
+  const effectiveSpamMode = normalizeSpamMode(filters.period, filters.spamMode)
+  const [sourceValues, statusValues] = await Promise.all([
+    filters.source ? storedSourceValues(filters.source) : null,
+    filters.status ? storedStatusValues(filters.status) : null
+  ])
+  const scope = buildReportScope(filters, { gte: range.start, lte: range.end }, effectiveSpamMode, sourceValues, statusValues)
+
+  const [
+    contactGroups,
+    appointmentGroups,
+    interactionGroups,
+    eventGroups,
+    sourceGroups,
+    hiddenSpamCount,
+    clientsCount,
+    spamIds,
+    activities,
+    users
+  ] = await Promise.all([
+    prisma.cliente.groupBy({ by: ['canalePrimoContatto', 'isSpam'], where: scope.contacts, _count: { _all: true }, _min: { id: true } }),
+    prisma.appuntamento.groupBy({
+      by: ['operatoreId', 'esito', 'statoFunnel'],
+      where: scope.appointments,
+      _count: { _all: true },
+      _sum: { durataMinuti: true }
+    }),
+    prisma.interazioneCliente.groupBy({ by: ['operatoreId'], where: scope.interactions, _count: { _all: true }, _sum: { durataMinuti: true } }),
+    prisma.evento.groupBy({ by: ['appuntamentoOrigineId'], where: scope.events, _count: { _all: true } }),
+    prisma.cliente.groupBy({ by: ['canalePrimoContatto'], where: scope.universe }),
+    scope.hiddenSpam ? prisma.cliente.count({ where: scope.hiddenSpam }) : Promise.resolve(0),
+    prisma.cliente.count({ where: scope.clients }),
+    // Con spam esclusi non ci sono clienti spam da elencare
+    effectiveSpamMode === 'include' ? loadClientIds(scope, { spamOnly: true }) : Promise.resolve([] as number[]),
+    loadRecentActivities(scope),
+    prisma.user.findMany({
+      where: { isActive: true },
+      orderBy: { email: 'asc' }
+    })
+  ])
+
+  // firstId: a parita' di contatti le fonti restano nell'ordine del primo cliente (per id)
+  const sourcesMap = new Map<string, { total: number; valid: number; spam: number; firstId: number }>()
+  contactGroups.forEach((group) => {
+    const source = sourceLabel(group.canalePrimoContatto)
+    const bucket = sourcesMap.get(source) || { total: 0, valid: 0, spam: 0, firstId: Infinity }
+    bucket.firstId = Math.min(bucket.firstId, group._min.id ?? Infinity)
+    bucket.total += group._count._all
+    if (group.isSpam) bucket.spam += group._count._all
+    else bucket.valid += group._count._all
+    sourcesMap.set(source, bucket)
+  })
+  const contactsTotal = sumCounts(contactGroups)
+  const contactsSpam = sumCounts(contactGroups.filter((group) => group.isSpam))
+  const contactsValid = contactsTotal - contactsSpam
+
+  const completedGroups = appointmentGroups.filter(isCompletedAppointment)
+  const appointmentsScheduled = sumCounts(appointmentGroups)
+  const appointmentsCompleted = sumCounts(completedGroups)
+  const interactionsCount = sumCounts(interactionGroups)
+  const confirmedEvents = sumCounts(eventGroups)
+  const totalTimeMinutes = appointmentGroups.reduce((sum, group) => sum + (group._sum.durataMinuti || 0), 0)
+    + interactionGroups.reduce((sum, group) => sum + (group._sum.durataMinuti || 0), 0)
+
+  const [operators, trend, spamRows, sourceOptions] = await Promise.all([
+    loadOperatorRows(scope, appointmentGroups, interactionGroups, eventGroups),
+    loadTrend(scope, filters, effectiveSpamMode, contactsTotal),
+    loadClientRows(scope, spamIds),
+    orderSourceOptions(scope.range, sourceGroups.map((group) => group.canalePrimoContatto))
+  ])
+  const spamRowsById = new Map(spamRows.map((row) => [row.clientId, row]))
+
+  // Pagine memorizzate: un errore le toglie, cosi' la richiesta successiva riprova
+  const pages = new Map<string, Promise<ReportClientRow[]>>()
+  const clientsPage = (offset: number, limit: number) => {
+    const key = `${offset}:${limit}`
+    let page = pages.get(key)
+    if (!page) {
+      page = loadClientIds(scope, { offset, limit }).then((ids) => loadClientRows(scope, ids))
+      page.catch(() => pages.delete(key))
+      pages.set(key, page)
+      if (pages.size > REPORT_BASE_MAX_PAGES) pages.delete(pages.keys().next().value as string)
+    }
+    return page
+  }
+
+  const report: ReportBase['report'] = {
     meta: {
       period: filters.period,
       periodLabel: formatPeriodLabel(filters.period, range.start, range.end),
@@ -659,37 +964,35 @@ export async function getOperationalReport(filters: ReportQueryFilters): Promise
         ? 'Gli spam sono visibili nel report e vanno evidenziati in rosso.'
         : 'Gli spam sono esclusi da conteggi e liste principali per questo periodo.'
     },
-    appliedFilters: filters,
     summary: {
       contactsPrimary: effectiveSpamMode === 'include' ? contactsTotal : contactsValid,
       contactsTotal,
       contactsValid,
       contactsSpam,
-      contactsExcludedByPolicy: effectiveSpamMode === 'exclude' ? hiddenSpamCount : 0,
+      contactsExcludedByPolicy: hiddenSpamCount,
       appointmentsScheduled,
       appointmentsCompleted,
       interactionsCount,
       totalTimeMinutes,
-      confirmedEvents: uniqueEvents.size,
-      clientsCount: sortedClients.length,
-      averageInteractionsPerClient: sortedClients.length ? Number((interactionsCount / sortedClients.length).toFixed(2)) : 0,
-      averageTimePerClientMinutes: sortedClients.length ? Math.round(totalTimeMinutes / sortedClients.length) : 0
+      confirmedEvents,
+      clientsCount,
+      averageInteractionsPerClient: clientsCount ? Number((interactionsCount / clientsCount).toFixed(2)) : 0,
+      averageTimePerClientMinutes: clientsCount ? Math.round(totalTimeMinutes / clientsCount) : 0
     },
     sources: Array.from(sourcesMap.entries())
+      .sort(([, a], [, b]) => b.total - a.total || a.firstId - b.firstId)
       .map(([source, bucket]) => ({
         source,
         contactsTotal: bucket.total,
         contactsValid: bucket.valid,
         contactsSpam: bucket.spam
-      }))
-      .sort((a, b) => b.contactsTotal - a.contactsTotal),
-    operators: Array.from(operatorsMap.values()).sort((a, b) => b.totalTimeMinutes - a.totalTimeMinutes || b.appointmentsScheduled - a.appointmentsScheduled),
-    outcomes: Array.from(outcomesMap.entries()).map(([key, count]) => ({ key, label: key, count })).sort((a, b) => b.count - a.count),
-    funnels: Array.from(funnelsMap.entries()).map(([key, count]) => ({ key, label: key, count })).sort((a, b) => b.count - a.count),
+      })),
+    operators,
+    outcomes: breakdown(appointmentGroups, 'esito'),
+    funnels: breakdown(appointmentGroups, 'statoFunnel'),
     trend,
-    clients: sortedClients,
-    activities: sortedActivities.slice(0, 120),
-    spamClients,
+    activities,
+    spamClients: spamIds.map((id) => spamRowsById.get(id)).filter(Boolean) as ReportClientRow[],
     availableFilters: {
       operators: users.map((user) => ({ value: user.id, label: `${user.email} (${user.role})` })),
       sources: sourceOptions.map((value) => ({ value, label: value })),
@@ -697,4 +1000,35 @@ export async function getOperationalReport(filters: ReportQueryFilters): Promise
       spamModes: REPORT_SPAM_OPTIONS
     }
   }
-}
\ No newline at end of file
+
+  return { report, clientsPage }
+}
+
+/**
+ * Report operativo dalla cache condivisa (chiave: filtri normalizzati).
+ * hit dice se la parte comune era gia' calcolata, computeMs quanto e' costato calcolarla.
+ */
+export async function getCachedOperationalReport(filters: ReportQueryFilters, options: OperationalReportOptions = {}) {
+  const clientsOffset = options.clientsOffset ?? 0
+  const clientsLimit = options.clientsLimit ?? REPORT_CLIENTS_PAGE_SIZE
+  // Le scritture delle altre istanze arrivano dall'audit log finche' la voce puo' restare in cache
+  await followAuditLog(REPORT_CACHE_TTL_MS)
+  const { value: base, hit, computeMs } = await cachedReport(reportCacheKey(filters), () => computeReportBase(filters))
+  const report = await assembleReport(base, filters, clientsOffset, clientsLimit)
+  return { report, hit, computeMs }
+}
+
+async function assembleReport(base: ReportBase, filters: ReportQueryFilters, clientsOffset: number, clientsLimit: number) {
+  const clients = clientsLimit > 0 ? await base.clientsPage(clientsOffset, clientsLimit) : []
+  const report: OperationalReportResponse = {
+    ...base.report,
+    appliedFilters: filters,
+    clients,
+    clientsPage: { offset: clientsOffset, limit: clientsLimit, total: base.report.summary.clientsCount }
+  }
+  return report
+}
+
+export async function getOperationalReport(filters: ReportQueryFilters, options: OperationalReportOptions = {}): Promise<OperationalReportResponse> {
+  return (await getCachedOperationalReport(filters, options)).report
+}
@@ -0,0 +1,602 @@
+import { Prisma, PrismaClient } from '@prisma/client'
+import { afterCommit, transactionClient } from '@/lib/after-commit'
+import { isCompletedOutcome, sourceLabel } from '@/lib/report/types'
+
+// Rollup giornaliero per i trend del report operativo (tabella ReportGiornaliero).
+// Ogni scrittura su clienti, appuntamenti, interazioni ed eventi accoda i giorni
+// che tocca in ReportGiornoDaRicalcolare, nella stessa transazione
+// interattiva o subito dopo la scrittura; poco dopo quei giorni si ricalcolano per
+// intero dalle tabelle sorgente, quindi non ci sono contatori da tenere allineati a
+// mano. I giorni in coda (anche di altri processi) e quelli mai calcolati si
+// rifanno alla prima lettura o con il backfill. I giorni sono locali (fuso del
+// server, come i periodi del report): l'inizio di un periodo o di un mese e' sempre
+// l'inizio di una riga.
+
+const DAY_MS = 24 * 60 * 60 * 1000
+const FLUSH_DELAY_MS = Number(process.env.REPORT_ROLLUP_FLUSH_MS ?? 500)
+const RECOMPUTE_CONCURRENCY = 8
+const QUEUE_DELETE_CHUNK = 500
+
+const WRITE_OPERATIONS = new Set([
+  'create',
+  'createMany',
+  'createManyAndReturn',
+  'update',
+  'updateMany',
+  'updateManyAndReturn',
+  'upsert',
+  'delete',
+  'deleteMany'
+])
+
+// Campi (e relazioni) che cambiano il rollup: gli update che non li toccano non costano nulla
+const ROLLUP_FIELDS: Record<string, string[] | null> = {
+  Cliente: ['canalePrimoContatto', 'dataPrimoContatto', 'isSpam', 'eventi', 'appuntamentiPrincipali', 'appuntamenti', 'interazioni'],
+  Appuntamento: [
+    'dataAppuntamento', 'durataMinuti', 'esito', 'statoFunnel', 'operatoreId', 'operatore',
+    'clientePrincipaleId', 'clientePrincipale', 'clienti', 'interazioni', 'eventi'
+  ],
+  InterazioneCliente: ['dataInterazione', 'tipo', 'durataMinuti', 'operatoreId', 'operatore', 'clienteId', 'cliente', 'appuntamentoId', 'appuntamento'],
+  Evento: ['tipo', 'stato', 'dataConfermata', 'appuntamentoOrigineId', 'appuntamentoOrigine', 'clienti'],
+  // I link con i clienti decidono a chi si attribuiscono eventi e appuntamenti
+  EventoCliente: null,
+  AppuntamentoCliente: null
+}
+
+// Relazioni che aggiungono righe figlie con una propria data: solo queste si rileggono dopo la scrittura
+const CHILD_RELATIONS = new Set(['eventi', 'appuntamentiPrincipali', 'appuntamenti', 'interazioni', 'clienti'])
+
+const DATE_FIELDS: Record<string, string> = {
+  Cliente: 'dataPrimoContatto',
+  Appuntamento: 'dataAppuntamento',
+  InterazioneCliente: 'dataInterazione',
+  Evento: 'dataConfermata'
+}
+
+// Riga che segna un giorno come calcolato: le righe vere hanno sempre una fonte
+const DAY_MARKER = { operatoreId: '', fonte: '', spam: false, esito: '', stato: '', contaTotale: false, contaFonte: false, contaNonSpam: false }
+
+type RollupState = {
+  client: PrismaClient | null
+  dirty: Set<number>
+  timer: ReturnType<typeof setTimeout> | null
+  running: Promise<void>
+}
+
+const globalForRollup = globalThis as unknown as { reportRollup?: RollupState }
+const state: RollupState = globalForRollup.reportRollup ?? { client: null, dirty: new Set(), timer: null, running: Promise.resolve() }
+globalForRollup.reportRollup = state
+
+// Il client lo registra src/lib/prisma.ts creando l'estensione: import dinamico per non avere un ciclo
+async function db() {
+  if (!state.client) await import('@/lib/prisma')
+  if (!state.client) throw new Error('Rollup report non inizializzato')
+  return state.client
+}
+
+// Mezzanotte locale del giorno (NaN per date non valide)
+function localDay(value: Date | string | number) {
+  const date = new Date(value)
+  date.setHours(0, 0, 0, 0)
+  return date.getTime()
+}
+
+// Giorni da 23 o 25 ore al cambio dell'ora legale: si avanza di data, non di 24 ore
+function nextDay(day: number) {
+  const date = new Date(day)
+  date.setDate(date.getDate() + 1)
+  return date.getTime()
+}
+
+function dayList(from: Date, to: Date) {
+  const days: number[] = []
+  for (let day = localDay(from); day <= localDay(to); day = nextDay(day)) days.push(day)
+  return days
+}
+
+function localDateKey(day: number) {
+  const date = new Date(day)
+  return `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}-${String(date.getDate()).padStart(2, '0')}`
+}
+
+// ---------------------------------------------------------------------------
+// Giorni toccati da una scrittura
+// ---------------------------------------------------------------------------
+
+// Date delle righe del rollup che cambiano con i campi modificati (changed null: tutti,
+// come per create e delete). Un update dell'esito di un appuntamento legge la sua data
+// e quelle delle sue interazioni, non quelle degli eventi.
+async function touchedDates(model: string, where: any, changed: string[] | null): Promise<(Date | null | undefined)[]> {
+  const client = await db()
+  const needs = (...keys: string[]) => !changed || keys.some((key) => changed.includes(key))
+  switch (model) {
+    case 'Cliente': {
+      // Fonte e spam spostano l'attribuzione di tutte le attivita' del cliente
+      const all = needs('canalePrimoContatto', 'isSpam')
+      const rows: any[] = await client.cliente.findMany({
+        where,
+        select: {
+          dataPrimoContatto: true,
+          ...(all || needs('appuntamentiPrincipali')
+            ? { appuntamentiPrincipali: { select: { dataAppuntamento: true, eventi: { select: { dataConfermata: true } } } } }
+            : {}),
+          ...(all || needs('appuntamenti') ? { appuntamenti: { select: { appuntamento: { select: { dataAppuntamento: true } } } } } : {}),
+          ...(all || needs('interazioni') ? { interazioni: { select: { dataInterazione: true } } } : {}),
+          ...(all || needs('eventi') ? { eventi: { select: { evento: { select: { dataConfermata: true } } } } } : {})
+        }
+      })
+      return rows.flatMap((row) => [
+        row.dataPrimoContatto,
+        ...(row.appuntamentiPrincipali ?? []).flatMap((app: any) => [app.dataAppuntamento, ...app.eventi.map((event: any) => event.dataConfermata)]),
+        ...(row.appuntamenti ?? []).map((link: any) => link.appuntamento.dataAppuntamento),
+        ...(row.interazioni ?? []).map((interaction: any) => interaction.dataInterazione),
+        ...(row.eventi ?? []).map((link: any) => link.evento.dataConfermata)
+      ])
+    }
+    case 'Appuntamento': {
+      const rows: any[] = await client.appuntamento.findMany({
+        where,
+        select: {
+          dataAppuntamento: true,
+          // Le interazioni riportano esito e stato dell'appuntamento
+          ...(needs('esito', 'statoFunnel', 'interazioni') ? { interazioni: { select: { dataInterazione: true } } } : {}),
+          // Gli eventi senza clienti prendono operatore e cliente dall'appuntamento d'origine
+          ...(needs('operatoreId', 'operatore', 'clientePrincipaleId', 'clientePrincipale', 'eventi')
+            ? { eventi: { select: { dataConfermata: true } } }
+            : {})
+        }
+      })
+      return rows.flatMap((row) => [
+        row.dataAppuntamento,
+        ...(row.interazioni ?? []).map((interaction: any) => interaction.dataInterazione),
+        ...(row.eventi ?? []).map((event: any) => event.dataConfermata)
+      ])
+    }
+    case 'InterazioneCliente':
+      return (await client.interazioneCliente.findMany({ where, select: { dataInterazione: true } })).map((row) => row.dataInterazione)
+    case 'Evento':
+      return (await client.evento.findMany({ where, select: { dataConfermata: true } })).map((row) => row.dataConfermata)
+    case 'EventoCliente':
+      return (await client.eventoCliente.findMany({ where, select: { evento: { select: { dataConfermata: true } } } })).map((row) => row.evento.dataConfermata)
+    case 'AppuntamentoCliente':
+      return (await client.appuntamentoCliente.findMany({ where, select: { appuntamento: { select: { dataAppuntamento: true } } } }))
+        .map((row) => row.appuntamento.dataAppuntamento)
+    default:
+      return []
+  }
+}
+
+// Date scritte nella richiesta: createMany non restituisce gli id da rileggere
+function dataDates(model: string, data: any, created: boolean): any[] {
+  const field = DATE_FIELDS[model]
+  if (!field || !data) return []
+  return (Array.isArray(data) ? data : [data]).map((item) => {
+    const value = item?.[field]
+    if (value && typeof value === 'object' && !(value instanceof Date)) return value.set
+    // In creazione dataInterazione ha default now()
+    return value ?? (created && model === 'InterazioneCliente' && item ? new Date() : null)
+  })
+}
+
+function touchesRollup(model: string, operation: string, args: any) {
+  const fields = ROLLUP_FIELDS[model]
+  if (!fields || !operation.startsWith('update')) return true
+  return Object.keys(args?.data || {}).some((key) => fields.includes(key))
+}
+
+function childRelations(data: any) {
+  return (Array.isArray(data) ? data : [data]).flatMap((item) => Object.keys(item || {}).filter((key) => CHILD_RELATIONS.has(key)))
+}
+
+function afterRead(model: string, operation: string, args: any, result: any): { where: any; fields: string[] | null } | null {
+  if (operation.startsWith('delete')) return null
+  const single = ['create', 'update', 'upsert'].includes(operation) && result?.id !== undefined
+  if (!DATE_FIELDS[model]) {
+    if (single) return { where: { id: result.id }, fields: null }
+    // createMany: le righe scritte, per chiavi; updateMany: le righe gia' aggiornate
+    if (operation.startsWith('create')) return { where: { OR: Array.isArray(args?.data) ? args.data : [args?.data] }, fields: null }
+    return { where: args?.where ?? {}, fields: null }
+  }
+  const relations = childRelations(operation === 'upsert' ? [args?.create, args?.update] : args?.data)
+  if (!relations.length) return null
+  return { where: single ? { id: result.id } : args?.where ?? {}, fields: relations }
+}
+
+async function trackWrite(model: string, operation: string, args: any, query: (args: any) => Promise<any>) {
+  const isCreate = operation.startsWith('create')
+  const changed = operation.startsWith('update') ? Object.keys(args?.data || {}) : null
+  const before = isCreate ? [] : await touchedDates(model, args?.where ?? {}, changed).catch((error) => {
+    console.error('[Report Rollup] lettura giorni fallita', error)
+    return []
+  })
+  const written = operation === 'upsert'
+    ? [...dataDates(model, args?.create, true), ...dataDates(model, args?.update, false)]
+    : operation.startsWith('delete') ? [] : dataDates(model, args?.data, isCreate)
+
+  // Nella transazione interattiva la coda fa commit (o rollback) insieme ai dati
+  const tx = transactionClient()
+  if (tx) await queueDays(tx, [...before, ...written])
+
+  const result = await query(args)
+
+  // Dopo la scrittura si rileggono solo le date che la richiesta non contiene: le
+  // righe figlie create insieme (relazioni annidate) e, per i link con i clienti che
+  // non hanno una data propria, quella della riga collegata
+  const reread = afterRead(model, operation, args, result)
+
+  // Dentro una transazione si aspetta il commit: un ricalcolo fatto prima leggerebbe
+  // i dati vecchi e toglierebbe comunque il giorno da quelli da rifare
+  await afterCommit(async () => {
+    const after = reread
+      ? await touchedDates(model, reread.where, reread.fields).catch((error) => {
+          console.error('[Report Rollup] lettura giorni fallita', error)
+          return []
+        })
+      : []
+    const days = [...before, ...written, ...after]
+    await queueDays(await db(), tx ? after : days).catch((error) => console.error('[Report Rollup] coda giorni non scritta', error))
+    markReportDaysDirty(days)
+  })
+  return result
+}
+
+/**
+ * Estensione del client Prisma: registra i giorni toccati dalle scritture.
+ * Il client base serve per le letture e per il ricalcolo, fuori dalle transazioni del chiamante.
+ */
+export function trackReportWrites(client: PrismaClient) {
+  state.client = client
+  return Prisma.defineExtension({
+    name: 'report-rollup',
+    query: {
+      $allModels: {
+        async $allOperations({ model, operation, args, query }) {
+          if (!(model in ROLLUP_FIELDS) || !WRITE_OPERATIONS.has(operation) || !touchesRollup(model, operation, args)) {
+            return query(args)
+          }
+          return trackWrite(model, operation, args, query)
+        }
+      }
+    }
+  })
+}
+
+function dirtyDays(dates: (Date | string | null | undefined)[]) {
+  const days = new Set<number>()
+  dates.forEach((date) => {
+    if (!date) return
+    const day = localDay(date)
+    if (!Number.isNaN(day)) days.add(day)
+  })
+  return Array.from(days)
+}
+
+// Accoda i giorni nel database: client della transazione o client base
+async function queueDays(client: any, dates: (Date | string | null | undefined)[]) {
+  const days = dirtyDays(dates)
+  if (days.length) await client.reportGiornoDaRicalcolare.createMany({ data: days.map((day) => ({ giorno: new Date(day) })) })
+}
+
+export function markReportDaysDirty(dates: (Date | string | null | undefined)[]) {
+  dirtyDays(dates).forEach((day) => state.dirty.add(day))
+  if (!state.dirty.size || state.timer) return
+  state.timer = setTimeout(() => {
+    state.timer = null
+    flushReportRollup().catch((error) => console.error('[Report Rollup] ricalcolo fallito', error))
+  }, FLUSH_DELAY_MS)
+  state.timer.unref?.()
+}
+
+/** Ricalcola subito i giorni in attesa di questo processo. */
+export function flushReportRollup() {
+  state.running = state.running.catch(() => {}).then(async () => {
+    if (state.timer) {
+      clearTimeout(state.timer)
+      state.timer = null
+    }
+    const days = Array.from(state.dirty)
+    state.dirty.clear()
+    if (!days.length) return
+    try {
+      await recomputeQueued(days, { giorno: { in: days.map((day) => new Date(day)) } })
+    } catch (error) {
+      days.forEach((day) => state.dirty.add(day))
+      throw error
+    }
+  })
+  return state.running
+}
+
+// ---------------------------------------------------------------------------
+// Ricalcolo di un giorno
+// ---------------------------------------------------------------------------
+
+type RollupRow = typeof DAY_MARKER & {
+  giorno: Date
+  contatti: number
+  contattiSpam: number
+  appuntamenti: number
+  appuntamentiSvolti: number
+  interazioni: number
+  minuti: number
+  eventiConfermati: number
+}
+
+/**
+ * Come nei totali del report, un'attivita' conta per la fonte (e lo spam) di
+ * ciascuno dei suoi clienti: una riga per coppia fonte/spam distinta. I flag
+ * scelgono una sola riga per attivita' per ogni combinazione di filtri:
+ * contaTotale senza filtri, contaFonte con la sola fonte, contaNonSpam con i soli
+ * spam esclusi; con entrambi i filtri la coppia (fonte, non spam) e' gia' unica.
+ */
+function attributions(clients: any[]) {
+  const pairs = new Map<string, { fonte: string; spam: boolean }>()
+  clients.forEach((client) => {
+    if (!client) return
+    const pair = { fonte: sourceLabel(client.canalePrimoContatto), spam: Boolean(client.isSpam) }
+    pairs.set(JSON.stringify([pair.fonte, pair.spam]), pair)
+  })
+  const sources = new Set<string>()
+  let nonSpam = false
+  return Array.from(pairs.values()).map((pair, index) => {
+    const flags = { contaTotale: index === 0, contaFonte: !sources.has(pair.fonte), contaNonSpam: !pair.spam && !nonSpam }
+    sources.add(pair.fonte)
+    if (!pair.spam) nonSpam = true
+    return { ...pair, ...flags }
+  })
+}
+
+// Esiti e stati senza spazi, come li confronta il filtro stato del report
+function trimmed(value?: string | null) {
+  return typeof value === 'string' ? value.trim() : ''
+}
+
+const CLIENT_ATTRIBUTION = { select: { canalePrimoContatto: true, isSpam: true } }
+
+async function buildDayRows(day: number) {
+  const client = await db()
+  const range = { gte: new Date(day), lt: new Date(nextDay(day)) }
+  const [contacts, appointments, interactions, events] = await Promise.all([
+    client.cliente.groupBy({ by: ['canalePrimoContatto', 'isSpam'], where: { dataPrimoContatto: range }, _count: { _all: true } }),
+    client.appuntamento.findMany({
+      where: { dataAppuntamento: range },
+      select: {
+        operatoreId: true,
+        esito: true,
+        statoFunnel: true,
+        durataMinuti: true,
+        clientePrincipale: CLIENT_ATTRIBUTION,
+        clienti: { select: { cliente: CLIENT_ATTRIBUTION }, orderBy: { id: 'asc' } }
+      }
+    }),
+    client.interazioneCliente.findMany({
+      where: { dataInterazione: range, NOT: { tipo: 'appuntamento' } },
+      select: { operatoreId: true, durataMinuti: true, cliente: CLIENT_ATTRIBUTION, appuntamento: { select: { esito: true, statoFunnel: true } } }
+    }),
+    client.evento.findMany({
+      where: { tipo: { not: 'Appuntamento' }, stato: { not: 'annullato' }, dataConfermata: range },
+      select: {
+        stato: true,
+        clienti: { select: { cliente: CLIENT_ATTRIBUTION }, orderBy: { id: 'asc' } },
+        appuntamentoOrigine: { select: { operatoreId: true, clientePrincipale: CLIENT_ATTRIBUTION } }
+      }
+    })
+  ])
+
+  const rows = new Map<string, RollupRow>()
+  const row = (dimensions: typeof DAY_MARKER) => {
+    const key = JSON.stringify([
+      dimensions.operatoreId,
+      dimensions.fonte,
+      dimensions.spam,
+      dimensions.esito,
+      dimensions.stato,
+      dimensions.contaTotale,
+      dimensions.contaFonte,
+      dimensions.contaNonSpam
+    ])
+    let entry = rows.get(key)
+    if (!entry) {
+      entry = {
+        giorno: range.gte,
+        ...dimensions,
+        contatti: 0,
+        contattiSpam: 0,
+        appuntamenti: 0,
+        appuntamentiSvolti: 0,
+        interazioni: 0,
+        minuti: 0,
+        eventiConfermati: 0
+      }
+      rows.set(key, entry)
+    }
+    return entry
+  }
+
+  contacts.forEach((group) => {
+    attributions([group]).forEach((pair) => {
+      const entry = row({ ...DAY_MARKER, ...pair })
+      entry.contatti += group._count._all
+      if (group.isSpam) entry.contattiSpam += group._count._all
+    })
+  })
+  appointments.forEach((app) => {
+    // Cliente principale e clienti collegati
+    attributions([app.clientePrincipale, ...app.clienti.map((link) => link.cliente)]).forEach((pair) => {
+      const entry = row({ ...pair, operatoreId: app.operatoreId || '', esito: trimmed(app.esito), stato: trimmed(app.statoFunnel) })
+      entry.appuntamenti += 1
+      if (isCompletedOutcome(app.esito)) entry.appuntamentiSvolti += 1
+      entry.minuti += app.durataMinuti || 0
+    })
+  })
+  interactions.forEach((interaction) => {
+    attributions([interaction.cliente]).forEach((pair) => {
+      const entry = row({
+        ...pair,
+        operatoreId: interaction.operatoreId || '',
+        esito: trimmed(interaction.appuntamento?.esito),
+        stato: trimmed(interaction.appuntamento?.statoFunnel)
+      })
+      entry.interazioni += 1
+      entry.minuti += interaction.durataMinuti || 0
+    })
+  })
+  events.forEach((event) => {
+    // Clienti collegati, altrimenti il cliente principale dell'appuntamento d'origine
+    const owners = event.clienti.length ? event.clienti.map((link) => link.cliente) : [event.appuntamentoOrigine?.clientePrincipale]
+    attributions(owners).forEach((pair) => {
+      const entry = row({ ...pair, operatoreId: event.appuntamentoOrigine?.operatoreId || '', esito: '', stato: trimmed(event.stato) })
+      entry.eventiConfermati += 1
+    })
+  })
+
+  return [...Array.from(rows.values()), row(DAY_MARKER)]
+}
+
+async function recomputeDay(day: number) {
+  const client = await db()
+  const write = async () => {
+    const data = await buildDayRows(day)
+    await client.$transaction([
+      client.reportGiornaliero.deleteMany({ where: { giorno: new Date(day) } }),
+      client.reportGiornaliero.createMany({ data })
+    ])
+  }
+  try {
+    await write()
+  } catch (error: any) {
+    // Un altro processo ha ricalcolato lo stesso giorno nello stesso momento: si rifa' da capo
+    if (error?.code !== 'P2002') throw error
+    await write()
+  }
+}
+
+async function recomputeDays(days: number[]) {
+  for (let i = 0; i < days.length; i += RECOMPUTE_CONCURRENCY) {
+    await Promise.all(days.slice(i, i + RECOMPUTE_CONCURRENCY).map(recomputeDay))
+  }
+}
+
+// Ricalcola i giorni indicati e quelli in coda che rispettano where, poi toglie dalla
+// coda solo le righe lette prima del ricalcolo: quelle scritte nel frattempo restano
+async function recomputeQueued(days: number[], where: any) {
+  const client = await db()
+  const queued = await client.reportGiornoDaRicalcolare.findMany({ where, select: { id: true, giorno: true } })
+  await recomputeDays(Array.from(new Set([...days, ...queued.map((row) => row.giorno.getTime())])))
+  for (let i = 0; i < queued.length; i += QUEUE_DELETE_CHUNK) {
+    await client.reportGiornoDaRicalcolare.deleteMany({ where: { id: { in: queued.slice(i, i + QUEUE_DELETE_CHUNK).map((row) => row.id) } } })
+  }
+}
+
+// ---------------------------------------------------------------------------
+// Lettura e backfill
+// ---------------------------------------------------------------------------
+
+export type RollupFilter = {
+  source: string
+  excludeSpam: boolean
+  operatorId: string
+  status: string
+}
+
+export type RollupDay = {
+  giorno: Date
+  contatti: number
+  contattiSpam: number
+  appuntamenti: number
+  appuntamentiSvolti: number
+  interazioni: number
+  minuti: number
+  eventiConfermati: number
+}
+
+// Righe da sommare per i filtri fonte/spam: una per attivita' (vedi attributions)
+function attributionWhere(filter: RollupFilter) {
+  if (filter.source && filter.excludeSpam) return { fonte: filter.source, spam: false }
+  if (filter.source) return { fonte: filter.source, contaFonte: true }
+  if (filter.excludeSpam) return { spam: false, contaNonSpam: true }
+  return { contaTotale: true }
+}
+
+// Prima di leggere: giorni in attesa di questo processo, giorni in coda (anche di
+// altri processi o rimasti da un ricalcolo fallito) e giorni mai calcolati
+async function ensureDays(from: Date, to: Date) {
+  await flushReportRollup()
+  const client = await db()
+  const giorno = { gte: new Date(localDay(from)), lte: new Date(localDay(to)) }
+  const computed = await client.reportGiornaliero.findMany({ where: { ...DAY_MARKER, giorno }, select: { giorno: true } })
+  const present = new Set(computed.map((row) => row.giorno.getTime()))
+  await recomputeQueued(dayList(from, to).filter((day) => !present.has(day)), { giorno })
+}
+
+/**
+ * Totali per giorno locale tra from e to (al massimo una riga per giorno).
+ * Contatti e contatti spam hanno operatore, esito e stato vuoti: con quei filtri valgono zero.
+ */
+export async function loadRollupDays(from: Date, to: Date, filter: RollupFilter): Promise<RollupDay[]> {
+  await ensureDays(from, to)
+  const client = await db()
+  const groups = await client.reportGiornaliero.groupBy({
+    by: ['giorno'],
+    where: {
+      giorno: { gte: new Date(localDay(from)), lte: new Date(localDay(to)) },
+      ...attributionWhere(filter),
+      ...(filter.operatorId ? { operatoreId: filter.operatorId } : {}),
+      ...(filter.status ? { OR: [{ esito: filter.status }, { stato: filter.status }] } : {})
+    },
+    _sum: {
+      contatti: true,
+      contattiSpam: true,
+      appuntamenti: true,
+      appuntamentiSvolti: true,
+      interazioni: true,
+      minuti: true,
+      eventiConfermati: true
+    },
+    orderBy: { giorno: 'asc' }
+  })
+  return groups.map((group) => ({
+    giorno: group.giorno,
+    contatti: group._sum.contatti || 0,
+    contattiSpam: group._sum.contattiSpam || 0,
+    appuntamenti: group._sum.appuntamenti || 0,
+    appuntamentiSvolti: group._sum.appuntamentiSvolti || 0,
+    interazioni: group._sum.interazioni || 0,
+    minuti: group._sum.minuti || 0,
+    eventiConfermati: group._sum.eventiConfermati || 0
+  }))
+}
+
+async function earliestActivity() {
+  const client = await db()
+  const [clients, appointments, interactions, events] = await Promise.all([
+    client.cliente.aggregate({ _min: { dataPrimoContatto: true } }),
+    client.appuntamento.aggregate({ _min: { dataAppuntamento: true } }),
+    client.interazioneCliente.aggregate({ _min: { dataInterazione: true } }),
+    client.evento.aggregate({ _min: { dataConfermata: true } })
+  ])
+  const dates = [
+    clients._min.dataPrimoContatto,
+    appointments._min.dataAppuntamento,
+    interactions._min.dataInterazione,
+    events._min.dataConfermata
+  ].filter((date): date is Date => Boolean(date))
+  return dates.length ? new Date(Math.min(...dates.map((date) => date.getTime()))) : new Date()
+}
+
+/**
+ * Ricalcola tutti i giorni tra from e to (di default dalla prima attivita' a un
+ * anno da oggi, per gli eventi gia' confermati in futuro).
+ */
+export async function rebuildReportRollup(options: { from?: Date; to?: Date } = {}) {
+  await flushReportRollup()
+  const from = options.from ?? await earliestActivity()
+  const to = options.to ?? new Date(Date.now() + 366 * DAY_MS)
+  const days = dayList(from, to)
+  await recomputeQueued(days, { giorno: { gte: new Date(days[0] ?? localDay(from)), lte: new Date(days[days.length - 1] ?? localDay(to)) } })
+  return {
+    from: localDateKey(days[0] ?? localDay(from)),
+    to: localDateKey(days[days.length - 1] ?? localDay(to)),
+    days: days.length
+  }
+}
@@ -116,6 +116,12 @@ export interface OperationalReportResponse {
   funnels: ReportBreakdownRow[]
   trend: ReportTrendPoint[]
   clients: ReportClientRow[]
+  // Pagina di clients: total coincide con summary.clientsCount
+  clientsPage: {
+    offset: number
+    limit: number
+    total: number
+  }
   activities: ReportActivityRow[]
   spamClients: ReportClientRow[]
   availableFilters: {
@@ -153,6 +159,16 @@ export const REPORT_SPAM_OPTIONS: ReportOption[] = [
   { value: 'exclude', label: 'Escludi spam' }
 ]
 
+const COMPLETED_OUTCOMES = new Set(['svolto', 'positivo', 'negativo'])
+
+export function sourceLabel(source?: string | null) {
+  return (typeof source === 'string' ? source.trim() : '') || 'Non specificata'
+}
+
+export function isCompletedOutcome(esito?: string | null) {
+  return COMPLETED_OUTCOMES.has((typeof esito === 'string' ? esito.trim() : '').toLowerCase())
+}
+
 export function buildReportQuery(filters: Partial<ReportQueryFilters>) {
   const params = new URLSearchParams()
   Object.entries(filters).forEach(([key, value]) => {
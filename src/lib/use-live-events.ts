@@ -0,0 +1,66 @@
+'use client'
+
+import { useEffect, useRef } from 'react'
+import type { LiveEvent } from '@/lib/live-events'
+
+type Listener = {
+  onEvent: (event: LiveEvent) => void
+  onReset: () => void
+}
+
+// Una sola connessione SSE per scheda, condivisa da tutti i componenti iscritti
+const listeners = new Set<Listener>()
+let source: EventSource | null = null
+let connected = false
+
+function openSource() {
+  if (source && source.readyState !== EventSource.CLOSED) return
+  source = new EventSource('/api/live')
+  source.addEventListener('open', () => {
+    connected = true
+  })
+  source.addEventListener('error', () => {
+    // Il browser riprova da solo (rimandando Last-Event-ID) finche' non riceve un errore HTTP
+    connected = false
+  })
+  source.addEventListener('change', (message) => {
+    const event = JSON.parse((message as MessageEvent).data) as LiveEvent
+    listeners.forEach((listener) => listener.onEvent(event))
+  })
+  source.addEventListener('reset', () => {
+    listeners.forEach((listener) => listener.onReset())
+  })
+}
+
+function closeSource() {
+  source?.close()
+  source = null
+  connected = false
+}
+
+/** True se la connessione SSE e' aperta: il polling di riserva puo' restare fermo. */
+export function isLiveConnected() {
+  return connected
+}
+
+/**
+ * Riceve le modifiche pubblicate da /api/live. onReset scatta quando il server
+ * non puo' ripetere gli eventi persi durante una disconnessione.
+ */
+export function useLiveEvents(onEvent: (event: LiveEvent) => void, onReset?: () => void) {
+  const handlers = useRef({ onEvent, onReset })
+  handlers.current = { onEvent, onReset }
+
+  useEffect(() => {
+    const listener: Listener = {
+      onEvent: (event) => handlers.current.onEvent(event),
+      onReset: () => handlers.current.onReset?.()
+    }
+    listeners.add(listener)
+    openSource()
+    return () => {
+      listeners.delete(listener)
+      if (listeners.size === 0) closeSource()
+    }
+  }, [])
+}
@@ -38,7 +38,8 @@ function isAllowedForWorker(pathname: string) {
     '/api/appuntamenti',
     '/api/auth/me',
     '/api/auth/logout',
-    '/api/meteo'
+    '/api/meteo',
+    '/api/live'
   ]
   return allowed.some((prefix) => pathname === prefix || pathname.startsWith(`${prefix}/`))
 }
@@ -62,7 +63,8 @@ function isAllowedForReport(pathname: string, method: string) {
     '/api/eventi',
     '/api/clienti',
     '/api/appuntamenti',
-    '/api/meteo'
+    '/api/meteo',
+    '/api/live'
   ]
 
   if (!pathname.startsWith('/api/')) {